@@ -0,0 +1,150 @@
+"""
+Per-request overhead of resolving the authenticated user from the cache.
+
+Times ``auth_service.get_current_user`` (JWT decode included) when the user
+comes from the legacy pickled ORM object, from the JSON principal in Redis
+and from the in-process tier, which still reads the user's revision key
+from Redis on every request. Without ``--redis-url`` an in-memory dict
+stands in for Redis, which isolates the (de)serialization cost.
+
+    python -m benchmarks.auth_cache --requests 20000
+    python -m benchmarks.auth_cache --redis-url redis://localhost:6379/0
+"""
+import argparse
+import asyncio
+import pickle
+import statistics
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+import redis.asyncio as redis
+
+from src.database.models import Role, User
+from src.services import auth as auth_module
+from src.schemas.users import Principal
+from src.services.auth import auth_service
+from src.services.user_cache import UserCache
+
+
+class DictRedis:
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def mget(self, *keys):
+        return [self.data.get(key) for key in keys]
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    async def delete(self, key):
+        self.data.pop(key, None)
+
+    def register_script(self, script):
+        return DictScript(self)
+
+
+class DictScript:
+    """UserCache's store-if-revision script, run against the dict."""
+
+    def __init__(self, redis_db):
+        self.registered_client = redis_db
+
+    async def __call__(self, keys, args):
+        key, revision_key = keys
+        expected, value, _ = args
+        if (self.registered_client.data.get(revision_key) or "") != expected:
+            return 0
+        self.registered_client.data[key] = value
+        return 1
+
+
+class PickleCache:
+    """The previous behaviour: the whole ORM instance pickled into Redis."""
+
+    def __init__(self, redis_db):
+        self.redis_db = redis_db
+
+    async def lookup(self, email):
+        raw = await self.redis_db.get(f"user:{email}")
+        return (None if raw is None else pickle.loads(raw)), None
+
+    async def set(self, user, revision):
+        await self.redis_db.set(f"user:{user.email}", pickle.dumps(user), ex=900)
+        return user
+
+
+async def prime(cache, user: User) -> None:
+    _, revision = await cache.lookup(user.email)
+    await cache.set(user, revision)
+
+
+def make_user() -> User:
+    return User(
+        id=1,
+        user_name="bench",
+        email="bench@example.com",
+        password="$2b$12$" + "x" * 53,
+        refresh_token="r" * 200,
+        roles=Role.user,
+        confirmed=True,
+        ban_status=False,
+        created_at=datetime(2023, 5, 20),
+    )
+
+
+def new_request():
+    # a fresh request each time, so the per-request memo doesn't kick in
+    return SimpleNamespace(state=SimpleNamespace())
+
+
+async def measure(cache, token: str, requests: int) -> list:
+    auth_module.user_cache = cache
+    await auth_service.get_current_user(new_request(), token, db=None)
+    latencies = []
+    for _ in range(requests):
+        request = new_request()
+        start = time.perf_counter()
+        await auth_service.get_current_user(request, token, db=None)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+async def run(args) -> None:
+    auth_service.SECRET_KEY = "benchmark"
+    auth_service.ALGORITHM = "HS256"
+    user = make_user()
+    token = await auth_service.create_access_token({"sub": user.email})
+    redis_db = redis.Redis.from_url(args.redis_url) if args.redis_url else DictRedis()
+
+    legacy = PickleCache(redis_db)
+    redis_only = UserCache(redis_db, ttl=900, local_size=1, local_ttl=0)
+    local = UserCache(redis_db, ttl=900, local_size=1024, local_ttl=60)
+    for cache in (legacy, redis_only, local):
+        await prime(cache, user)
+
+    print(
+        f"{args.requests} lookups each, cached payload: "
+        f"pickle={len(pickle.dumps(user))} B json={len(Principal.from_orm(user).json())} B"
+    )
+    for name, cache in (("pickle", legacy), ("redis", redis_only), ("local", local)):
+        latencies = sorted(await measure(cache, token, args.requests))
+        print(
+            f"{name:<7} p50={statistics.median(latencies) * 1e6:8.1f} us  "
+            f"p99={latencies[int(len(latencies) * 0.99)] * 1e6:8.1f} us"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--redis-url", default=None)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Throughput of the local effects engine in megapixels per second, per effect.
+
+Each effect is applied to a synthetic ``--width`` x ``--height`` image in
+strips of ``--tile-rows`` rows, and once more as a single strip, with the
+peak of traced allocations, so the memory saved by tiling the float
+buffers is visible.
+With ``--workers`` the whole upload path (decode, fill crop to 500x500,
+effect, encode) also runs for ``--renders`` JPEGs in the process pool.
+
+    python -m benchmarks.effects --width 4000 --height 3000 --tile-rows 128
+    python -m benchmarks.effects --workers 1 2 4 --renders 32
+"""
+import argparse
+import asyncio
+import io
+import time
+import tracemalloc
+
+import numpy as np
+from PIL import Image
+
+from src.services.effects import EFFECTS, EffectsEngine, apply_effects
+
+
+def make_image(width: int, height: int) -> Image.Image:
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    return Image.fromarray(pixels)
+
+
+def measure(image: Image.Image, effect: str, tile_rows: int, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        apply_effects(image, effect, False, tile_rows)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    apply_effects(image, effect, False, tile_rows)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return image.width * image.height / 1e6 / best, peak / 2**20
+
+
+async def pool_throughput(data: bytes, megapixels: float, workers: int, renders: int) -> float:
+    engine = EffectsEngine(max_workers=workers, max_queue=renders, retry_after=1, tile_rows=128)
+    try:
+        # the first render pays for spawning the workers
+        await asyncio.gather(*(engine.render(data, "sepia", False, 500, 500) for _ in range(workers)))
+        start = time.perf_counter()
+        effects = list(EFFECTS)
+        await asyncio.gather(
+            *(engine.render(data, effects[i % len(effects)], False, 500, 500) for i in range(renders))
+        )
+        return megapixels * renders / (time.perf_counter() - start)
+    finally:
+        engine.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--width", type=int, default=4000)
+    parser.add_argument("--height", type=int, default=3000)
+    parser.add_argument("--tile-rows", type=int, default=128)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--workers", type=int, nargs="*", default=[])
+    parser.add_argument("--renders", type=int, default=32)
+    args = parser.parse_args()
+
+    image = make_image(args.width, args.height)
+    print(f"{args.width}x{args.height} image, {args.tile_rows} rows per strip vs one strip")
+    for effect in EFFECTS:
+        tiled, tiled_peak = measure(image, effect, args.tile_rows, args.repeat)
+        whole, whole_peak = measure(image, effect, args.height, args.repeat)
+        print(
+            f"{effect:<15} tiled {tiled:7.1f} MP/s peak {tiled_peak:7.1f} MiB   "
+            f"whole {whole:7.1f} MP/s peak {whole_peak:7.1f} MiB"
+        )
+
+    if args.workers:
+        out = io.BytesIO()
+        image.save(out, "JPEG", quality=90)
+        megapixels = args.width * args.height / 1e6
+        print(f"{args.renders} uploads rendered to 500x500, all effects in turn")
+        for workers in args.workers:
+            rate = asyncio.run(pool_throughput(out.getvalue(), megapixels, workers, args.renders))
+            print(f"{workers} workers: {rate:7.1f} source MP/s")
+
+
+if __name__ == "__main__":
+    main()
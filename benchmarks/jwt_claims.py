@@ -0,0 +1,64 @@
+"""
+Per-request auth cost with and without the decoded JWT claims cache.
+
+Times ``Auth.decode_token`` alone and the whole ``get_current_user`` with
+the principal served from the in-process tier, so token verification is
+the dominant remaining cost. "uncached" uses a claims cache of size 0.
+
+    python -m benchmarks.jwt_claims --requests 20000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from benchmarks.auth_cache import DictRedis, make_user, new_request, prime
+from src.services import auth as auth_module
+from src.services.auth import auth_service
+from src.services.cache import TTLCache
+from src.services.user_cache import UserCache
+
+
+async def measure(call, requests: int) -> list:
+    await call()
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        await call()
+        latencies.append(time.perf_counter() - start)
+    return sorted(latencies)
+
+
+async def run(args) -> None:
+    auth_service.SECRET_KEY = "benchmark"
+    auth_service.ALGORITHM = "HS256"
+    user = make_user()
+    auth_module.user_cache = UserCache(DictRedis(), ttl=900, local_size=1024, local_ttl=60)
+    await prime(auth_module.user_cache, user)
+    token = await auth_service.create_access_token({"sub": user.email}, expires_delta=7200)
+
+    async def decode():
+        auth_service.decode_token(token)
+
+    async def current_user():
+        await auth_service.get_current_user(new_request(), token, db=None)
+
+    print(f"{args.requests} requests with one 2 hour access token")
+    for name, size in (("uncached", 0), ("cached", 1024)):
+        auth_service.claims_cache = TTLCache(maxsize=size, ttl=24 * 3600)
+        for step, call in (("decode_token", decode), ("get_current_user", current_user)):
+            latencies = await measure(call, args.requests)
+            print(
+                f"{name:<9} {step:<17} p50={statistics.median(latencies) * 1e6:8.1f} us  "
+                f"p99={latencies[int(len(latencies) * 0.99)] * 1e6:8.1f} us"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=20000)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
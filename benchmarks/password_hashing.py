@@ -0,0 +1,73 @@
+"""
+Login throughput with bcrypt verification on the event loop vs in the
+password worker pool.
+
+Runs ``--logins`` concurrent password checks and reports logins per second,
+per core used, and how late a 10 ms heartbeat on the loop fires meanwhile,
+i.e. how long every other request would have been stalled.
+
+    python -m benchmarks.password_hashing --logins 64 --rounds 12 --workers 1 2 4
+"""
+import argparse
+import asyncio
+import time
+
+from src.conf.config import settings
+from src.services.passwords import PasswordHasher, crypt_context, hash_password
+
+
+async def heartbeat(lags: list, stop: asyncio.Event, interval: float = 0.01):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+
+async def measure(check, logins: int):
+    lags, stop = [], asyncio.Event()
+    beat = asyncio.create_task(heartbeat(lags, stop))
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    results = await asyncio.gather(*(check() for _ in range(logins)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await beat
+    assert all(results)
+    return elapsed, max(lags, default=0.0)
+
+
+def report(name: str, logins: int, cores: int, elapsed: float, lag: float):
+    throughput = logins / elapsed
+    print(
+        f"{name:<10} {throughput:8.1f} logins/s  {throughput / cores:7.1f} /s per core  "
+        f"max loop stall {lag * 1000:8.1f} ms"
+    )
+
+
+async def run(args):
+    hashed = hash_password("password", args.rounds)
+    context = crypt_context(args.rounds)
+
+    async def inline():
+        return context.verify("password", hashed)
+
+    print(f"{args.logins} concurrent logins, bcrypt cost {args.rounds}")
+    report("inline", args.logins, 1, *await measure(inline, args.logins))
+    for workers in args.workers:
+        hasher = PasswordHasher(args.rounds, workers, max_queue=args.logins, retry_after=1)
+        await hasher.verify("password", hashed)  # spawn the workers outside the timing
+        report(f"pool x{workers}", args.logins, workers,
+               *await measure(lambda: hasher.verify("password", hashed), args.logins))
+        hasher.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--rounds", type=int, default=settings.password_hash_rounds)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Cost of producing one photo QR code PNG.
+
+Compares qrcode's pure Python PNG writer (``PyPNGImage``, what
+``create_qr_code`` used to do) with the module matrix scaled by NumPy and
+encoded by Pillow, and with a lookup in the per-url digest cache.
+
+    python -m benchmarks.qr_codes --codes 200
+"""
+import argparse
+import asyncio
+import io
+import time
+
+import qrcode
+from qrcode.image.pure import PyPNGImage
+
+from src.services.qr import QRCodes, render_qr_png
+
+
+def pypng(url: str) -> bytes:
+    out = io.BytesIO()
+    qrcode.make(url, image_factory=PyPNGImage).save(out)
+    return out.getvalue()
+
+
+def measure(render, urls) -> float:
+    start = time.perf_counter()
+    for url in urls:
+        render(url)
+    return (time.perf_counter() - start) / len(urls) * 1000
+
+
+async def cached(codes: QRCodes, urls) -> float:
+    for url in urls:
+        await codes.png(url)
+    start = time.perf_counter()
+    for url in urls:
+        await codes.png(url)
+    return (time.perf_counter() - start) / len(urls) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--codes", type=int, default=200)
+    args = parser.parse_args()
+
+    urls = [
+        f"https://res.cloudinary.com/demo/image/upload/photo_share_team4/{i:064x}"
+        for i in range(args.codes)
+    ]
+    print(f"{args.codes} codes, ms per code")
+    print(f"pypng          {measure(pypng, urls):8.3f}")
+    print(f"pillow/numpy   {measure(lambda url: render_qr_png(url, 10, 4), urls):8.3f}")
+    codes = QRCodes(box_size=10, border=4, local_size=args.codes, prefix="qrcode")
+    print(f"cached         {asyncio.run(cached(codes, urls)):8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Per-request overhead of the rate limit dependency: fastapi-limiter (one
+Redis round trip per request, plus a scan of the app's routes) vs the
+token bucket engine in ``src.services.rate_limit``.
+
+Calls each dependency directly with a request routed to a limited path of
+the real app, under the limit (``--times`` is large) and close to it.
+Without ``--redis-url`` an in-memory stand-in answers the Lua scripts
+after ``--rtt-ms``, a typical same-datacenter round trip.
+
+    python -m benchmarks.rate_limit --requests 5000 --rtt-ms 0.3
+    python -m benchmarks.rate_limit --redis-url redis://localhost:6379/0
+
+fastapi-limiter is not a dependency of the app anymore, install it to run
+this comparison: ``pip install fastapi-limiter``.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import redis.asyncio as redis
+from fastapi import HTTPException, Response
+from starlette.requests import Request
+
+from fastapi_limiter import FastAPILimiter
+from fastapi_limiter.depends import RateLimiter as FastAPIRateLimiter
+
+from main import app
+from src.services.rate_limit import RateLimitEngine, RateLimiter
+
+PATH = "/api/comments/add_comment"
+
+
+class FakeRedis:
+    """Answers both Lua scripts as if every request were allowed."""
+
+    def __init__(self, rtt: float):
+        self.rtt = rtt
+
+    async def script_load(self, script):
+        return "sha"
+
+    async def evalsha(self, sha, numkeys, *args):
+        await asyncio.sleep(self.rtt)
+        return 0
+
+    def register_script(self, script):
+        fake = self
+
+        class Script:
+            registered_client = fake
+
+            async def __call__(self, keys, args):
+                await asyncio.sleep(fake.rtt)
+                capacity = args[0]
+                return [1, str(capacity / 4)]
+
+        return Script()
+
+
+def make_request() -> Request:
+    route = next(route for route in app.routes if route.path == PATH)
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": PATH,
+        "headers": [],
+        "client": ("10.0.0.1", 50000),
+        "app": app,
+        "route": route,
+    }
+    return Request(scope)
+
+
+async def measure(call, requests: int) -> list:
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        await call()
+        latencies.append(time.perf_counter() - start)
+    return sorted(latencies)
+
+
+def report(name: str, latencies: list) -> None:
+    print(
+        f"{name:<28} mean={statistics.mean(latencies) * 1e6:8.1f} us  "
+        f"p50={statistics.median(latencies) * 1e6:8.1f} us  "
+        f"p99={latencies[int(len(latencies) * 0.99)] * 1e6:8.1f} us"
+    )
+
+
+async def run(args) -> None:
+    if args.redis_url:
+        redis_db = redis.Redis.from_url(args.redis_url, decode_responses=True)
+    else:
+        redis_db = FakeRedis(args.rtt_ms / 1000)
+    await FastAPILimiter.init(redis_db)
+    request = make_request()
+
+    legacy = FastAPIRateLimiter(times=args.times, seconds=60)
+    report("fastapi-limiter", await measure(lambda: legacy(request, Response()), args.requests))
+
+    for name, times in (("token bucket, under limit", args.times), ("token bucket, near limit", 1)):
+        engine = RateLimitEngine(
+            redis_db, backend="redis", local_size=1024, local_share=0.5, sync_interval=1.0
+        )
+        limiter = RateLimiter(times=times, seconds=60, engine=engine)
+
+        async def call():
+            try:
+                await limiter(request, Response(), principal=None)
+            except HTTPException:
+                pass  # 429 near the limit, the cost is what matters
+
+        report(name, await measure(call, args.requests))
+        print(f"{'':<28} redis calls={engine.redis_hits} local grants={engine.local_hits}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--times", type=int, default=1_000_000)
+    parser.add_argument("--rtt-ms", type=float, default=0.3)
+    parser.add_argument("--redis-url", default=None)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
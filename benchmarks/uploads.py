@@ -0,0 +1,73 @@
+"""
+Load test for the upload executor using the local storage backend.
+
+Fires a burst of concurrent uploads with simulated network latency and
+reports how many were accepted or rejected with 503, together with the
+worst event loop stall seen meanwhile (how late a 10 ms ticker fired).
+
+    python -m benchmarks.uploads --uploads 100 --size 5000000 --delay 0.5
+"""
+import argparse
+import asyncio
+import io
+import os
+import tempfile
+import time
+
+from fastapi import HTTPException
+
+from src.services.storage import LocalStorage
+from src.services.uploads import UploadExecutor
+
+
+async def ticker(stop: asyncio.Event, interval: float = 0.01) -> float:
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - start - interval)
+    return worst
+
+
+async def run(args) -> None:
+    payload = os.urandom(args.size)
+    executor = UploadExecutor(args.workers, args.queue, retry_after=1)
+    with tempfile.TemporaryDirectory() as root:
+        storage = LocalStorage(root, "/static/uploads", delay=args.delay)
+
+        async def upload(n: int) -> bool:
+            try:
+                # unique bytes per upload, otherwise deduplication skips the transfer
+                body = io.BytesIO(payload + n.to_bytes(4, "big"))
+                await executor.submit(storage.store, body, "bench")
+                return True
+            except HTTPException:
+                return False
+
+        stop = asyncio.Event()
+        lag = asyncio.create_task(ticker(stop))
+        start = time.perf_counter()
+        results = await asyncio.gather(*(upload(n) for n in range(args.uploads)))
+        elapsed = time.perf_counter() - start
+        stop.set()
+        executor.shutdown()
+
+    accepted = sum(results)
+    print(
+        f"uploads={args.uploads} accepted={accepted} rejected={args.uploads - accepted} "
+        f"elapsed={elapsed:.2f}s max_loop_stall={await lag * 1000:.1f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--uploads", type=int, default=100)
+    parser.add_argument("--size", type=int, default=5_000_000)
+    parser.add_argument("--delay", type=float, default=0.5)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--queue", type=int, default=16)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,12 @@
 import pathlib
 import time
+from contextlib import asynccontextmanager
 
-import redis.asyncio as redis
 from datetime import date, timedelta
 from typing import List
 from fastapi import FastAPI, Depends, HTTPException, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi_limiter import FastAPILimiter
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
 from fastapi.responses import HTMLResponse
 from fastapi.staticfiles import StaticFiles
@@ -15,13 +14,42 @@ from fastapi.templating import Jinja2Templates
 
 from src.database.connect import get_db
 from src.database.models import User
-from src.routes import auth, users, photos, comments, rating
+from src.routes import auth, users, photos, comments, rating, admin
 from src.schemas.users import UserDb
 from src.conf.config import settings
+from src.services.effects import effects_engine
+from src.services.passwords import password_hasher
+from src.services.rate_limit import rate_limiter
+from src.services.redis_pool import create_redis
+from src.services.renditions import rendition_executor, rendition_worker
+from src.services.response_cache import response_cache
+from src.services.uploads import upload_executor
+from src.services.user_cache import user_cache
 from utils.py_logger import get_logger
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    redis_db = create_redis()
+    # Redis is optional for all of them: each falls back to local state
+    user_cache.redis_db = redis_db
+    response_cache.redis_db = redis_db
+    rate_limiter.redis_db = redis_db
+    if settings.rendition_worker:
+        rendition_worker.start()
+    yield
+    await rendition_worker.stop()
+    user_cache.redis_db = None
+    response_cache.redis_db = None
+    rate_limiter.redis_db = None
+    upload_executor.shutdown()
+    rendition_executor.shutdown()
+    password_hasher.shutdown()
+    effects_engine.shutdown()
+    await redis_db.close(close_connection_pool=True)
+
+
+app = FastAPI(lifespan=lifespan)
 origins = ["*"]
 logger = get_logger(__name__)
 
@@ -55,31 +83,10 @@ async def root(request: Request):
     )
 
 
-# @app.on_event("startup")
-# async def startup():
-#     r = await redis.Redis(
-#         host="localhost", port=6379, db=0, encoding="utf-8", decode_responses=True
-#     )
-#     await FastAPILimiter.init(r)
-
-
-@app.on_event("startup")
-async def startup():
-    r = await redis.Redis(
-        host=settings.redis_host,
-        port=settings.redis_port,
-        password=settings.redis_password,
-        db=0,
-        encoding="utf-8",
-        decode_responses=True,
-    )
-    await FastAPILimiter.init(r)
-
-
 @app.get("/api/healthchecker")
-def healthchecker(db: Session = Depends(get_db)):
+async def healthchecker(db: AsyncSession = Depends(get_db)):
     try:
-        result = db.execute(text("SELECT 1")).fetchone()
+        result = (await db.execute(text("SELECT 1"))).fetchone()
         if result is None:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -104,3 +111,4 @@ app.include_router(users.router, prefix="/api")
 app.include_router(photos.router, prefix="/api")
 app.include_router(comments.router, prefix="/api")
 app.include_router(rating.router, prefix="/api")
+app.include_router(admin.router, prefix="/api")
@@ -0,0 +1,26 @@
+"""photos created_at id index
+
+Revision ID: 5c1e8f2a9b31
+Revises: 948b4a7e4a9c
+Create Date: 2026-10-18 10:40:12.204512
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c1e8f2a9b31'
+down_revision = '948b4a7e4a9c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # keyset pagination skips rows without created_at
+    op.execute(sa.text("UPDATE photos SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL"))
+    op.create_index('ix_photos_created_at_id', 'photos', ['created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_photos_created_at_id', table_name='photos')
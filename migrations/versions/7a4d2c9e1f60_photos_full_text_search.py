@@ -0,0 +1,72 @@
+"""photos full text search
+
+Revision ID: 7a4d2c9e1f60
+Revises: 5c1e8f2a9b31
+Create Date: 2026-10-18 11:02:37.918204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7a4d2c9e1f60'
+down_revision = '5c1e8f2a9b31'
+branch_labels = None
+depends_on = None
+
+
+POSTGRES_UPGRADE = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    # a stored generated column is computed for every existing row here
+    "ALTER TABLE photos ADD COLUMN search_vector tsvector GENERATED ALWAYS AS "
+    "(to_tsvector('simple', coalesce(description, ''))) STORED",
+    "CREATE INDEX ix_photos_search_vector ON photos USING gin (search_vector)",
+    "CREATE INDEX ix_photos_description_trgm ON photos USING gin (description gin_trgm_ops)",
+]
+POSTGRES_DOWNGRADE = [
+    "DROP INDEX IF EXISTS ix_photos_description_trgm",
+    "DROP INDEX IF EXISTS ix_photos_search_vector",
+    "ALTER TABLE photos DROP COLUMN IF EXISTS search_vector",
+]
+
+SQLITE_UPGRADE = [
+    "CREATE VIRTUAL TABLE photos_fts USING fts5(description, content='photos', "
+    "content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER photos_fts_ai AFTER INSERT ON photos BEGIN "
+    "INSERT INTO photos_fts(rowid, description) VALUES (new.id, new.description); END",
+    "CREATE TRIGGER photos_fts_ad AFTER DELETE ON photos BEGIN "
+    "INSERT INTO photos_fts(photos_fts, rowid, description) "
+    "VALUES ('delete', old.id, old.description); END",
+    "CREATE TRIGGER photos_fts_au AFTER UPDATE OF description ON photos BEGIN "
+    "INSERT INTO photos_fts(photos_fts, rowid, description) "
+    "VALUES ('delete', old.id, old.description); "
+    "INSERT INTO photos_fts(rowid, description) VALUES (new.id, new.description); END",
+    # backfill the index from the rows already in photos
+    "INSERT INTO photos_fts(photos_fts) VALUES ('rebuild')",
+]
+SQLITE_DOWNGRADE = [
+    "DROP TRIGGER IF EXISTS photos_fts_au",
+    "DROP TRIGGER IF EXISTS photos_fts_ad",
+    "DROP TRIGGER IF EXISTS photos_fts_ai",
+    "DROP TABLE IF EXISTS photos_fts",
+]
+
+
+def _run(statements) -> None:
+    for statement in statements:
+        op.execute(sa.text(statement))
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name == "postgresql":
+        _run(POSTGRES_UPGRADE)
+    else:
+        _run(SQLITE_UPGRADE)
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == "postgresql":
+        _run(POSTGRES_DOWNGRADE)
+    else:
+        _run(SQLITE_DOWNGRADE)
@@ -0,0 +1,61 @@
+"""lookup indexes
+
+Revision ID: 8b3f5d0a2c47
+Revises: 7a4d2c9e1f60
+Create Date: 2026-10-18 11:21:05.330176
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b3f5d0a2c47'
+down_revision = '7a4d2c9e1f60'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    # (name, table, columns, unique)
+    ('ix_tags_tag_name', 'tags', ['tag_name'], True),
+    ('ix_photos_user_id', 'photos', ['user_id'], False),
+    ('ix_photos_average_rating', 'photos', ['average_rating'], False),
+    ('ix_comments_photo_id', 'comments', ['photo_id'], False),
+    ('ix_photorating_photo_id_user_id', 'photorating', ['photo_id', 'user_id'], True),
+    ('ix_photorating_user_id', 'photorating', ['user_id'], False),
+    ('ix_photos_m2m_tag_photo_id_tag_id', 'photos_m2m_tag', ['photo_id', 'tag_id'], True),
+    ('ix_photos_m2m_tag_tag_id', 'photos_m2m_tag', ['tag_id'], False),
+]
+
+# the unique indexes can't be built while duplicates exist
+DEDUPLICATE = [
+    # point links at the oldest tag of each name, then drop the other tags;
+    # only links to duplicate tags are touched, so the rest stay unlocked
+    "UPDATE photos_m2m_tag SET tag_id = ("
+    " SELECT min(t2.id) FROM tags t1 JOIN tags t2 ON t2.tag_name = t1.tag_name"
+    " WHERE t1.id = photos_m2m_tag.tag_id)"
+    " WHERE tag_id NOT IN (SELECT min(id) FROM tags GROUP BY tag_name)",
+    "DELETE FROM photos_m2m_tag WHERE id NOT IN ("
+    " SELECT min(id) FROM photos_m2m_tag GROUP BY photo_id, tag_id)",
+    "DELETE FROM tags WHERE id NOT IN (SELECT min(id) FROM tags GROUP BY tag_name)",
+    "DELETE FROM photorating WHERE id NOT IN ("
+    " SELECT min(id) FROM photorating GROUP BY photo_id, user_id)",
+]
+
+
+def upgrade() -> None:
+    for statement in DEDUPLICATE:
+        op.execute(sa.text(statement))
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction block
+    with op.get_context().autocommit_block():
+        for name, table, columns, unique in INDEXES:
+            op.create_index(
+                name, table, columns, unique=unique, postgresql_concurrently=True
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
@@ -0,0 +1,37 @@
+"""photo rating aggregates
+
+Revision ID: 9c2e7b4d1a58
+Revises: 8b3f5d0a2c47
+Create Date: 2026-10-18 12:02:41.518230
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c2e7b4d1a58'
+down_revision = '8b3f5d0a2c47'
+branch_labels = None
+depends_on = None
+
+
+BACKFILL = """
+UPDATE photos SET
+    rating_count = (SELECT count(*) FROM photorating WHERE photorating.photo_id = photos.id),
+    rating_sum = (SELECT coalesce(sum(rating), 0) FROM photorating WHERE photorating.photo_id = photos.id),
+    average_rating = coalesce(
+        (SELECT avg(rating) FROM photorating WHERE photorating.photo_id = photos.id), 0.0
+    )
+"""
+
+
+def upgrade() -> None:
+    op.add_column('photos', sa.Column('rating_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('photos', sa.Column('rating_sum', sa.Integer(), server_default='0', nullable=False))
+    op.execute(BACKFILL)
+
+
+def downgrade() -> None:
+    op.drop_column('photos', 'rating_sum')
+    op.drop_column('photos', 'rating_count')
@@ -0,0 +1,31 @@
+"""drop photos.rated_by
+
+Revision ID: a1d6f3c8e947
+Revises: 9c2e7b4d1a58
+Create Date: 2026-10-18 12:31:09.204417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a1d6f3c8e947'
+down_revision = '9c2e7b4d1a58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # who rated what lives in photorating, guarded by ix_photorating_photo_id_user_id
+    with op.batch_alter_table('photos') as batch_op:
+        batch_op.drop_column('rated_by')
+
+
+def downgrade() -> None:
+    op.add_column('photos', sa.Column('rated_by', sa.ARRAY(sa.Integer()), nullable=True))
+    op.execute(
+        "UPDATE photos SET rated_by = coalesce("
+        "(SELECT array_agg(user_id ORDER BY id) FROM photorating "
+        "WHERE photorating.photo_id = photos.id), '{}')"
+    )
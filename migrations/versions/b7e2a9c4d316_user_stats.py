@@ -0,0 +1,50 @@
+"""user stats
+
+Revision ID: b7e2a9c4d316
+Revises: a1d6f3c8e947
+Create Date: 2026-10-18 13:04:52.871906
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e2a9c4d316'
+down_revision = 'a1d6f3c8e947'
+branch_labels = None
+depends_on = None
+
+
+BACKFILL = """
+INSERT INTO user_stats (user_id, photos_published, comments_written, ratings_given,
+                        ratings_received, rating_sum_received)
+SELECT users.id,
+    (SELECT count(*) FROM photos WHERE photos.user_id = users.id),
+    (SELECT count(*) FROM comments WHERE comments.user_id = users.id),
+    (SELECT count(*) FROM photorating WHERE photorating.user_id = users.id),
+    (SELECT count(*) FROM photorating JOIN photos ON photos.id = photorating.photo_id
+     WHERE photos.user_id = users.id),
+    (SELECT coalesce(sum(photorating.rating), 0) FROM photorating
+     JOIN photos ON photos.id = photorating.photo_id WHERE photos.user_id = users.id)
+FROM users
+"""
+
+
+def upgrade() -> None:
+    op.create_table(
+        'user_stats',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('photos_published', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('comments_written', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('ratings_given', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('ratings_received', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('rating_sum_received', sa.Integer(), server_default='0', nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id'),
+    )
+    op.execute(BACKFILL)
+
+
+def downgrade() -> None:
+    op.drop_table('user_stats')
@@ -0,0 +1,50 @@
+"""photo renditions
+
+Revision ID: c4f81d2e6a95
+Revises: b7e2a9c4d316
+Create Date: 2026-10-18 16:21:07.415302
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4f81d2e6a95'
+down_revision = 'b7e2a9c4d316'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # existing photos have no stored object key recorded, they get no renditions
+    op.add_column('photos', sa.Column('renditions', sa.JSON(), nullable=True))
+    op.create_table(
+        'photo_renditions',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('photo_id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=20), nullable=False),
+        sa.Column('format', sa.String(length=10), nullable=False),
+        sa.Column('width', sa.Integer(), nullable=False),
+        sa.Column('height', sa.Integer(), nullable=False),
+        sa.Column('crop', sa.String(length=10), nullable=False),
+        sa.Column('source_key', sa.String(length=255), nullable=False),
+        sa.Column('effect', sa.String(length=30), nullable=True),
+        sa.Column('rounded', sa.Boolean(), server_default=sa.false(), nullable=False),
+        sa.Column('status', sa.String(length=10), server_default='pending', nullable=False),
+        sa.Column('attempts', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('claimed_at', sa.DateTime(), nullable=True),
+        sa.Column('url', sa.String(length=255), nullable=True),
+        sa.ForeignKeyConstraint(['photo_id'], ['photos.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('photo_id', 'name', 'format', name='uq_photo_renditions_photo_name_format'),
+    )
+    op.create_index(
+        'ix_photo_renditions_status_claimed_at', 'photo_renditions', ['status', 'claimed_at']
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_photo_renditions_status_claimed_at', table_name='photo_renditions')
+    op.drop_table('photo_renditions')
+    op.drop_column('photos', 'renditions')
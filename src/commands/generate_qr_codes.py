@@ -0,0 +1,34 @@
+"""
+Generate the QR codes of all photos that have none, in batches.
+
+    python -m src.commands.generate_qr_codes [--batch 500]
+
+Each batch is rendered and uploaded ``QR_BATCH_CONCURRENCY`` codes at a
+time and recorded in one transaction, like
+``POST /api/admin/qr_codes/generate``.
+"""
+import argparse
+import asyncio
+
+from src.database.connect import SessionLocal, engine
+from src.repository.photos import generate_qr_codes
+from src.services.uploads import upload_executor
+
+
+async def main(batch: int) -> None:
+    total = 0
+    while True:
+        async with SessionLocal() as db:
+            generated = await generate_qr_codes(None, batch, db)
+        if not generated:
+            break
+        total += generated
+        print(f"generated {total} QR code(s)")
+    upload_executor.shutdown()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--batch", type=int, default=500, help="photos per transaction")
+    asyncio.run(main(parser.parse_args().batch))
@@ -0,0 +1,21 @@
+"""
+Recompute ``rating_count``, ``rating_sum`` and ``average_rating`` of every
+photo from the ``photorating`` table, e.g. after ratings were edited by hand.
+
+    python -m src.commands.rebuild_rating_aggregates
+"""
+import asyncio
+
+from src.database.connect import SessionLocal, engine
+from src.repository.rating import rebuild_rating_aggregates
+
+
+async def main():
+    async with SessionLocal() as db:
+        fixed = await rebuild_rating_aggregates(db)
+    await engine.dispose()
+    print(f"rebuilt rating aggregates of {fixed} photo(s)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,36 @@
+"""
+Check the per-user counters in ``user_stats`` against the photos, comments
+and ratings they count, and recompute the ones that disagree.
+
+    python -m src.commands.rebuild_user_stats [--check]
+
+With ``--check`` nothing is written: stale users are listed and the exit
+status is 1 if there are any.
+"""
+import argparse
+import asyncio
+import sys
+
+from src.database.connect import SessionLocal, engine
+from src.repository.user_stats import find_stale_user_stats, rebuild_user_stats
+
+
+async def main(check: bool) -> int:
+    async with SessionLocal() as db:
+        if check:
+            stale = await find_stale_user_stats(db)
+            for user_id, user_name in stale:
+                print(f"stale user stats: {user_id} {user_name}")
+        else:
+            fixed = await rebuild_user_stats(db)
+    await engine.dispose()
+    if check:
+        return 1 if stale else 0
+    print(f"rebuilt stats of {fixed} user(s)")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--check", action="store_true", help="report stale users, don't fix them")
+    sys.exit(asyncio.run(main(parser.parse_args().check)))
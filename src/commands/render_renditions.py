@@ -0,0 +1,34 @@
+"""
+Render the pending photo renditions and exit, e.g. from cron when the API
+processes run with ``RENDITION_WORKER=false``.
+
+    python -m src.commands.render_renditions [--retry-failed]
+
+``--retry-failed`` first puts renditions that ran out of attempts back in
+the queue.
+"""
+import argparse
+import asyncio
+import sys
+
+from src.database.connect import SessionLocal, engine
+from src.repository.renditions import retry_failed_renditions
+from src.services.renditions import rendition_executor, rendition_worker
+
+
+async def main(retry_failed: bool) -> int:
+    if retry_failed:
+        async with SessionLocal() as db:
+            print(f"requeued {await retry_failed_renditions(db)} failed rendition(s)")
+    while await rendition_worker.run_once():
+        pass
+    rendition_executor.shutdown()
+    await engine.dispose()
+    print(f"rendered {rendition_worker.rendered}, failed {rendition_worker.failed}")
+    return 1 if rendition_worker.failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--retry-failed", action="store_true", help="requeue failed renditions first")
+    sys.exit(asyncio.run(main(parser.parse_args().retry_failed)))
@@ -3,6 +3,12 @@ from pydantic import BaseSettings
 
 class Settings(BaseSettings):
     sqlalchemy_database_url: str = "database"
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30.0
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
+    db_statement_timeout: int = 0  # milliseconds, 0 - no limit
     secret_key_jwt: str = "secret_key"
     algorithm: str = "algorithm"
 
@@ -15,11 +21,68 @@ class Settings(BaseSettings):
     redis_host: str = "localhost"
     redis_port: int = 123456
     redis_password: str = "weewef"
+    redis_max_connections: int = 50
+    redis_timeout: float = 0.5  # seconds, for connect and each command
+    redis_retry_after: float = 5.0  # seconds to skip Redis after an error
+
+    user_cache_ttl: int = 900
+    user_cache_local_size: int = 1024
+    user_cache_local_ttl: float = 30.0
+    jwt_claims_cache_size: int = 10000  # decoded tokens, each kept until its exp
+
+    response_cache_backend: str = "redis"  # redis | local | off
+    response_cache_local_size: int = 4096
+    search_cache_ttl: int = 300
+    tag_cache_size: int = 10000
+    tag_cache_ttl: float = 3600.0
+
+    rate_limit_backend: str = "redis"  # redis | local | off
+    rate_limit_local_size: int = 10000
+    rate_limit_local_share: float = 0.5  # above this share of a bucket, skip Redis
+    rate_limit_sync_interval: float = 1.0  # seconds between background syncs of a bucket
 
     cloudinary_name: str = "name"
     cloudinary_api_key: int = 654321
     cloudinary_secret: str = "secret"
 
+    storage_backend: str = "cloudinary"  # cloudinary | local
+    storage_local_dir: str = "static/uploads"
+    storage_local_url: str = "/static/uploads"
+    storage_local_delay: float = 0.0
+
+    upload_max_workers: int = 4
+    upload_max_queue: int = 16
+    upload_retry_after: int = 5
+    upload_max_bytes: int = 20 * 1024 * 1024  # largest photo accepted, checked while streaming
+    upload_batch_max_files: int = 100  # files per batch upload
+    upload_batch_concurrency: int = 4  # files of a batch stored at once, keep under the executor's capacity
+
+    qr_box_size: int = 10  # pixels per QR module
+    qr_border: int = 4  # modules of quiet zone
+    qr_cache_size: int = 4096  # QR code PNGs kept in process
+    qr_batch_concurrency: int = 8  # codes rendered and uploaded at once by the admin batch
+
+    password_hash_rounds: int = 12  # bcrypt cost, older hashes are upgraded on login
+    password_hash_workers: int = 2  # processes, each hashes on one core
+    password_hash_max_queue: int = 64
+    password_hash_retry_after: int = 1
+
+    effects_backend: str = "cloudinary"  # cloudinary | local
+    effects_workers: int = 2  # processes rendering upload effects with the local backend
+    effects_max_queue: int = 16
+    effects_retry_after: int = 5
+    effects_tile_rows: int = 128  # rows per strip of the float buffers of an effect
+
+    # name:WIDTHxHEIGHT:crop, crop is "fill" (exact size) or "limit" (fit inside)
+    rendition_sizes: str = "thumb:160x160:fill,feed:640x640:limit,full:1600x1600:limit"
+    rendition_formats: str = "webp,jpg"
+    rendition_worker: bool = True  # run the rendition worker in this process
+    rendition_batch_size: int = 8
+    rendition_max_workers: int = 2  # render threads, separate from the upload pool
+    rendition_poll_interval: float = 5.0
+    rendition_lease: int = 300  # seconds before a claimed rendition is taken over
+    rendition_max_attempts: int = 5
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
@@ -1,20 +1,58 @@
-import configparser
-import pathlib
-
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
 from src.conf.config import settings
+from src.database.pool import InstrumentedPool
+
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
 
 SQL_ALCHEMY_DATABASE_URL = settings.sqlalchemy_database_url
 
-engine = create_engine(SQL_ALCHEMY_DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def to_async_url(url: str) -> str:
+    """
+    Swap a sync driver in the database url for its asyncio counterpart,
+    e.g. ``postgresql://`` -> ``postgresql+asyncpg://``.
+    """
+    scheme, sep, rest = url.partition("://")
+    return f"{ASYNC_DRIVERS.get(scheme, scheme)}{sep}{rest}"
+
+
+def engine_options(url: str) -> dict:
+    """
+    Pool and connection arguments from settings. SQLite keeps the
+    dialect's default pool, there is nothing to size there.
+    """
+    if make_url(url).get_backend_name() == "sqlite":
+        return {}
+    options = dict(
+        poolclass=InstrumentedPool,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+        pool_pre_ping=settings.db_pool_pre_ping,
+    )
+    if settings.db_statement_timeout:
+        options["connect_args"] = {
+            "server_settings": {"statement_timeout": str(settings.db_statement_timeout)}
+        }
+    return options
+
+
+ASYNC_DATABASE_URL = to_async_url(SQL_ALCHEMY_DATABASE_URL)
+
+engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL))
+SessionLocal = async_sessionmaker(
+    bind=engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
 
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
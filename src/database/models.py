@@ -1,7 +1,9 @@
 import enum
 
-from sqlalchemy.types import Integer, String, DateTime
-from sqlalchemy import Column, func, Enum, Boolean, ForeignKey, Table, Float, ARRAY
+from sqlalchemy.types import Integer, String, DateTime, JSON
+from sqlalchemy import (
+    Column, func, Enum, Boolean, ForeignKey, Table, Float, Index, DDL, event, UniqueConstraint, false
+)
 from sqlalchemy.orm import declarative_base, relationship
 
 Base = declarative_base()
@@ -28,12 +30,36 @@ class User(Base):
     photo_ratings = relationship("PhotoRating", back_populates="user")
 
 
+class UserStats(Base):
+    """
+    Per-user counters behind the profile endpoints, kept in step by the
+    write paths through ``repository.user_stats.bump_user_stats``. A user
+    without a row has done nothing yet.
+    """
+
+    __tablename__ = "user_stats"
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    photos_published = Column(Integer, default=0, server_default="0", nullable=False)
+    comments_written = Column(Integer, default=0, server_default="0", nullable=False)
+    ratings_given = Column(Integer, default=0, server_default="0", nullable=False)
+    # ratings on this user's photos
+    ratings_received = Column(Integer, default=0, server_default="0", nullable=False)
+    rating_sum_received = Column(Integer, default=0, server_default="0", nullable=False)
+
+    @property
+    def average_received_rating(self) -> float:
+        if not self.ratings_received:
+            return 0.0
+        return self.rating_sum_received / self.ratings_received
+
+
 photo_m2m_tag = Table(
     "photos_m2m_tag",
     Base.metadata,
     Column("id", Integer, primary_key=True),
     Column("photo_id", Integer, ForeignKey("photos.id", ondelete="CASCADE")),
-    Column("tag_id", Integer, ForeignKey("tags.id", ondelete="CASCADE")),
+    Column("tag_id", Integer, ForeignKey("tags.id", ondelete="CASCADE"), index=True),
+    Index("ix_photos_m2m_tag_photo_id_tag_id", "photo_id", "tag_id", unique=True),
 )
 
 
@@ -43,27 +69,106 @@ class Photo(Base):
     photo = Column(String(255), nullable=False)
     qr_code = Column(String(255), nullable=True)
     description = Column(String(200), nullable=True)
-    user_id = Column("user_id", ForeignKey("users.id", ondelete="CASCADE"))
+    user_id = Column("user_id", ForeignKey("users.id", ondelete="CASCADE"), index=True)
     user = relationship("User", backref="users", innerjoin=True)
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
-    tags = relationship("Tag", secondary=photo_m2m_tag, backref="notes")
+    # never lazy load tags: list queries must eager load them (see select_photos)
+    tags = relationship("Tag", secondary=photo_m2m_tag, backref="notes", lazy="raise_on_sql")
     ratings = relationship("PhotoRating", back_populates="photo")
-    average_rating = Column(Float, default=0.0)
-    rated_by = Column(ARRAY(Integer), default=[])
+    # running aggregates of photorating, kept in step by repository.rating
+    rating_count = Column(Integer, default=0, server_default="0", nullable=False)
+    rating_sum = Column(Integer, default=0, server_default="0", nullable=False)
+    average_rating = Column(Float, default=0.0, index=True)
+    # the ready rows of photo_renditions as [{name, format, width, height,
+    # url}], smallest first, kept in step by repository.renditions
+    renditions = Column(JSON, nullable=True)
+
+    __table_args__ = (Index("ix_photos_created_at_id", "created_at", "id"),)
+
+
+class PhotoRendition(Base):
+    """
+    One precomputed size and format of a photo, and the job producing it.
+    Rows are inserted ``pending`` with the photo and claimed by the
+    rendition worker for ``settings.rendition_lease`` seconds; a claim
+    that outlives its lease (the worker died) is taken over by the next
+    worker. ``width``/``height`` are the target box until the rendition is
+    ``ready``, then its rendered size.
+    """
+
+    __tablename__ = "photo_renditions"
+    id = Column(Integer, primary_key=True)
+    photo_id = Column(Integer, ForeignKey("photos.id", ondelete="CASCADE"), nullable=False)
+    name = Column(String(20), nullable=False)
+    format = Column(String(10), nullable=False)
+    width = Column(Integer, nullable=False)
+    height = Column(Integer, nullable=False)
+    crop = Column(String(10), nullable=False)
+    # the stored object, and the effect and rounding when they are
+    # storage transformations rather than rendered into it at upload
+    source_key = Column(String(255), nullable=False)
+    effect = Column(String(30), nullable=True)
+    rounded = Column(Boolean, default=False, server_default=false(), nullable=False)
+    status = Column(String(10), default="pending", server_default="pending", nullable=False)
+    attempts = Column(Integer, default=0, server_default="0", nullable=False)
+    claimed_at = Column(DateTime, nullable=True)
+    url = Column(String(255), nullable=True)
+
+    __table_args__ = (
+        UniqueConstraint("photo_id", "name", "format", name="uq_photo_renditions_photo_name_format"),
+        Index("ix_photo_renditions_status_claimed_at", "status", "claimed_at"),
+    )
+
+
+# Full-text search over photos.description, kept outside the ORM mapping:
+# Postgres gets a generated tsvector column with a GIN index plus a trigram
+# index for substring matches, SQLite an external content FTS5 table kept
+# in sync by triggers. Migration 7a4d2c9e1f60 creates the same objects.
+PHOTOS_SEARCH_DDL = {
+    "postgresql": [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        "ALTER TABLE photos ADD COLUMN search_vector tsvector GENERATED ALWAYS AS "
+        "(to_tsvector('simple', coalesce(description, ''))) STORED",
+        "CREATE INDEX ix_photos_search_vector ON photos USING gin (search_vector)",
+        "CREATE INDEX ix_photos_description_trgm ON photos USING gin (description gin_trgm_ops)",
+    ],
+    "sqlite": [
+        "CREATE VIRTUAL TABLE photos_fts USING fts5(description, content='photos', "
+        "content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+        "CREATE TRIGGER photos_fts_ai AFTER INSERT ON photos BEGIN "
+        "INSERT INTO photos_fts(rowid, description) VALUES (new.id, new.description); END",
+        "CREATE TRIGGER photos_fts_ad AFTER DELETE ON photos BEGIN "
+        "INSERT INTO photos_fts(photos_fts, rowid, description) "
+        "VALUES ('delete', old.id, old.description); END",
+        "CREATE TRIGGER photos_fts_au AFTER UPDATE OF description ON photos BEGIN "
+        "INSERT INTO photos_fts(photos_fts, rowid, description) "
+        "VALUES ('delete', old.id, old.description); "
+        "INSERT INTO photos_fts(rowid, description) VALUES (new.id, new.description); END",
+    ],
+}
+
+for _dialect, _statements in PHOTOS_SEARCH_DDL.items():
+    for _statement in _statements:
+        event.listen(Photo.__table__, "after_create", DDL(_statement).execute_if(dialect=_dialect))
+event.listen(
+    Photo.__table__,
+    "before_drop",
+    DDL("DROP TABLE IF EXISTS photos_fts").execute_if(dialect="sqlite"),
+)
 
 
 class Tag(Base):
     __tablename__ = "tags"
     id = Column(Integer, primary_key=True)
-    tag_name = Column(String(255), nullable=False)
+    tag_name = Column(String(255), nullable=False, unique=True, index=True)
 
 
 class Comment(Base):
     __tablename__ = "comments"
     id = Column(Integer, primary_key=True)
     comment = Column(String(255), nullable=False)
-    photo_id = Column("photo_id", ForeignKey("photos.id", ondelete="CASCADE"))
+    photo_id = Column("photo_id", ForeignKey("photos.id", ondelete="CASCADE"), index=True)
     user_id = Column("user_id", ForeignKey("users.id", ondelete="CASCADE"))
     photo = relationship("Photo", backref="photos", innerjoin=True)
     user = relationship("User", backref="user_comment", innerjoin=True)
@@ -75,7 +180,12 @@ class PhotoRating(Base):
     __tablename__ = "photorating"
     id = Column(Integer, primary_key=True)
     photo_id = Column(Integer, ForeignKey("photos.id", ondelete="CASCADE"))
-    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True)
     rating = Column(Integer)
     photo = relationship("Photo", back_populates="ratings")
     user = relationship("User", back_populates="photo_ratings")
+
+    # one vote per user and photo, also serves lookups by photo_id
+    __table_args__ = (
+        Index("ix_photorating_photo_id_user_id", "photo_id", "user_id", unique=True),
+    )
@@ -0,0 +1,89 @@
+import bisect
+import threading
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class PoolStats:
+    """
+    Counters and a wait time histogram for connection checkouts.
+    Buckets are cumulative upper bounds in seconds, like Prometheus ``le``.
+    """
+
+    def __init__(self, buckets: tuple = WAIT_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.bucket_counts = [0] * (len(self.buckets) + 1)
+            self.wait_count = 0
+            self.wait_sum = 0.0
+            self.wait_max = 0.0
+            self.timeouts = 0
+
+    def observe_wait(self, seconds: float) -> None:
+        with self._lock:
+            self.bucket_counts[bisect.bisect_left(self.buckets, seconds)] += 1
+            self.wait_count += 1
+            self.wait_sum += seconds
+            self.wait_max = max(self.wait_max, seconds)
+
+    def observe_timeout(self) -> None:
+        with self._lock:
+            self.timeouts += 1
+
+    def histogram(self) -> dict:
+        with self._lock:
+            counts = list(self.bucket_counts)
+        result, total = {}, 0
+        for bound, count in zip(self.buckets + ("+Inf",), counts):
+            total += count
+            result[str(bound)] = total
+        return result
+
+
+pool_stats = PoolStats()
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """
+    Queue pool that times how long each checkout waits for a free
+    connection and counts checkouts that hit ``pool_timeout``.
+    """
+
+    stats = pool_stats
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.stats.observe_timeout()
+            raise
+        self.stats.observe_wait(time.perf_counter() - start)
+        return connection
+
+
+def pool_status(pool) -> dict:
+    """
+    Live snapshot of a pool: queue pools report size and overflow,
+    other pool classes (e.g. NullPool for SQLite) only the wait stats.
+    """
+    status = {"pool_class": type(pool).__name__}
+    for name in ("size", "checkedin", "checkedout", "overflow", "timeout"):
+        method = getattr(pool, name, None)
+        status[name] = method() if callable(method) else None
+    status.update(
+        waits=pool_stats.wait_count,
+        wait_seconds_sum=pool_stats.wait_sum,
+        wait_seconds_max=pool_stats.wait_max,
+        timeouts=pool_stats.timeouts,
+        wait_histogram=pool_stats.histogram(),
+    )
+    return status
@@ -1,31 +1,41 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.models import Comment
+from src.repository.user_stats import bump_user_stats, profile_tags
 from src.schemas.comments import CommentModel, EditCommentModel
+from src.services.response_cache import response_cache
 
 
-async def create_comment(user_id: int, body: CommentModel, db: Session) -> Comment:
+async def create_comment(user_id: int, body: CommentModel, db: AsyncSession) -> Comment:
     comment = Comment(comment=body.comment, photo_id=body.photo_id, user_id=user_id)
     db.add(comment)
-    db.commit()
-    db.refresh(comment)
+    await bump_user_stats(user_id, db, comments_written=1)
+    await db.commit()
+    await db.refresh(comment)
+    await response_cache.invalidate(*await profile_tags([user_id], db))
     return comment
 
 
-async def get_comment(comment_id: int, db: Session) -> Comment | None:
-    return db.query(Comment).filter(Comment.id == comment_id).first()
+async def get_comment(comment_id: int, db: AsyncSession) -> Comment | None:
+    result = await db.execute(select(Comment).filter(Comment.id == comment_id))
+    return result.scalars().first()
 
 
-async def update_comment(body: EditCommentModel, db: Session) -> Comment | None:
-    comment = db.query(Comment).filter(Comment.id == body.comment_id).first()
+async def update_comment(body: EditCommentModel, db: AsyncSession) -> Comment | None:
+    result = await db.execute(select(Comment).filter(Comment.id == body.comment_id))
+    comment = result.scalars().first()
     if comment:
         comment.comment = body.edited_comment
-        db.commit()
+        await db.commit()
     return comment
 
 
-async def remove_comment(comment_id: int, db: Session) -> None:
-    comment = db.query(Comment).filter(Comment.id == comment_id).first()
+async def remove_comment(comment_id: int, db: AsyncSession) -> None:
+    result = await db.execute(select(Comment).filter(Comment.id == comment_id))
+    comment = result.scalars().first()
     if comment:
-        db.delete(comment)
-        db.commit()
+        await db.delete(comment)
+        await bump_user_stats(comment.user_id, db, comments_written=-1)
+        await db.commit()
+        await response_cache.invalidate(*await profile_tags([comment.user_id], db))
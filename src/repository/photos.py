@@ -1,125 +1,382 @@
-import time
-import calendar
-import io
-from typing import List
+import asyncio
+import base64
+import hashlib
+import json
+import re
+from datetime import datetime
+from typing import List, NamedTuple, Tuple
 
-import cloudinary
-import cloudinary.uploader
-import qrcode
-from sqlalchemy.orm import Session
-from qrcode.image.pure import PyPNGImage
+from fastapi import HTTPException, status
+from sqlalchemy import select, tuple_, func, or_, literal_column, table, column, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 
 from src.database.models import Photo, User, Role, Tag
 from src.repository import tags as repository_tags
+from src.repository.renditions import enqueue_many_renditions, enqueue_renditions
+from src.repository.user_stats import bump_user_stats, profile_tags
 from src.schemas.photos import DescriptionUpdate
 from src.conf.config import settings
+from src.services.response_cache import (
+    SEARCH_RATING_TAG,
+    SEARCH_TAG,
+    photo_tag,
+    rating_tag,
+    response_cache,
+)
+from src.services.qr import qr_codes
 
-
-current_GMT = time.gmtime()
-time_stamp = calendar.timegm(current_GMT)
+SEARCH_CONFIG = "simple"
+# larger result sets are not worth keeping as id lists
+SEARCH_CACHE_MAX_IDS = 1000
+photos_fts = table("photos_fts", column("rowid"))
 
 
 async def upload_photo(
-    user_id: int, src_url: str, description: str, tags: List, db: Session
+    user_id: int,
+    src_url: str,
+    description: str,
+    tags: List,
+    db: AsyncSession,
+    source_key: str | None = None,
+    effect: str | None = None,
+    rounded: bool = False,
 ) -> Photo:
+    """
+    With ``source_key`` (the stored object behind ``src_url``) the photo's
+    renditions are queued in the same transaction, for the rendition
+    worker to produce.
+    """
+    tag_list = []
     if tags:
         tag_list = await repository_tags.create_tags_for_photo(tags[0].split(","), db)
     new_photo = Photo(
         photo=src_url, user_id=user_id, description=description, tags=tag_list
     )
     db.add(new_photo)
-    db.commit()
-    db.refresh(new_photo)
+    if source_key is not None:
+        await db.flush()
+        await enqueue_renditions(new_photo.id, source_key, effect, rounded, db)
+    await bump_user_stats(user_id, db, photos_published=1)
+    await db.commit()
+    await db.refresh(new_photo, ["tags"])
+    await response_cache.invalidate(*await profile_tags([user_id], db), SEARCH_TAG)
     return new_photo
 
 
-async def get_all_photos(limit: int, offset: int, db: Session):
-    photos = db.query(Photo).limit(limit).offset(offset).all()
+class NewPhoto(NamedTuple):
+    src_url: str
+    description: str | None
+    tags: List[str]
+    source_key: str
+    effect: str | None = None
+    rounded: bool = False
+
+
+async def upload_photos(user_id: int, photos: List[NewPhoto], db: AsyncSession) -> List[Photo]:
+    """
+    ``upload_photo`` for many photos in one transaction: the tags of all
+    of them are resolved together, the rows inserted in one flush and
+    their renditions queued in one statement. Returns the photos in the
+    order given, with their tags.
+    """
+    tags = await repository_tags.resolve_tags([name for photo in photos for name in photo.tags], db)
+    new_photos = [
+        Photo(
+            photo=photo.src_url,
+            user_id=user_id,
+            description=photo.description,
+            tags=[tags[name] for name in dict.fromkeys(photo.tags)],
+        )
+        for photo in photos
+    ]
+    db.add_all(new_photos)
+    await db.flush()
+    await enqueue_many_renditions(
+        [
+            (new_photo.id, photo.source_key, photo.effect, photo.rounded)
+            for new_photo, photo in zip(new_photos, photos)
+        ],
+        db,
+    )
+    await bump_user_stats(user_id, db, photos_published=len(new_photos))
+    await db.commit()
+    ids = [new_photo.id for new_photo in new_photos]
+    result = await db.execute(
+        select_photos()
+        .filter(Photo.id.in_(ids))
+        .execution_options(populate_existing=True)
+    )
+    by_id = {photo.id: photo for photo in result.scalars()}
+    await response_cache.invalidate(*await profile_tags([user_id], db), SEARCH_TAG)
+    return [by_id[photo_id] for photo_id in ids]
+
+
+def select_photos():
+    """
+    Base statement for photos that get serialized with their tags. Tags of
+    the whole result come in one extra ``IN`` query, so a page costs two
+    queries regardless of its size instead of one lazy load per row.
+    """
+    return select(Photo).options(selectinload(Photo.tags))
+
+
+def encode_cursor(photo: Photo) -> str:
+    raw = json.dumps([photo.created_at.isoformat(), photo.id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, photo_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(photo_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+async def get_all_photos(limit: int, offset: int, db: AsyncSession):
+    result = await db.execute(
+        select_photos()
+        .order_by(Photo.created_at.desc(), Photo.id.desc())
+        .limit(limit)
+        .offset(offset)
+    )
+    photos = result.scalars().all()
     return photos
 
 
-async def get_photo(photo_id: int, db: Session) -> Photo:
-    return db.query(Photo).filter(Photo.id == photo_id).first()
+async def get_photos_page(
+    limit: int, cursor: str | None, db: AsyncSession
+) -> Tuple[List[Photo], str | None]:
+    """
+    Keyset pagination over ``(created_at, id)``, newest first. Each page
+    is an index range scan on ``ix_photos_created_at_id`` no matter how
+    deep it is, and rows inserted meanwhile don't shift later pages.
+    """
+    stmt = (
+        select_photos()
+        .order_by(Photo.created_at.desc(), Photo.id.desc())
+        .limit(limit + 1)
+    )
+    if cursor:
+        stmt = stmt.filter(tuple_(Photo.created_at, Photo.id) < decode_cursor(cursor))
+    result = await db.execute(stmt)
+    photos = result.scalars().all()
+    if len(photos) > limit:
+        photos = photos[:limit]
+        return photos, encode_cursor(photos[-1])
+    return photos, None
+
+
+async def get_photo(photo_id: int, db: AsyncSession) -> Photo:
+    result = await db.execute(select_photos().filter(Photo.id == photo_id))
+    return result.scalars().first()
 
 
-async def remove_photo(photo_id: int, user: User, db: Session) -> Photo | None:
+async def remove_photo(photo_id: int, user: User, db: AsyncSession) -> Photo | None:
     if user.roles == Role.admin:
-        photo = db.query(Photo).filter(Photo.id == photo_id).first()
+        stmt = select_photos().filter(Photo.id == photo_id)
     else:
-        photo = (
-            db.query(Photo)
-            .filter(Photo.id == photo_id, user.id == Photo.user_id)
-            .first()
-        )
+        stmt = select_photos().filter(Photo.id == photo_id, user.id == Photo.user_id)
+    result = await db.execute(stmt)
+    photo = result.scalars().first()
     if photo:
-        db.delete(photo)
-        db.commit()
+        await db.delete(photo)
+        # its ratings no longer count for the owner; comments and votes
+        # keep counting for their authors, the rows outlive the photo
+        await bump_user_stats(
+            photo.user_id,
+            db,
+            photos_published=-1,
+            ratings_received=-photo.rating_count,
+            rating_sum_received=-photo.rating_sum,
+        )
+        await db.commit()
+        await response_cache.invalidate(
+            *await profile_tags([photo.user_id], db),
+            photo_tag(photo.id),
+            rating_tag(photo.id),
+            SEARCH_TAG,
+        )
     return photo
 
 
 async def update_description(
-    photo_id: int, body: DescriptionUpdate, user: User, db: Session
+    photo_id: int, body: DescriptionUpdate, user: User, db: AsyncSession
 ) -> Photo | None:
     if user.roles == Role.admin:
-        photo = db.query(Photo).filter(Photo.id == photo_id).first()
+        stmt = select_photos().filter(Photo.id == photo_id)
     else:
-        photo = (
-            db.query(Photo)
-            .filter(Photo.id == photo_id, user.id == Photo.user_id)
-            .first()
-        )
+        stmt = select_photos().filter(Photo.id == photo_id, user.id == Photo.user_id)
+    result = await db.execute(stmt)
+    photo = result.scalars().first()
     if photo:
         photo.description = body.description
-        db.commit()
+        await db.commit()
+        await response_cache.invalidate(photo_tag(photo.id), SEARCH_TAG)
     return photo
 
 
+async def get_photo_url(photo_id: int, db: AsyncSession) -> str | None:
+    return await db.scalar(select(Photo.photo).filter(Photo.id == photo_id))
+
+
 async def create_qr_code(
-    photo_id: int, url: str, user: User, db: Session
+    photo_id: int, url: str, user: User, db: AsyncSession
 ) -> Photo | None:
-    photo = (
-        db.query(Photo).filter(Photo.id == photo_id, user.id == Photo.user_id).first()
+    result = await db.execute(
+        select_photos().filter(Photo.id == photo_id, user.id == Photo.user_id)
     )
-    if photo:
-        code = qrcode.make(url, image_factory=PyPNGImage)
-        buffer = io.BytesIO()
-        code.save(buffer)
-        buffer.seek(0)
-
-    cloudinary.config(
-        cloud_name=settings.cloudinary_name,
-        api_key=settings.cloudinary_api_key,
-        api_secret=settings.cloudinary_secret,
-        secure=True,
-    )
-    r = cloudinary.uploader.upload(
-        buffer,
-        public_id=f"photo_share_team4/qrcode/{user.user_name}_{time_stamp}",
-        overwrite=True,
-    )
-    src_url = cloudinary.CloudinaryImage(
-        f"photo_share_team4/qrcode/{user.user_name}_{time_stamp}"
-    ).build_url(width=500, height=500, crop="fill", version=r.get("version"))
-
-    photo.qr_code = src_url
-    db.commit()
+    photo = result.scalars().first()
+    if photo is None:
+        return None
+    src_url = await qr_codes.store(url)
+    if photo.qr_code != src_url:
+        photo.qr_code = src_url
+        await db.commit()
+        await response_cache.invalidate(photo_tag(photo.id))
     return photo
 
 
-async def search_photo_by_keyword(search_by: str, filter_by: str, db: Session) -> List[Photo]:
-    if filter_by == "creation_date":
-            result = db.query(Photo).filter(Photo.description.like(search_by)).order_by(Photo.created_at).all()
+async def generate_qr_codes(photo_ids: List[int] | None, limit: int, db: AsyncSession) -> int:
+    """
+    Store the QR codes of ``photo_ids``, or of up to ``limit`` photos that
+    have none, ``settings.qr_batch_concurrency`` at a time, and record
+    them in one commit. Returns how many photos got a new code.
+    """
+    stmt = select(Photo.id, Photo.photo, Photo.qr_code)
+    if photo_ids:
+        stmt = stmt.filter(Photo.id.in_(photo_ids))
+    else:
+        stmt = stmt.filter(Photo.qr_code.is_(None)).order_by(Photo.id).limit(limit)
+    rows = (await db.execute(stmt)).all()
+    semaphore = asyncio.Semaphore(settings.qr_batch_concurrency)
+
+    async def store(url: str) -> str:
+        async with semaphore:
+            return await qr_codes.store(url)
+
+    urls = await asyncio.gather(*(store(row.photo) for row in rows))
+    changed = [
+        {"id": row.id, "qr_code": url} for row, url in zip(rows, urls) if row.qr_code != url
+    ]
+    if changed:
+        await db.execute(update(Photo), changed)
+        await db.commit()
+        await response_cache.invalidate(*(photo_tag(row["id"]) for row in changed))
+    return len(changed)
+
+
+def parse_search_terms(search_by: str) -> List[Tuple[str, bool]]:
+    """
+    Split a search string into ``(word, is_prefix)`` terms, ``sun*``
+    matches every word starting with "sun". Anything but word characters
+    is dropped, so user input can't inject full-text query syntax.
+    """
+    return [
+        (word, star == "*") for word, star in re.findall(r"(\w+)(\*?)", search_by)
+    ]
+
+
+def _match_keywords(stmt, terms: List[Tuple[str, bool]], dialect: str):
+    """
+    Add the full-text match to ``stmt`` and return it with a relevance
+    ordering. Postgres also matches substrings of the description through
+    the trigram index, SQLite only whole words and prefixes.
+    """
+    if dialect == "postgresql":
+        vector = literal_column("photos.search_vector")
+        query = func.to_tsquery(
+            SEARCH_CONFIG,
+            " & ".join(f"{word}:*" if prefix else word for word, prefix in terms),
+        )
+        stmt = stmt.filter(
+            or_(
+                vector.op("@@")(query),
+                Photo.description.icontains(
+                    " ".join(word for word, _ in terms), autoescape=True
+                ),
+            )
+        )
+        return stmt, func.ts_rank_cd(vector, query).desc()
+    fts = literal_column("photos_fts")
+    query = " ".join(f'"{word}"*' if prefix else f'"{word}"' for word, prefix in terms)
+    stmt = stmt.join(photos_fts, photos_fts.c.rowid == Photo.id).filter(fts.op("MATCH")(query))
+    return stmt, func.bm25(fts)
+
+
+async def search_photo_by_keyword(
+    search_by: str, filter_by: str, db: AsyncSession, limit: int | None = None, offset: int = 0
+) -> List[Photo]:
+    terms = parse_search_terms(search_by)
+    if not terms:
+        return []
+    stmt, relevance = _match_keywords(select_photos(), terms, db.get_bind().dialect.name)
+    # Photo.id last: pages are cut with offset, ties must not move between them
+    if filter_by in ("created_at", "creation_date"):
+        stmt = stmt.order_by(Photo.created_at, Photo.id)
     elif filter_by == "rating":
-            result = db.query(Photo).filter(Photo.description.like(search_by)).order_by(Photo.average_rating).all()
+        stmt = stmt.order_by(Photo.average_rating, Photo.id)
     else:
-        result = db.query(Photo).filter(Photo.description == search_by).all()
-    return result
+        stmt = stmt.order_by(relevance, Photo.id)
+    result = await db.execute(stmt.limit(limit).offset(offset))
+    return result.scalars().all()
 
-async def search_photo_by_tag(search_by: str, filter_by: str, db: Session) -> List[Photo]:
-    if filter_by == "creation_date":
-        result = db.query(Photo).join(Photo.tags).filter(Tag.tag_name == search_by).order_by(Photo.created_at).all()
+
+async def search_photo_by_tag(
+    search_by: str, filter_by: str, db: AsyncSession, limit: int | None = None, offset: int = 0
+) -> List[Photo]:
+    stmt = select_photos().join(Photo.tags).filter(Tag.tag_name == search_by)
+    if filter_by in ("created_at", "creation_date"):
+        stmt = stmt.order_by(Photo.created_at, Photo.id)
     elif filter_by == "rating":
-        result = db.query(Photo).join(Photo.tags).filter(Tag.tag_name == search_by).order_by(Photo.average_rating).all()
+        stmt = stmt.order_by(Photo.average_rating, Photo.id)
     else:
-        result = db.query(Photo).join(Photo.tags).filter(Tag.tag_name == search_by).all()
-    return result
\ No newline at end of file
+        stmt = stmt.order_by(Photo.id)
+    result = await db.execute(stmt.limit(limit).offset(offset))
+    return result.scalars().all()
+
+
+async def get_photos_by_ids(ids: List[int], db: AsyncSession) -> List[Photo]:
+    """
+    Load photos in the order of ``ids`` with one batch query (plus the
+    one for their tags); ids of photos deleted meanwhile are skipped.
+    """
+    if not ids:
+        return []
+    result = await db.execute(select_photos().filter(Photo.id.in_(ids)))
+    photos = {photo.id: photo for photo in result.scalars().all()}
+    return [photos[photo_id] for photo_id in ids if photo_id in photos]
+
+
+SEARCHES = {"keyword": search_photo_by_keyword, "tag": search_photo_by_tag}
+
+
+async def cached_search(
+    kind: str,
+    search_by: str,
+    filter_by: str | None,
+    db: AsyncSession,
+    limit: int | None = None,
+    offset: int = 0,
+) -> List[Photo]:
+    """
+    Run the ``kind`` search ("keyword" or "tag") through the result cache.
+    Only the matching ids are cached, keyed on (query, filter_by, page),
+    and hydrated with ``get_photos_by_ids``, so hits stay current with
+    the rows themselves. Entries depend on the search generation, which
+    photo writes bump, and ``filter_by=rating`` ones also on the rating
+    generation, which rating writes bump.
+    """
+    params = json.dumps([kind, search_by, filter_by, limit, offset])
+    key = "search:" + hashlib.sha256(params.encode()).hexdigest()
+    tags = [SEARCH_TAG, SEARCH_RATING_TAG] if filter_by == "rating" else [SEARCH_TAG]
+    entry, generations = await response_cache.lookup(key, tags)
+    if entry is not None:
+        return await get_photos_by_ids(entry["ids"], db)
+    photos = await SEARCHES[kind](search_by, filter_by, db, limit=limit, offset=offset)
+    if generations is not None and len(photos) <= SEARCH_CACHE_MAX_IDS:
+        entry = {"ids": [photo.id for photo in photos], "generations": generations}
+        await response_cache.store(key, entry, settings.search_cache_ttl)
+    return photos
@@ -1,46 +1,146 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select, func, update, case, cast, Float
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.models import PhotoRating, Photo, User
 from src.schemas.rating import PhotoRatingModel
-from src.repository import photos as repository_photos
+from src.repository.user_stats import bump_user_stats, profile_tags
+from src.services.response_cache import SEARCH_RATING_TAG, rating_tag, response_cache
 
 
-async def create_rating(photo: Photo, body: PhotoRatingModel, user: User, db: Session):
-    rating = PhotoRating(**body.dict(), user=user)
-    db.add(rating)
-    db.commit()
-    db.refresh(rating)
-    photo = await update_avg_photo_rating(photo, db)
-    photo.rated_by = photo.rated_by + [user.id]
-    db.commit()
+def _average(count, total):
+    return case((count > 0, cast(total, Float) / count), else_=0.0)
+
+
+async def apply_rating_delta(photo_id: int, rating: int, count: int, db: AsyncSession):
+    """
+    Add (``count=1``) or take away (``count=-1``) one vote in a single
+    ``UPDATE``, so the cost doesn't grow with the number of ratings and
+    concurrent votes can't overwrite each other. The caller commits, which
+    keeps the aggregates in the same transaction as the rating row.
+    """
+    new_count = Photo.rating_count + count
+    new_sum = Photo.rating_sum + rating * count
+    await db.execute(
+        update(Photo)
+        .where(Photo.id == photo_id)
+        .values(
+            rating_count=new_count,
+            rating_sum=new_sum,
+            average_rating=_average(new_count, new_sum),
+        )
+        .execution_options(synchronize_session="fetch")
+    )
+
+
+async def create_rating(
+    photo: Photo, body: PhotoRatingModel, user: User, db: AsyncSession
+) -> PhotoRating | None:
+    """
+    Insert the vote unless ``user`` has already rated ``photo``, in which
+    case the unique ``(photo_id, user_id)`` index turns the insert into a
+    no-op and None is returned. Concurrent duplicate votes resolve in the
+    database, not in a read-then-write race.
+    """
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    result = await db.execute(
+        dialect.insert(PhotoRating)
+        .values(**body.dict(), user_id=user.id)
+        .on_conflict_do_nothing(index_elements=[PhotoRating.photo_id, PhotoRating.user_id])
+        .returning(PhotoRating)
+    )
+    rating = result.scalars().first()
+    if rating is None:
+        return None
+    await apply_rating_delta(rating.photo_id, rating.rating, 1, db)
+    await bump_user_stats(user.id, db, ratings_given=1)
+    await bump_user_stats(photo.user_id, db, ratings_received=1, rating_sum_received=rating.rating)
+    await db.commit()
+    await response_cache.invalidate(
+        *await profile_tags([user.id, photo.user_id], db),
+        rating_tag(rating.photo_id),
+        SEARCH_RATING_TAG,
+    )
     return rating
 
 
-async def update_avg_photo_rating(photo: Photo, db: Session):
-    total_ratings = len(photo.ratings)
-    total_rating_sum = sum([r.rating for r in photo.ratings])
-    avg_rating = total_rating_sum / total_ratings if total_ratings > 0 else 0.0
-    photo.average_rating = avg_rating
-    db.commit()
+def _aggregates_from_ratings():
+    ratings = select(PhotoRating).where(PhotoRating.photo_id == Photo.id)
+    count = ratings.with_only_columns(func.count(PhotoRating.id)).scalar_subquery()
+    total = ratings.with_only_columns(
+        func.coalesce(func.sum(PhotoRating.rating), 0)
+    ).scalar_subquery()
+    return dict(rating_count=count, rating_sum=total, average_rating=_average(count, total))
+
+
+async def update_avg_photo_rating(photo: Photo, db: AsyncSession):
+    """
+    Recompute the aggregates of one photo from its ``photorating`` rows.
+    """
+    await db.execute(
+        update(Photo)
+        .where(Photo.id == photo.id)
+        .values(**_aggregates_from_ratings())
+        .execution_options(synchronize_session="fetch")
+    )
+    await db.commit()
+    await response_cache.invalidate(rating_tag(photo.id), SEARCH_RATING_TAG)
     return photo
 
 
-async def get_rating_by_id(rating_id: int, db: Session):
-    rating = db.query(PhotoRating).filter_by(id=rating_id).first()
-    return rating
+async def rebuild_rating_aggregates(db: AsyncSession) -> int:
+    """
+    Repair: recompute the aggregates of every photo whose stored count or
+    sum disagrees with ``photorating``. Returns the number of fixed photos.
+    """
+    aggregates = _aggregates_from_ratings()
+    result = await db.execute(
+        update(Photo)
+        .where(
+            (Photo.rating_count != aggregates["rating_count"])
+            | (Photo.rating_sum != aggregates["rating_sum"])
+            | (Photo.average_rating.is_(None))
+        )
+        .values(**aggregates)
+        .returning(Photo.id)
+        .execution_options(synchronize_session=False)
+    )
+    fixed = result.scalars().all()
+    await db.commit()
+    if fixed:
+        await response_cache.invalidate(
+            *(rating_tag(photo_id) for photo_id in fixed), SEARCH_RATING_TAG
+        )
+    return len(fixed)
+
+
+async def get_rating_by_id(rating_id: int, db: AsyncSession):
+    result = await db.execute(select(PhotoRating).filter_by(id=rating_id))
+    return result.scalars().first()
 
 
-async def remove_rating(rating_id: int, db: Session):
+async def remove_rating(rating_id: int, db: AsyncSession):
     rating = await get_rating_by_id(rating_id, db)
     if rating:
-        photo = await repository_photos.get_photo(photo_id=rating.photo_id, db=db)
-        db.delete(rating)
-        db.commit()
-        await update_avg_photo_rating(photo, db)
+        await db.delete(rating)
+        await db.flush()
+        await apply_rating_delta(rating.photo_id, rating.rating, -1, db)
+        await bump_user_stats(rating.user_id, db, ratings_given=-1)
+        result = await db.execute(select(Photo.user_id).filter(Photo.id == rating.photo_id))
+        owner_id = result.scalar()
+        if owner_id is not None:
+            await bump_user_stats(
+                owner_id, db, ratings_received=-1, rating_sum_received=-rating.rating
+            )
+        await db.commit()
+        await response_cache.invalidate(
+            *await profile_tags([rating.user_id, owner_id], db),
+            rating_tag(rating.photo_id),
+            SEARCH_RATING_TAG,
+        )
     return rating
 
 
-async def get_rating(limit: int, offset: int, db: Session):
-    ratings = db.query(PhotoRating).limit(limit).offset(offset).all()
-    print(ratings)
-    return ratings
+async def get_rating(limit: int, offset: int, db: AsyncSession):
+    result = await db.execute(select(PhotoRating).limit(limit).offset(offset))
+    return result.scalars().all()
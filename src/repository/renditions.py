@@ -0,0 +1,203 @@
+from datetime import datetime, timedelta
+from typing import List, NamedTuple, Tuple
+
+from sqlalchemy import and_, case, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.conf.config import settings
+from src.database.models import Photo, PhotoRendition
+
+# 9 columns a row
+ENQUEUE_CHUNK_ROWS = 1000
+
+
+class RenditionSize(NamedTuple):
+    name: str
+    width: int
+    height: int
+    crop: str
+
+
+def parse_sizes(spec: str) -> List[RenditionSize]:
+    """``"thumb:160x160:fill,feed:640x640:limit"`` -> ``[RenditionSize(...), ...]``"""
+    sizes = []
+    for item in spec.split(","):
+        name, size, crop = item.strip().split(":")
+        width, height = size.split("x")
+        sizes.append(RenditionSize(name, int(width), int(height), crop))
+    return sizes
+
+
+async def enqueue_renditions(
+    photo_id: int, source_key: str, effect: str | None, rounded: bool, db: AsyncSession
+) -> None:
+    """
+    Add the configured renditions of a photo as pending rows to the
+    session's transaction, so they commit with the photo. Existing rows
+    are left alone, enqueueing again is harmless.
+    """
+    await enqueue_many_renditions([(photo_id, source_key, effect, rounded)], db)
+
+
+async def enqueue_many_renditions(
+    photos: List[Tuple[int, str, str | None, bool]], db: AsyncSession
+) -> None:
+    """``enqueue_renditions`` of ``(photo_id, source_key, effect, rounded)`` tuples at once."""
+    formats = [fmt.strip() for fmt in settings.rendition_formats.split(",")]
+    sizes = parse_sizes(settings.rendition_sizes)
+    rows = [
+        {
+            "photo_id": photo_id,
+            "name": size.name,
+            "format": fmt,
+            "width": size.width,
+            "height": size.height,
+            "crop": size.crop,
+            "source_key": source_key,
+            "effect": effect,
+            "rounded": rounded,
+        }
+        for photo_id, source_key, effect, rounded in photos
+        for size in sizes
+        for fmt in formats
+    ]
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    # keeps the bound parameters of a statement well under the drivers' limits
+    for start in range(0, len(rows), ENQUEUE_CHUNK_ROWS):
+        await db.execute(
+            dialect.insert(PhotoRendition)
+            .values(rows[start : start + ENQUEUE_CHUNK_ROWS])
+            .on_conflict_do_nothing(
+                index_elements=[PhotoRendition.photo_id, PhotoRendition.name, PhotoRendition.format]
+            )
+        )
+
+
+def _expired(now: datetime, lease: int):
+    return and_(
+        PhotoRendition.status == "running",
+        PhotoRendition.claimed_at < now - timedelta(seconds=lease),
+    )
+
+
+def _claimable(now: datetime, lease: int, max_attempts: int):
+    return or_(
+        PhotoRendition.status == "pending",
+        and_(_expired(now, lease), PhotoRendition.attempts < max_attempts),
+    )
+
+
+async def claim_renditions(
+    limit: int, lease: int, max_attempts: int, db: AsyncSession
+) -> List[PhotoRendition]:
+    """
+    Claim up to ``limit`` pending renditions, and running ones whose
+    ``lease`` ran out, for this worker and commit. The claim condition is
+    repeated in the UPDATE, so workers claiming at the same time never
+    get the same row; Postgres skips rows another claim has locked.
+    Expired claims count as attempts: those that used up ``max_attempts``
+    (e.g. a rendition that kills its worker) are marked failed instead.
+    """
+    now = datetime.utcnow()
+    await db.execute(
+        update(PhotoRendition)
+        .where(_expired(now, lease), PhotoRendition.attempts >= max_attempts)
+        .values(status="failed", claimed_at=None)
+        .execution_options(synchronize_session=False)
+    )
+    candidates = (
+        select(PhotoRendition.id)
+        .where(_claimable(now, lease, max_attempts))
+        .order_by(PhotoRendition.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    result = await db.execute(
+        update(PhotoRendition)
+        .where(PhotoRendition.id.in_(candidates), _claimable(now, lease, max_attempts))
+        .values(status="running", claimed_at=now, attempts=PhotoRendition.attempts + 1)
+        .returning(PhotoRendition)
+        .execution_options(synchronize_session=False)
+    )
+    claimed = result.scalars().all()
+    await db.commit()
+    return claimed
+
+
+def _still_claimed(rendition: PhotoRendition):
+    return and_(
+        PhotoRendition.id == rendition.id,
+        PhotoRendition.status == "running",
+        PhotoRendition.claimed_at == rendition.claimed_at,
+    )
+
+
+async def finish_rendition(
+    rendition: PhotoRendition, url: str, width: int, height: int, db: AsyncSession
+) -> bool:
+    """
+    Mark a claimed rendition ready and refresh ``Photo.renditions``.
+    False if the claim was taken over meanwhile, the other worker renders
+    the same url and records it.
+    """
+    result = await db.execute(
+        update(PhotoRendition)
+        .where(_still_claimed(rendition))
+        .values(status="ready", url=url, width=width, height=height)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount:
+        await _sync_photo(rendition.photo_id, db)
+    await db.commit()
+    return bool(result.rowcount)
+
+
+async def _sync_photo(photo_id: int, db: AsyncSession) -> None:
+    # the row lock orders concurrent updates of one photo, each sees the
+    # renditions the others committed
+    await db.execute(select(Photo.id).where(Photo.id == photo_id).with_for_update())
+    result = await db.execute(
+        select(
+            PhotoRendition.name,
+            PhotoRendition.format,
+            PhotoRendition.width,
+            PhotoRendition.height,
+            PhotoRendition.url,
+        )
+        .where(PhotoRendition.photo_id == photo_id, PhotoRendition.status == "ready")
+        .order_by(
+            PhotoRendition.width * PhotoRendition.height, PhotoRendition.name, PhotoRendition.format
+        )
+    )
+    await db.execute(
+        update(Photo)
+        .where(Photo.id == photo_id)
+        .values(renditions=[dict(row._mapping) for row in result])
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def fail_rendition(rendition: PhotoRendition, max_attempts: int, db: AsyncSession) -> None:
+    """Release a claimed rendition for a retry, or give up after ``max_attempts``."""
+    await db.execute(
+        update(PhotoRendition)
+        .where(_still_claimed(rendition))
+        .values(
+            status=case((PhotoRendition.attempts >= max_attempts, "failed"), else_="pending"),
+            claimed_at=None,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+
+
+async def retry_failed_renditions(db: AsyncSession) -> int:
+    result = await db.execute(
+        update(PhotoRendition)
+        .where(PhotoRendition.status == "failed")
+        .values(status="pending", attempts=0)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    return result.rowcount
@@ -1,21 +1,83 @@
+from typing import Dict, List
+
 from fastapi import HTTPException, status
 
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
+from src.conf.config import settings
 from src.database.models import Tag
+from src.services.cache import TTLCache
+
+# tag_name -> id of committed tags; tags are never renamed or deleted
+tag_ids = TTLCache(maxsize=settings.tag_cache_size, ttl=settings.tag_cache_ttl)
+
+
+async def _select_ids(names: List[str], db: AsyncSession) -> Dict[str, int]:
+    result = await db.execute(select(Tag.tag_name, Tag.id).filter(Tag.tag_name.in_(names)))
+    return dict(result.all())
+
 
+async def _insert_ids(names: List[str], db: AsyncSession) -> Dict[str, int]:
+    """
+    Insert the tags in one statement. Names another transaction inserted
+    first are skipped by ON CONFLICT and missing from the result.
+    """
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    result = await db.execute(
+        dialect.insert(Tag)
+        .values([{"tag_name": name} for name in names])
+        .on_conflict_do_nothing(index_elements=[Tag.tag_name])
+        .returning(Tag.tag_name, Tag.id)
+    )
+    return dict(result.all())
 
-async def create_tags_for_photo(tags: list, db: Session):
-    tag_obj = []
+
+async def create_tags_for_photo(tags: list, db: AsyncSession) -> List[Tag]:
+    """
+    Resolve tag names to ``Tag`` instances, creating missing tags in the
+    caller's transaction: hot tags come from ``tag_ids``, the rest from one
+    ``IN`` select, new ones from one ``INSERT ... ON CONFLICT DO NOTHING
+    RETURNING``. A tag a concurrent upload created first is read back
+    instead of failing on the unique index.
+    """
     if len(tags) > 5:
         raise HTTPException(
             status.HTTP_400_BAD_REQUEST, detail="Maximum amount of tags is 5"
         )
-    for tag_name in tags:
-        tag = db.query(Tag).filter(Tag.tag_name == tag_name).first()
-        if not tag:
-            tag = Tag(tag_name=tag_name)
-            db.add(tag)
-            db.commit()
-            db.refresh(tag)
-        tag_obj.append(tag)
-    return tag_obj
+    tags_by_name = await resolve_tags(tags, db)
+    return [tags_by_name[name] for name in dict.fromkeys(tags)]
+
+
+async def resolve_tags(tags: list, db: AsyncSession) -> Dict[str, Tag]:
+    """
+    ``create_tags_for_photo`` without the per-photo limit, by name, so the
+    tags of many photos are resolved with the same few statements.
+    """
+    names = list(dict.fromkeys(tags))
+    ids = {}
+    for name in names:
+        tag_id = tag_ids.get(name)
+        if tag_id is not None:
+            ids[name] = tag_id
+    missing = [name for name in names if name not in ids]
+    if missing:
+        found = await _select_ids(missing, db)
+        for name, tag_id in found.items():
+            tag_ids.set(name, tag_id)
+        new = [name for name in missing if name not in found]
+        if new:
+            # not cached: these ids only exist if the upload commits
+            found.update(await _insert_ids(new, db))
+            raced = [name for name in new if name not in found]
+            if raced:
+                found.update(await _select_ids(raced, db))
+        ids.update(found)
+    return {name: await _attach(Tag(id=ids[name], tag_name=name), db) for name in names}
+
+
+async def _attach(tag: Tag, db: AsyncSession) -> Tag:
+    # the row exists, so hand the session a persistent instance without a SELECT
+    make_transient_to_detached(tag)
+    return await db.merge(tag, load=False)
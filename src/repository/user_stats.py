@@ -0,0 +1,138 @@
+from typing import Iterable, List, Tuple
+
+from sqlalchemy import select, func, or_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.models import Comment, Photo, PhotoRating, User, UserStats
+from src.services.response_cache import profile_tag, response_cache
+
+COUNTERS = (
+    "photos_published",
+    "comments_written",
+    "ratings_given",
+    "ratings_received",
+    "rating_sum_received",
+)
+
+
+def _insert(db: AsyncSession):
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    return dialect.insert(UserStats)
+
+
+async def bump_user_stats(user_id: int, db: AsyncSession, **deltas: int) -> None:
+    """
+    Add ``deltas`` to the counters of one user in a single upsert, e.g.
+    ``bump_user_stats(user.id, db, comments_written=1)``. The caller
+    commits, so the counters change in the same transaction as the rows
+    they count.
+    """
+    stmt = _insert(db).values(user_id=user_id, **deltas)
+    await db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[UserStats.user_id],
+            set_={
+                name: getattr(UserStats, name) + getattr(stmt.excluded, name)
+                for name in deltas
+            },
+        )
+    )
+
+
+async def get_user_stats(user_id: int, db: AsyncSession) -> UserStats:
+    result = await db.execute(select(UserStats).filter(UserStats.user_id == user_id))
+    return result.scalars().first() or empty_stats(user_id)
+
+
+def empty_stats(user_id: int) -> UserStats:
+    return UserStats(user_id=user_id, **dict.fromkeys(COUNTERS, 0))
+
+
+def public_counters(stats: UserStats) -> dict:
+    """The counters as the profile schemas expose them."""
+    return dict(
+        photos_published=stats.photos_published,
+        comments_written=stats.comments_written,
+        ratings_given=stats.ratings_given,
+        ratings_received=stats.ratings_received,
+        average_received_rating=stats.average_received_rating,
+    )
+
+
+async def profile_tags(user_ids: Iterable[int], db: AsyncSession) -> List[str]:
+    # profiles are cached by user name, which the write paths don't carry
+    result = await db.execute(select(User.user_name).filter(User.id.in_(set(user_ids))))
+    return [profile_tag(name) for name in result.scalars()]
+
+
+def _counters_from_sources() -> dict:
+    """
+    The counters of ``User`` recomputed from the tables they count, as
+    correlated subqueries.
+    """
+    def count(model, *criteria):
+        return select(func.count(model.id)).where(*criteria).scalar_subquery()
+
+    received = (
+        select(PhotoRating.rating)
+        .join(Photo, Photo.id == PhotoRating.photo_id)
+        .where(Photo.user_id == User.id)
+    )
+    return dict(
+        photos_published=count(Photo, Photo.user_id == User.id),
+        comments_written=count(Comment, Comment.user_id == User.id),
+        ratings_given=count(PhotoRating, PhotoRating.user_id == User.id),
+        ratings_received=received.with_only_columns(
+            func.count(PhotoRating.id)
+        ).scalar_subquery(),
+        rating_sum_received=received.with_only_columns(
+            func.coalesce(func.sum(PhotoRating.rating), 0)
+        ).scalar_subquery(),
+    )
+
+
+async def find_stale_user_stats(db: AsyncSession) -> List[Tuple[int, str]]:
+    """
+    Consistency check: ``(id, user_name)`` of every user whose stored
+    counters disagree with the source tables. A missing row counts as zeros.
+    """
+    counters = _counters_from_sources()
+    result = await db.execute(
+        select(User.id, User.user_name)
+        .outerjoin(UserStats, UserStats.user_id == User.id)
+        .where(
+            or_(
+                *(
+                    func.coalesce(getattr(UserStats, name), 0) != expression
+                    for name, expression in counters.items()
+                )
+            )
+        )
+        .order_by(User.id)
+    )
+    return [tuple(row) for row in result.all()]
+
+
+async def rebuild_user_stats(db: AsyncSession) -> int:
+    """
+    Repair: recompute the counters of every user ``find_stale_user_stats``
+    reports. Returns the number of fixed users.
+    """
+    stale = await find_stale_user_stats(db)
+    if not stale:
+        return 0
+    counters = _counters_from_sources()
+    stmt = _insert(db).from_select(
+        ["user_id", *counters],
+        select(User.id, *counters.values()).where(User.id.in_([user_id for user_id, _ in stale])),
+    )
+    await db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[UserStats.user_id],
+            set_={name: getattr(stmt.excluded, name) for name in counters},
+        )
+    )
+    await db.commit()
+    await response_cache.invalidate(*(profile_tag(name) for _, name in stale))
+    return len(stale)
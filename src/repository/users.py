@@ -1,25 +1,31 @@
 from fastapi import Depends
 
-from sqlalchemy.orm import Session
-from src.database.models import User, Photo
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.database.models import User, UserStats
 from src.schemas.users import UserModel, UserPublic
 from src.database.connect import get_db
+from src.repository.user_stats import empty_stats, public_counters
+from src.services.user_cache import user_cache
 
 
-async def get_user_by_username(username: str, db: Session) -> User:
-    return db.query(User).filter(User.user_name == username).first()
+async def get_user_by_username(username: str, db: AsyncSession) -> User:
+    result = await db.execute(select(User).filter(User.user_name == username))
+    return result.scalars().first()
 
 
-async def get_user_by_email(email: str, db: Session) -> User:
-    return db.query(User).filter(User.email == email).first()
+async def get_user_by_email(email: str, db: AsyncSession) -> User:
+    result = await db.execute(select(User).filter(User.email == email))
+    return result.scalars().first()
 
 
-async def check_quantity_of_users(db: Session = Depends(get_db)) -> list:
-    users = db.query(User).all()
+async def check_quantity_of_users(db: AsyncSession = Depends(get_db)) -> list:
+    result = await db.execute(select(User))
+    users = result.scalars().all()
     return users
 
 
-async def create_user(body: UserModel, db: Session) -> User:
+async def create_user(body: UserModel, db: AsyncSession) -> User:
     users_list = await check_quantity_of_users(db)
     if len(users_list) == 0:
         user_data = body.dict()
@@ -28,72 +34,82 @@ async def create_user(body: UserModel, db: Session) -> User:
     else:
         new_user = User(**body.dict())
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     return new_user
 
 
-async def update_token(user: User, token: str | None, db: Session) -> None:
+async def update_token(user: User, token: str | None, db: AsyncSession) -> None:
     user.refresh_token = token
-    db.commit()
+    await db.commit()
 
 
-async def confirmed_email(email: str, db: Session) -> None:
+async def confirmed_email(email: str, db: AsyncSession) -> None:
     user = await get_user_by_email(email, db)
     user.confirmed = True
-    db.commit()
+    await db.commit()
+    await user_cache.invalidate(email)
     return user
 
 
-async def search_by_mail(inquiry: str, db: Session = Depends(get_db)):
-    contacts = db.query(User).filter_by(email=inquiry).first()
+async def search_by_mail(inquiry: str, db: AsyncSession = Depends(get_db)):
+    result = await db.execute(select(User).filter_by(email=inquiry))
+    contacts = result.scalars().first()
     return contacts
 
 
-async def check_exist_mail(body: UserModel, db: Session = Depends(get_db)):
-    check_mail = db.query(User).filter_by(email=body.email).first()
+async def check_exist_mail(body: UserModel, db: AsyncSession = Depends(get_db)):
+    result = await db.execute(select(User).filter_by(email=body.email))
+    check_mail = result.scalars().first()
     return check_mail
 
 
-async def check_exist_username(body: UserModel, db: Session = Depends(get_db)):
-    check_username = db.query(User).filter_by(user_name=body.user_name).first()
+async def check_exist_username(body: UserModel, db: AsyncSession = Depends(get_db)):
+    result = await db.execute(select(User).filter_by(user_name=body.user_name))
+    check_username = result.scalars().first()
     return check_username
 
 
-async def to_ban_user(body: UserModel, email: str, db: Session = Depends(get_db)):
-    user = db.query(User).filter_by(email=email).first()
+async def to_ban_user(body: UserModel, email: str, db: AsyncSession = Depends(get_db)):
+    result = await db.execute(select(User).filter_by(email=email))
+    user = result.scalars().first()
     user.ban_status = True
-    db.commit()
+    # no new access tokens from the refresh token either
+    user.refresh_token = None
+    await db.commit()
+    await user_cache.invalidate(email)
     return user
 
 
-async def check_ban_status(username: str, db: Session = Depends(get_db)):
-    user = db.query(User).filter_by(email=username).first()
+async def check_ban_status(username: str, db: AsyncSession = Depends(get_db)):
+    result = await db.execute(select(User).filter_by(email=username))
+    user = result.scalars().first()
     return user.ban_status
 
 
-async def get_user_profile(username: str, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.user_name == username).first()
-    if user:
-        photos_amount = db.query(Photo).filter(Photo.user_id == user.id).count()
+async def get_user_profile(username: str, db: AsyncSession = Depends(get_db)):
+    # one lookup by the unique user_name, the counters come from user_stats
+    result = await db.execute(
+        select(User.id, User.user_name, User.created_at, UserStats)
+        .outerjoin(UserStats, UserStats.user_id == User.id)
+        .filter(User.user_name == username)
+    )
+    row = result.first()
+    if row:
+        stats = row.UserStats or empty_stats(row.id)
         public_profile = UserPublic(
-            user_name=user.user_name,
-            photos_published=photos_amount,
-            created_at=user.created_at,
+            user_name=row.user_name,
+            created_at=row.created_at,
+            **public_counters(stats),
         )
-    return public_profile
+        return public_profile
 
 
-async def get_amount_photos(username: str, db: Session = Depends(get_db)):
-    user = await get_user_by_username(username=username, db=db)
-    if user:
-        photos_amount = db.query(Photo).filter(Photo.user_id == user.id).count()
-        return photos_amount
-
-
-async def change_password(user: User, new_password: str, db: Session = Depends(get_db)):
-    user.password = new_password
-    db.commit()
+async def change_password(user: User, new_password: str, db: AsyncSession = Depends(get_db)):
+    # ``user`` is usually the cached principal, not a row of this session
+    await db.execute(update(User).filter_by(id=user.id).values(password=new_password))
+    await db.commit()
+    await user_cache.invalidate(user.email)
     return user
 
 
@@ -0,0 +1,99 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.connect import engine, get_db
+from src.database.models import Role
+from src.database.pool import pool_status
+from src.repository import photos as repository_photos
+from src.repository import rating as repository_rating
+from src.repository import user_stats as repository_user_stats
+from src.schemas.admin import (
+    PoolStatsResponse,
+    QRCodesRequest,
+    QRCodesResponse,
+    RateLimiterStatsResponse,
+    RebuildResponse,
+    ResponseCacheStatsResponse,
+    UserCacheStatsResponse,
+)
+from src.services.rate_limit import rate_limiter
+from src.services.response_cache import response_cache
+from src.services.roles import RolesChecker
+from src.services.user_cache import user_cache
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+allowed_admin = RolesChecker([Role.admin])
+
+
+@router.get(
+    "/metrics/db_pool",
+    response_model=PoolStatsResponse,
+    name="Database pool statistics",
+    dependencies=[Depends(allowed_admin)],
+)
+async def db_pool_metrics():
+    return pool_status(engine.sync_engine.pool)
+
+
+@router.get(
+    "/metrics/user_cache",
+    response_model=UserCacheStatsResponse,
+    name="Principal cache statistics",
+    dependencies=[Depends(allowed_admin)],
+)
+async def user_cache_metrics():
+    return user_cache.stats()
+
+
+@router.get(
+    "/metrics/response_cache",
+    response_model=ResponseCacheStatsResponse,
+    name="Response cache statistics",
+    dependencies=[Depends(allowed_admin)],
+)
+async def response_cache_metrics():
+    return response_cache.stats()
+
+
+@router.get(
+    "/metrics/rate_limiter",
+    response_model=RateLimiterStatsResponse,
+    name="Rate limiter statistics",
+    dependencies=[Depends(allowed_admin)],
+)
+async def rate_limiter_metrics():
+    return rate_limiter.stats()
+
+
+@router.post(
+    "/ratings/rebuild",
+    response_model=RebuildResponse,
+    name="Rebuild photo rating aggregates",
+    dependencies=[Depends(allowed_admin)],
+)
+async def rebuild_rating_aggregates(db: AsyncSession = Depends(get_db)):
+    fixed = await repository_rating.rebuild_rating_aggregates(db)
+    return RebuildResponse(fixed=fixed)
+
+
+@router.post(
+    "/user_stats/rebuild",
+    response_model=RebuildResponse,
+    name="Rebuild user stats",
+    dependencies=[Depends(allowed_admin)],
+)
+async def rebuild_user_stats(db: AsyncSession = Depends(get_db)):
+    fixed = await repository_user_stats.rebuild_user_stats(db)
+    return RebuildResponse(fixed=fixed)
+
+
+@router.post(
+    "/qr_codes/generate",
+    response_model=QRCodesResponse,
+    name="Generate photo QR codes",
+    dependencies=[Depends(allowed_admin)],
+)
+async def generate_qr_codes(body: QRCodesRequest, db: AsyncSession = Depends(get_db)):
+    generated = await repository_photos.generate_qr_codes(body.photo_ids, body.limit, db)
+    return QRCodesResponse(generated=generated)
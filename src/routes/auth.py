@@ -14,8 +14,7 @@ from fastapi.security import (
     HTTPAuthorizationCredentials,
     HTTPBearer,
 )
-from fastapi_limiter.depends import RateLimiter
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.connect import get_db
 from src.schemas.users import (
@@ -31,6 +30,8 @@ from src.schemas.auth import (
 from src.repository import users as repository_users
 from src.services.auth import auth_service
 from src.services.email import send_email, send_email_reset_password_token
+from src.services.rate_limit import RateLimiter
+from src.services.user_cache import user_cache
 
 
 router = APIRouter(prefix="/auth", tags=["auth"])
@@ -44,7 +45,7 @@ async def signup(
     body: UserModel,
     background_tasks: BackgroundTasks,
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     exist_user = await repository_users.search_by_mail(body.email, db)
     if exist_user:
@@ -57,7 +58,7 @@ async def signup(
             status_code=status.HTTP_409_CONFLICT,
             detail="Such username already registered",
         )
-    body.password = auth_service.get_password_hash(body.password)
+    body.password = await auth_service.get_password_hash(body.password)
     user = await repository_users.create_user(body, db)
     background_tasks.add_task(send_email, user.email, user.user_name, request.base_url)
     return {"user": user, "detail": "User successfully created"}
@@ -65,14 +66,17 @@ async def signup(
 
 @router.post("/login", response_model=TokenModel)
 async def login(
-    body: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)
+    body: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)
 ):
     user = await repository_users.search_by_mail(body.username, db)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid email"
         )
-    if not auth_service.verify_password(body.password, user.password):
+    valid, new_hash = await auth_service.verify_and_update_password(
+        body.password, user.password
+    )
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid password"
         )
@@ -85,12 +89,17 @@ async def login(
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN, detail="Your account is banned"
         )
+    if new_hash:
+        # stored with an outdated cost, upgrade it now that we know the password
+        user.password = new_hash
     # Generate JWT
     access_token = await auth_service.create_access_token(
         data={"sub": user.email}, expires_delta=7200
     )
     refresh_token = await auth_service.create_refresh_token(data={"sub": user.email})
     await repository_users.update_token(user, refresh_token, db)
+    if new_hash:
+        await user_cache.invalidate(user.email)
     return {
         "access_token": access_token,
         "refresh_token": refresh_token,
@@ -101,7 +110,7 @@ async def login(
 @router.get("/refresh_token", response_model=TokenModel)
 async def refresh_token(
     credentials: HTTPAuthorizationCredentials = Security(security),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     token = credentials.credentials
     email = await auth_service.decode_refresh_token(token)
@@ -127,7 +136,7 @@ async def request_email(
     body: RequestEmail,
     background_tasks: BackgroundTasks,
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     contact = await repository_users.search_by_mail(body.email, db)
 
@@ -141,7 +150,7 @@ async def request_email(
 
 
 @router.get("/confirmed_email/{token}")
-async def confirmed_email(token: str, db: Session = Depends(get_db)):
+async def confirmed_email(token: str, db: AsyncSession = Depends(get_db)):
     email = await auth_service.get_email_from_token(token)
     contact = await repository_users.search_by_mail(email, db)
     if contact is None:
@@ -162,7 +171,7 @@ async def confirmed_email(token: str, db: Session = Depends(get_db)):
 async def forgot_password(
     email: str,
     background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     user = await repository_users.search_by_mail(email, db)
     if not user:
@@ -177,8 +186,8 @@ async def forgot_password(
         user.user_name,
     )
 
-    user.reset_password_token = reset_password_token
-    db.commit()
+    user.reset_password_token = str(reset_password_token)
+    await db.commit()
 
     return {
         "message": f"Reset password token has been sent to your e-email.{reset_password_token}"
@@ -195,7 +204,7 @@ async def forgot_password(
 )
 async def reset_password(
     body: ResetPasswordModel,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     user = await repository_users.search_by_mail(body.email, db)
     if not user:
@@ -214,9 +223,10 @@ async def reset_password(
             status_code=status.HTTP_404_NOT_FOUND, detail="New password is not match."
         )
 
-    body.password = auth_service.get_password_hash(body.password)
+    body.password = await auth_service.get_password_hash(body.password)
     user.password = body.password
     user.reset_password_token = None
-    db.commit()
+    await db.commit()
+    await user_cache.invalidate(user.email)
 
     return user
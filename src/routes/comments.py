@@ -8,8 +8,7 @@ from fastapi import (
     status,
     Form,
 )
-from fastapi_limiter.depends import RateLimiter
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from src.database.connect import get_db
 from src.database.models import User, Role
 from src.schemas.comments import CommentModel, EditCommentModel, CommentDb
@@ -17,6 +16,7 @@ from src.schemas.comments import CommentModel, EditCommentModel, CommentDb
 from src.repository import photos as repository_photos
 from src.repository import comments as repository_comments
 from src.services.auth import auth_service
+from src.services.rate_limit import RateLimiter
 from src.services.roles import RolesChecker
 
 current_GMT = time.gmtime()
@@ -40,7 +40,7 @@ allowed_update_comment = RolesChecker([Role.admin, Role.moderator, Role.user])
 )
 async def add_comment(
     body: CommentModel,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(auth_service.get_current_user),
 ):
     photo = await repository_photos.get_photo(body.photo_id, db)
@@ -60,7 +60,7 @@ async def add_comment(
 )
 async def edit_comment(
     body: EditCommentModel,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(auth_service.get_current_user),
 ):
     check_comment = await repository_comments.get_comment(body.comment_id, db)
@@ -83,7 +83,7 @@ async def edit_comment(
 )
 async def remove_comment_sw(
     body: int = Form(),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(auth_service.get_current_user),
 ):
     check_comment = await repository_comments.get_comment(body, db)
@@ -1,32 +1,46 @@
-import calendar
-import time
-from typing import List
+import asyncio
+import io
+from typing import List, Tuple
 
-import cloudinary
-import cloudinary.uploader
 from fastapi import (
     APIRouter,
     Depends,
-    File,
     HTTPException,
-    UploadFile,
+    Request,
+    Response,
     status,
-    Form,
     Query,
 )
-from fastapi_limiter.depends import RateLimiter
-from sqlalchemy.orm import Session
+from pydantic import parse_raw_as
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.conf.config import settings
 from src.database.connect import get_db
 from src.database.models import User, Role
-from src.schemas.photos import PhotoModel, PhotoDb, PhotoResponse, PhotoSearch
+from src.schemas.photos import (
+    BatchUploadItem,
+    BatchUploadResponse,
+    BatchUploadResult,
+    PhotoModel,
+    PhotoDb,
+    PhotoPage,
+    PhotoResponse,
+    PhotoSearch,
+)
 from src.repository import photos as repository_photos
 from src.services.auth import auth_service
+from src.services.effects import effects_engine
+from src.services.ingest import IngestedFile, ingest_batch, ingest_upload
+from src.services.qr import qr_codes
+from src.services.rate_limit import RateLimiter
+from src.services.renditions import rendition_worker
+from src.services.response_cache import CachedRoute, photo_tag, response_cache
 from src.services.roles import RolesChecker
-from src.conf.config import settings
+from src.services.storage import StorageWriter, storage
+from src.services.uploads import upload_executor
+from utils.py_logger import get_logger
 
-current_GMT = time.gmtime()
-time_stamp = calendar.timegm(current_GMT)
+logger = get_logger(__name__)
 
 router = APIRouter(prefix="/photos", tags=["photos"])
 
@@ -34,20 +48,121 @@ allowed_post_photo = RolesChecker([Role.admin, Role.moderator, Role.user])
 allowed_remove_photo = RolesChecker([Role.admin, Role.user])
 allowed_update_photo = RolesChecker([Role.admin, Role.user])
 
+photo_cache = CachedRoute(response_cache, "photo", PhotoDb, ttl=300)
+
 
 @router.get(
     "/",
-    response_model=List[PhotoDb],
+    response_model=PhotoPage | List[PhotoDb],
     dependencies=[Depends(RateLimiter(times=2, seconds=5))],
 )
 async def get_photos(
-    limit: int = Query(10, le=100),
-    offset: int = 0,
+    limit: int = Query(10, ge=1, le=100),
+    paged: bool = Query(
+        False, description="Return {items, next_cursor} pages instead of a plain list"
+    ),
+    cursor: str = Query(None, description="next_cursor of the previous page, implies paged"),
+    offset: int = Query(0, ge=0, description="Plain list paging"),
     current_user: User = Depends(auth_service.get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    photos = await repository_photos.get_all_photos(limit, offset, db)
-    return photos
+    # a plain list stays the default for existing clients, cursor pages are opt-in
+    if not paged and cursor is None:
+        photos = await repository_photos.get_all_photos(limit, offset, db)
+        return photos
+    photos, next_cursor = await repository_photos.get_photos_page(limit, cursor, db)
+    return {"items": photos, "next_cursor": next_cursor}
+
+
+EFFECTS = [
+    "grayscale",
+    "sepia",
+    "vignette",
+    "cartoonify",
+    "blur",
+    "art:athena",
+    "art:eucalyptus",
+    "art:frost",
+    "art:zorro",
+    "art:sizzle",
+]
+
+# the body is parsed by ingest_upload, not by FastAPI, so it is described here
+UPLOAD_FORM = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["file"],
+                    "properties": {
+                        "body": {"type": "string"},
+                        "tags": {"type": "array", "items": {"type": "string"}},
+                        "file": {"type": "string", "format": "binary"},
+                    },
+                }
+            }
+        },
+    }
+}
+
+BATCH_UPLOAD_FORM = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["files"],
+                    "properties": {
+                        "items": {
+                            "type": "string",
+                            "description": 'JSON list, one {"description": ..., "tags": [...]} per file, in order',
+                        },
+                        "files": {"type": "array", "items": {"type": "string", "format": "binary"}},
+                    },
+                }
+            }
+        },
+    }
+}
+
+
+async def store_upload(
+    writer: StorageWriter, effect: str | None, rounded: bool
+) -> Tuple[str, str, str | None, bool]:
+    """
+    Store a received photo, return its key, its url and the effect and
+    rounding its renditions still need. With the local effects backend
+    the 500x500 render the url points to is a separate object, the key
+    stays the original's, so renditions are made from the full image.
+    """
+    try:
+        if settings.effects_backend == "local":
+            # the worker process reads the spooled file itself
+            image = await effects_engine.render(writer.path(), effect, rounded, width=500, height=500)
+        key = await upload_executor.submit(writer.commit)
+    except BaseException:
+        # e.g. not an image, or the executor is saturated and commit never ran
+        writer.abort()
+        raise
+    if settings.effects_backend == "local":
+        rendered = await upload_executor.submit(
+            storage.store, io.BytesIO(image), "photo_share_team4"
+        )
+        return key, storage.url(rendered, fetch_format="auto"), effect, rounded
+
+    src_url = storage.url(
+        key,
+        width=500,
+        height=500,
+        crop="fill",
+        effect=effect,
+        radius="max" if rounded else None,
+        fetch_format="auto",
+    )
+    return key, src_url, effect, rounded
 
 
 @router.post(
@@ -59,79 +174,151 @@ async def get_photos(
         Depends(allowed_post_photo),
         Depends(RateLimiter(times=2, seconds=5)),
     ],
+    openapi_extra=UPLOAD_FORM,
 )
 async def add_photo(
-    body: str = Form(default=None),
-    tags: List = Form(default=None),
-    file: UploadFile = File(),
-    effects: str = Query(
-        None,
-        enum=[
-            "grayscale",
-            "sepia",
-            "vignette",
-            "cartoonify",
-            "blur",
-            "art:athena",
-            "art:eucalyptus",
-            "art:frost",
-            "art:zorro",
-            "art:sizzle",
-        ],
-    ),
+    request: Request,
+    effects: str = Query(None, enum=EFFECTS),
     round_image: str = Query(None, enum=["yes"]),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(auth_service.get_current_user),
 ):
-    if round_image:
-        radius = "max"
-    else:
-        radius = None
-
-    cloudinary.config(
-        cloud_name=settings.cloudinary_name,
-        api_key=settings.cloudinary_api_key,
-        api_secret=settings.cloudinary_secret,
-        secure=True,
+    # streamed into storage as it arrives, after auth and rate limiting
+    writer = storage.writer("photo_share_team4")
+    upload = await ingest_upload(request, writer, settings.upload_max_bytes)
+    body = upload.fields.get("body", [None])[0]
+    tags = upload.fields.get("tags")
+
+    key, src_url, effects, rounded = await store_upload(writer, effects, bool(round_image))
+    photo = await repository_photos.upload_photo(
+        current_user.id,
+        src_url,
+        body,
+        tags,
+        db,
+        source_key=key,
+        effect=effects,
+        rounded=rounded,
     )
+    rendition_worker.notify()
+    return {"photo": photo, "detail": "Photo has been upload successfully"}
+
 
-    r = cloudinary.uploader.upload(
-        file.file,
-        public_id=f"photo_share_team4/{current_user.user_name}_{time_stamp}",
-        overwrite=True,
+@router.post(
+    "/upload/batch",
+    response_model=BatchUploadResponse,
+    name="Upload photos",
+    dependencies=[
+        Depends(allowed_post_photo),
+        Depends(RateLimiter(times=2, seconds=60)),
+    ],
+    openapi_extra=BATCH_UPLOAD_FORM,
+)
+async def add_photos(
+    request: Request,
+    effects: str = Query(None, enum=EFFECTS),
+    round_image: str = Query(None, enum=["yes"]),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(auth_service.get_current_user),
+):
+    """
+    Up to ``UPLOAD_BATCH_MAX_FILES`` photos in one request. Files that are
+    rejected or fail to store are reported in their item and do not stop
+    the others, which are stored ``UPLOAD_BATCH_CONCURRENCY`` at a time
+    and created together.
+    """
+    fields, files = await ingest_batch(
+        request,
+        lambda: storage.writer("photo_share_team4"),
+        settings.upload_max_bytes,
+        settings.upload_batch_max_files,
     )
-    src_url = cloudinary.CloudinaryImage(
-        f"photo_share_team4/{current_user.user_name}_{time_stamp}"
-    ).build_url(
-        width=500,
-        height=500,
-        crop="fill",
-        effect=effects,
-        radius=radius,
-        fetch_format="auto",
-        version=r.get("version"),
+    try:
+        items = parse_raw_as(List[BatchUploadItem], fields.get("items", ["[]"])[0])
+        if len(items) > len(files):
+            raise ValueError(f"{len(items)} items for {len(files)} files")
+    except ValueError as error:
+        for file in files:
+            file.writer.abort()
+        raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"Invalid items: {error}")
+    items += [BatchUploadItem() for _ in range(len(files) - len(items))]
+
+    semaphore = asyncio.Semaphore(settings.upload_batch_concurrency)
+
+    async def store(file: IngestedFile):
+        async with semaphore:
+            return await store_upload(file.writer, effects, bool(round_image))
+
+    results = {}
+
+    def fail(index: int, error: HTTPException) -> None:
+        results[index] = BatchUploadResult(
+            index=index,
+            filename=files[index].filename,
+            status_code=error.status_code,
+            detail=error.detail,
+        )
+
+    accepted = []
+    for index, file in enumerate(files):
+        if file.error is None:
+            accepted.append(index)
+        else:
+            fail(index, file.error)
+    stored = await asyncio.gather(
+        *(store(files[index]) for index in accepted), return_exceptions=True
     )
+    new_photos = {}
+    for index, outcome in zip(accepted, stored):
+        if isinstance(outcome, HTTPException):
+            fail(index, outcome)
+        elif isinstance(outcome, Exception):
+            logger.error(f"batch upload of {files[index].filename!r} failed: {outcome!r}")
+            fail(index, HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR, "Upload failed"))
+        else:
+            key, src_url, effect, rounded = outcome
+            new_photos[index] = repository_photos.NewPhoto(
+                src_url, items[index].description, items[index].tags, key, effect, rounded
+            )
 
-    photo = await repository_photos.upload_photo(
-        current_user.id, src_url, body, tags, db
+    if new_photos:
+        photos = await repository_photos.upload_photos(
+            current_user.id, list(new_photos.values()), db
+        )
+        for index, photo in zip(new_photos, photos):
+            results[index] = BatchUploadResult(
+                index=index,
+                filename=files[index].filename,
+                status_code=status.HTTP_201_CREATED,
+                photo=photo,
+            )
+        rendition_worker.notify()
+    return BatchUploadResponse(
+        items=[results[index] for index in range(len(files))],
+        uploaded=len(new_photos),
+        failed=len(files) - len(new_photos),
     )
-    return {"photo": photo, "detail": "Photo has been upload successfully"}
 
 
 @router.get("/{photo_id}", response_model=PhotoDb)
 async def get_photo_by_id(
     photo_id: int,
+    request: Request,
     current_user: User = Depends(auth_service.get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     if current_user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
-    photo = await repository_photos.get_photo(photo_id, db)
-    if photo is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="Photo not found"
-        )
-    return photo
+
+    async def load():
+        photo = await repository_photos.get_photo(photo_id, db)
+        if photo is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="Photo not found"
+            )
+        return photo, (photo.id, photo.updated_at)
+
+    return await photo_cache.respond(request, photo_id, [photo_tag(photo_id)], load)
 
 
 @router.delete(
@@ -141,7 +328,7 @@ async def get_photo_by_id(
 )
 async def remove_photo(
     photo_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(auth_service.get_current_user),
 ):
     photo = await repository_photos.remove_photo(photo_id, current_user, db)
@@ -160,7 +347,7 @@ async def remove_photo(
 async def update_photo_description(
     body: PhotoModel,
     photo_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(auth_service.get_current_user),
 ):
     photo = await repository_photos.update_description(photo_id, body, current_user, db)
@@ -177,7 +364,7 @@ async def update_photo_description(
 async def get_qr_code(
     photo_id: int,
     current_user: User = Depends(auth_service.get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     if current_user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
@@ -192,15 +379,48 @@ async def get_qr_code(
     return qr_code
 
 
+@router.get(
+    "/{photo_id}/qr.png",
+    response_class=Response,
+    responses={200: {"content": {"image/png": {}}}},
+    name="QR code image of photo",
+)
+async def get_qr_code_png(
+    photo_id: int,
+    request: Request,
+    current_user: User = Depends(auth_service.get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    if current_user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    url = await repository_photos.get_photo_url(photo_id, db)
+    if url is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Photo not found"
+        )
+    # the digest covers everything the image is made of, it never goes stale
+    headers = {
+        "Cache-Control": "private, max-age=31536000, immutable",
+        "ETag": f'"{qr_codes.digest(url)}"',
+    }
+    if request.headers.get("If-None-Match") == headers["ETag"]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(await qr_codes.png(url), media_type="image/png", headers=headers)
+
+
 @router.get("/search_keyword/", name="Search photos by keyword", response_model=List[PhotoSearch])
 async def search_photo_by_keyword(
     search_by: str,
     filter_by: str = Query(None, enum=["rating", "created_at"]),
+    limit: int = Query(None, ge=1, le=100),
+    offset: int = Query(0, ge=0),
     current_user: User = Depends(auth_service.get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     if search_by:
-        photo = await repository_photos.search_photo_by_keyword(search_by, filter_by, db)
+        photo = await repository_photos.cached_search(
+            "keyword", search_by, filter_by, db, limit=limit, offset=offset
+        )
     if photo is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Photo not found"
@@ -212,12 +432,15 @@ async def search_photo_by_keyword(
 async def search_photo_by_tag(
     search_by: str,
     filter_by: str = Query(None, enum=["rating", "created_at"]),
+    limit: int = Query(None, ge=1, le=100),
+    offset: int = Query(0, ge=0),
     current_user: User = Depends(auth_service.get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     if search_by:
-        photo = await repository_photos.search_photo_by_tag(
-            search_by, filter_by, db)
+        photo = await repository_photos.cached_search(
+            "tag", search_by, filter_by, db, limit=limit, offset=offset
+        )
     if photo is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Photo not found"
@@ -7,9 +7,10 @@ from fastapi import (
     HTTPException,
     status,
     Query,
+    Request,
 )
 
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.connect import get_db
 from src.database.models import User, Role
@@ -17,45 +18,54 @@ from src.schemas.rating import AvgPhotoRatingResponse, PhotoRatingModel, PhotoRa
 from src.repository import photos as repository_photos
 from src.repository import rating as repository_rating
 from src.services.auth import auth_service
+from src.services.response_cache import CachedRoute, rating_tag, response_cache
 from src.services.roles import RolesChecker
 
 router = APIRouter(prefix="/rating", tags=["rating"])
 
 allowed_edit_rating = RolesChecker([Role.admin, Role.moderator])
 
+avg_rating_cache = CachedRoute(response_cache, "avg_rating", AvgPhotoRatingResponse, ttl=60)
+
 
 @router.get("/", response_model=List[PhotoRatingResponseModel],
             dependencies=([Depends(allowed_edit_rating)]))
-async def get_rating(limit: int = Query(10, le=100), offset: int = 0, db: Session = Depends(get_db)):
+async def get_rating(limit: int = Query(10, le=100), offset: int = 0, db: AsyncSession = Depends(get_db)):
     ratings = await repository_rating.get_rating(limit=limit, offset=offset, db=db)
     return ratings
 
 
 @router.post("/", response_model=PhotoRatingResponseModel, status_code=status.HTTP_201_CREATED)
 async def rate_photo(photo_rating: PhotoRatingModel, current_user: User = Depends(auth_service.get_current_user),
-                     db: Session = Depends(get_db)):
+                     db: AsyncSession = Depends(get_db)):
     photo = await repository_photos.get_photo(photo_rating.photo_id, db)
+    if not photo:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Photo not found")
     if photo.user_id == current_user.id:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="You cannot rate your own photo")
-    if current_user.id in photo.rated_by:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="You have already rated this photo")
     rating = await repository_rating.create_rating(photo, photo_rating, current_user, db)
+    if rating is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="You have already rated this photo")
     return rating
 
 
 @router.get("/{photo_id}", response_model=AvgPhotoRatingResponse)
-async def get_avg_rating(photo_id: int, current_user: User = Depends(auth_service.get_current_user),
-                         db: Session = Depends(get_db)):
-    photo = await repository_photos.get_photo(photo_id, db)
-    if not photo:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Photo not found")
-    avg_rating = AvgPhotoRatingResponse(photo_id=photo.id, avg_rating=photo.average_rating)
-    return avg_rating
+async def get_avg_rating(photo_id: int, request: Request,
+                         current_user: User = Depends(auth_service.get_current_user),
+                         db: AsyncSession = Depends(get_db)):
+    async def load():
+        photo = await repository_photos.get_photo(photo_id, db)
+        if not photo:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Photo not found")
+        avg_rating = AvgPhotoRatingResponse(photo_id=photo.id, avg_rating=photo.average_rating)
+        return avg_rating, (photo.id, photo.rating_count, photo.rating_sum)
+
+    return await avg_rating_cache.respond(request, photo_id, [rating_tag(photo_id)], load)
 
 
 @router.delete("/{rating_id}", status_code=status.HTTP_204_NO_CONTENT,
                dependencies=([Depends(allowed_edit_rating)]))
-async def remove_rating(rating_id: int, db: Session = Depends(get_db)):
+async def remove_rating(rating_id: int, db: AsyncSession = Depends(get_db)):
     rating = await repository_rating.remove_rating(rating_id, db)
     if not rating:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Photo rating not found")
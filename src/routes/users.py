@@ -1,6 +1,5 @@
-from fastapi import APIRouter, Form, Depends, HTTPException, status
-from fastapi_limiter.depends import RateLimiter
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Form, Depends, HTTPException, Request, status
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.connect import get_db
 from src.database.models import User, Role
@@ -12,7 +11,10 @@ from src.schemas.users import (
     ChangePasswordRequest,
 )
 from src.repository import users as repository_users
+from src.repository import user_stats as repository_user_stats
 from src.services.auth import auth_service
+from src.services.rate_limit import RateLimiter
+from src.services.response_cache import CachedRoute, profile_tag, response_cache
 from src.services.roles import RolesChecker
 
 router = APIRouter(prefix="/users", tags=["users"])
@@ -21,6 +23,8 @@ allowed_get_users = RolesChecker([Role.admin, Role.moderator, Role.user])
 allowed_create_users = RolesChecker([Role.admin, Role.moderator, Role.user])
 allowed_ban_users = RolesChecker([Role.admin])
 
+profile_cache = CachedRoute(response_cache, "profile", UserPublic, ttl=120)
+
 
 @router.post(
     "/",
@@ -32,7 +36,7 @@ allowed_ban_users = RolesChecker([Role.admin])
         Depends(RateLimiter(times=2, seconds=5)),
     ],
 )
-async def create_user(body: UserModel, db: Session = Depends(get_db)):
+async def create_user(body: UserModel, db: AsyncSession = Depends(get_db)):
     check_mail = await repository_users.check_exist_mail(body, db)
     if check_mail:
         raise HTTPException(
@@ -45,7 +49,7 @@ async def create_user(body: UserModel, db: Session = Depends(get_db)):
             status_code=status.HTTP_409_CONFLICT,
             detail="Such username already registered",
         )
-    body.password = auth_service.get_password_hash(body.password)
+    body.password = await auth_service.get_password_hash(body.password)
     user = await repository_users.create_user(body, db)
     return {"user": user, "detail": "User was created"}
 
@@ -59,7 +63,7 @@ async def create_user(body: UserModel, db: Session = Depends(get_db)):
         Depends(RateLimiter(times=2, seconds=5)),
     ],
 )
-async def ban_user(email: str = Form(), db: Session = Depends(get_db)):
+async def ban_user(email: str = Form(), db: AsyncSession = Depends(get_db)):
     user = await repository_users.get_user_by_email(email, db)
     if not user:
         raise HTTPException(
@@ -73,32 +77,37 @@ async def ban_user(email: str = Form(), db: Session = Depends(get_db)):
 @router.get("/profile/{searched_user}", response_model=UserPublic)
 async def get_user_profile(
     searched_user: str,
+    request: Request,
     current_user: User = Depends(auth_service.get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     if current_user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
-    user = await repository_users.get_user_profile(searched_user, db)
-    if user is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="Photo not found"
-        )
-    return user
+
+    async def load():
+        user = await repository_users.get_user_profile(searched_user, db)
+        if user is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="Photo not found"
+            )
+        return user, (user.user_name, user.created_at)
+
+    return await profile_cache.respond(
+        request, searched_user, [profile_tag(searched_user)], load
+    )
 
 
 @router.get("/me", response_model=UserResponseProfile)
 async def get_me(
     current_user: User = Depends(auth_service.get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    photos_published = await repository_users.get_amount_photos(
-        current_user.user_name, db
-    )
+    stats = await repository_user_stats.get_user_stats(current_user.id, db)
     user_profile = UserResponseProfile(
         username=current_user.user_name,
         email=current_user.email,
         created_at=current_user.created_at,
-        photos_published=photos_published,
+        **repository_user_stats.public_counters(stats),
     )
     return user_profile
 
@@ -107,10 +116,10 @@ async def get_me(
 async def change_password(
     request: ChangePasswordRequest,
     current_user: User = Depends(auth_service.get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    if not auth_service.verify_password(request.old_password, current_user.password):
+    if not await auth_service.verify_password(request.old_password, current_user.password):
         raise HTTPException(status_code=400, detail="Invalid old password")
-    new_password = auth_service.get_password_hash(request.new_password)
+    new_password = await auth_service.get_password_hash(request.new_password)
     await repository_users.change_password(current_user, new_password, db)
     return {"message": "Password updated successfully"}
@@ -0,0 +1,64 @@
+from typing import Dict, List
+
+from pydantic import BaseModel, Field
+
+
+class PoolStatsResponse(BaseModel):
+    pool_class: str
+    size: int | None
+    checkedin: int | None
+    checkedout: int | None
+    overflow: int | None
+    timeout: float | None
+    waits: int
+    wait_seconds_sum: float
+    wait_seconds_max: float
+    timeouts: int
+    wait_histogram: Dict[str, int]
+
+
+class RebuildResponse(BaseModel):
+    fixed: int
+
+
+class QRCodesRequest(BaseModel):
+    photo_ids: List[int] | None = Field(None, max_items=1000)
+    limit: int = Field(500, ge=1, le=1000, description="photos without a code, if no photo_ids")
+
+
+class QRCodesResponse(BaseModel):
+    generated: int
+
+
+class CacheTierStats(BaseModel):
+    size: int
+    maxsize: int
+    hits: int
+    misses: int
+
+
+class UserCacheStatsResponse(BaseModel):
+    local: CacheTierStats
+    redis_hits: int
+    redis_misses: int
+    redis_errors: int
+
+
+class CachedRouteStats(BaseModel):
+    ttl: int
+    hits: int
+    misses: int
+
+
+class ResponseCacheStatsResponse(BaseModel):
+    backend: str
+    redis_errors: int
+    routes: Dict[str, CachedRouteStats]
+
+
+class RateLimiterStatsResponse(BaseModel):
+    backend: str
+    buckets: int
+    local_hits: int
+    redis_hits: int
+    redis_errors: int
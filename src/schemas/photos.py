@@ -1,7 +1,7 @@
 from typing import List
 from datetime import datetime
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, validator
 
 
 class TagModel(BaseModel):
@@ -19,22 +19,60 @@ class PhotoModel(BaseModel):
     description: str
 
 
+class RenditionResponse(BaseModel):
+    name: str
+    format: str
+    width: int
+    height: int
+    url: str
+
+
 class PhotoDb(BaseModel):
     id: int
     photo: str
     description: str | None
     tags: List[TagResponse]
     qr_code: str | None
+    # ready renditions, smallest first; empty until the worker made them
+    renditions: List[RenditionResponse] = []
+
+    @validator("renditions", pre=True)
+    def no_renditions(cls, value):
+        return value or []
 
     class Config:
         orm_mode = True
 
 
+class PhotoPage(BaseModel):
+    items: List[PhotoDb]
+    next_cursor: str | None
+
+
 class PhotoResponse(BaseModel):
     photo: PhotoDb
     detail: str = "Photo was created successfully"
 
 
+class BatchUploadItem(BaseModel):
+    description: str | None = None
+    tags: List[str] = Field([], max_items=5)
+
+
+class BatchUploadResult(BaseModel):
+    index: int
+    filename: str | None
+    status_code: int
+    detail: str | None = None
+    photo: PhotoDb | None = None
+
+
+class BatchUploadResponse(BaseModel):
+    items: List[BatchUploadResult]
+    uploaded: int
+    failed: int
+
+
 class DescriptionUpdate(BaseModel):
     done: bool
 
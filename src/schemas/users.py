@@ -1,7 +1,9 @@
-from datetime import date
+from datetime import date, datetime
 
 from pydantic import BaseModel, Field, EmailStr
 
+from src.database.models import Role
+
 
 class UserModel(BaseModel):
     user_name: str = Field()
@@ -27,6 +29,10 @@ class UserPublic(BaseModel):
     user_name: str
     created_at: date
     photos_published: int
+    comments_written: int = 0
+    ratings_given: int = 0
+    ratings_received: int = 0
+    average_received_rating: float = 0.0
 
     class Config:
         orm_mode = True
@@ -37,6 +43,10 @@ class UserResponseProfile(BaseModel):
     email: EmailStr
     created_at: date
     photos_published: int
+    comments_written: int = 0
+    ratings_given: int = 0
+    ratings_received: int = 0
+    average_received_rating: float = 0.0
 
     class Config:
         orm_mode = True
@@ -45,3 +55,24 @@ class UserResponseProfile(BaseModel):
 class ChangePasswordRequest(BaseModel):
     old_password: str
     new_password: str
+
+
+class Principal(BaseModel):
+    """
+    The authenticated user as cached between requests: only the columns
+    routes read, serialized as JSON. Immutable, because one instance is
+    shared by every request that hits the in-process cache.
+    """
+
+    id: int
+    email: str
+    user_name: str | None
+    roles: Role
+    confirmed: bool = False
+    ban_status: bool = False
+    password: str
+    created_at: datetime | None
+
+    class Config:
+        orm_mode = True
+        allow_mutation = False
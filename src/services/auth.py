@@ -1,37 +1,37 @@
-import pickle
+import hashlib
+import time
 from typing import Optional
 
-import redis
 from jose import JWTError, jwt
-from fastapi import HTTPException, status, Depends
+from fastapi import HTTPException, status, Depends, Request
 from fastapi.security import OAuth2PasswordBearer
-from passlib.context import CryptContext
 from datetime import datetime, timedelta
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.connect import get_db
 from src.repository import users as repository_users
 from src.conf.config import settings
+from src.services.cache import TTLCache
+from src.services.passwords import password_hasher
+from src.services.user_cache import user_cache
 
 
 class Auth:
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
     SECRET_KEY = settings.secret_key_jwt
     ALGORITHM = settings.algorithm
     oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
-    # redis_db = redis.Redis(host="localhost", port=6379, db=0)
-    redis_db = redis.Redis(
-        host=settings.redis_host,
-        port=settings.redis_port,
-        password=settings.redis_password,
-        db=0,
-    )
+    optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login", auto_error=False)
+    # token digest -> decoded claims, each entry expires with the token
+    claims_cache = TTLCache(maxsize=settings.jwt_claims_cache_size, ttl=24 * 3600)
 
-    def verify_password(self, plain_password, hashed_password):
-        return self.pwd_context.verify(plain_password, hashed_password)
+    async def verify_password(self, plain_password, hashed_password):
+        return await password_hasher.verify(plain_password, hashed_password)
 
-    def get_password_hash(self, password: str):
-        return self.pwd_context.hash(password)
+    async def verify_and_update_password(self, plain_password, hashed_password):
+        return await password_hasher.verify_and_update(plain_password, hashed_password)
+
+    async def get_password_hash(self, password: str):
+        return await password_hasher.hash(password)
 
     async def create_access_token(
         self, data: dict, expires_delta: Optional[float] = None
@@ -65,11 +65,29 @@ class Auth:
         )
         return encoded_refresh_token
 
+    def decode_token(self, token: str) -> dict:
+        """
+        ``jwt.decode`` with the result cached until the token's ``exp``: a
+        client sends the same token with every request, and only the first
+        pays for signature verification and JSON parsing. The claims only
+        prove who the caller is; whether that user may still act (e.g. is
+        not banned) is checked on the principal every time. The returned
+        dict is shared, don't modify it.
+        """
+        # keyed by the signing key too, so rotating it drops cached claims
+        key = hashlib.sha256(f"{self.ALGORITHM}:{self.SECRET_KEY}:{token}".encode()).digest()
+        claims = self.claims_cache.get(key)
+        if claims is not None:
+            return claims
+        claims = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+        remaining = claims.get("exp", 0) - time.time()
+        if remaining > 0:
+            self.claims_cache.set(key, claims, ttl=remaining)
+        return claims
+
     async def decode_refresh_token(self, refresh_token: str):
         try:
-            payload = jwt.decode(
-                refresh_token, self.SECRET_KEY, algorithms=[self.ALGORITHM]
-            )
+            payload = self.decode_token(refresh_token)
             if payload["scope"] == "refresh_token":
                 email = payload["sub"]
                 return email
@@ -84,15 +102,27 @@ class Auth:
             )
 
     async def get_current_user(
-        self, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
+        self,
+        request: Request,
+        token: str = Depends(oauth2_scheme),
+        db: AsyncSession = Depends(get_db),
     ):
+        """
+        Resolve the principal once per request and memoize it on
+        ``request.state``, so every dependency asking for the current user
+        (role checks included) shares one JWT decode and one cache lookup.
+        """
+        principal = getattr(request.state, "principal", None)
+        if principal is not None:
+            return principal
+
         credentials_exception = HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
         )
 
         try:
-            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+            payload = self.decode_token(token)
             if payload["scope"] == "access_token":
                 email = payload["sub"]
                 if email is None:
@@ -102,21 +132,38 @@ class Auth:
         except JWTError as e:
             raise credentials_exception
 
-        user = self.redis_db.get(f"user:{email}")
+        user, revision = await user_cache.lookup(email)
         if user is None:
-            print("GET USER FROM POSTGRES")
-            # GET USER FROM POSTGRES
             user = await repository_users.get_user_by_email(email, db)
             if user is None:
                 raise credentials_exception
-            self.redis_db.set(f"user:{email}", pickle.dumps(user))
-            self.redis_db.expire(f"user:{email}", 900)
-        else:
-            print("GET USER FROM CASH")
-            # GET USER FROM CASH
-            user = pickle.loads(user)
+            user = await user_cache.set(user, revision)
+        if user.ban_status:
+            # banning invalidates the cached principal, so this takes effect
+            # on the next request even though the token stays valid
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN, detail="Your account is banned"
+            )
+        request.state.principal = user
         return user
 
+    async def get_optional_user(
+        self,
+        request: Request,
+        token: str | None = Depends(optional_oauth2_scheme),
+        db: AsyncSession = Depends(get_db),
+    ):
+        """
+        Like ``get_current_user``, but None for anonymous requests and bad
+        tokens instead of 401, for dependencies that serve both.
+        """
+        if token is None:
+            return None
+        try:
+            return await self.get_current_user(request, token, db)
+        except HTTPException:
+            return None
+
     def create_email_token(self, data: dict):
         to_encode = data.copy()
         expire = datetime.utcnow() + timedelta(days=7)
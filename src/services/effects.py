@@ -0,0 +1,282 @@
+import asyncio
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, Tuple
+
+import numpy as np
+from fastapi import HTTPException, status
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from src.conf.config import settings
+
+LUMA = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+SEPIA = np.array(
+    [[0.393, 0.769, 0.189], [0.349, 0.686, 0.168], [0.272, 0.534, 0.131]], dtype=np.float32
+).T
+BLUR_RADIUS = 4
+BLUR_PASSES = 3  # three box blurs are close to a gaussian
+
+
+# Effects take a float32 (rows, width, 3) strip of the image, whose first
+# row is row ``top`` of an image of ``size`` (width, height), and return
+# the processed strip. Pixels may leave 0..255, they are clipped once at
+# the end. Strips are extended by ``halo`` rows on both sides, so effects
+# that read neighbouring pixels see the same input as on the whole image.
+@dataclass(frozen=True)
+class Effect:
+    apply: Callable[[np.ndarray, int, Tuple[int, int]], np.ndarray]
+    halo: int = 0
+
+
+def _luma(rgb: np.ndarray) -> np.ndarray:
+    return rgb @ LUMA
+
+
+def grayscale(rgb, top, size):
+    return np.repeat(_luma(rgb)[..., None], 3, axis=2)
+
+
+def sepia(rgb, top, size):
+    return rgb @ SEPIA
+
+
+def vignette(rgb, top, size, strength: float = 0.6, inner: float = 0.4):
+    width, height = size
+    rows = (np.arange(top, top + rgb.shape[0], dtype=np.float32) + 0.5) / height * 2 - 1
+    cols = (np.arange(width, dtype=np.float32) + 0.5) / width * 2 - 1
+    distance = np.hypot(rows[:, None], cols[None, :]) / np.sqrt(2)
+    falloff = 1 - strength * np.clip((distance - inner) / (1 - inner), 0, 1) ** 2
+    return rgb * falloff[..., None]
+
+
+def _box_rows(a: np.ndarray, radius: int) -> np.ndarray:
+    """Mean over ``2 * radius + 1`` rows, edges repeated, via a running sum."""
+    rows = a.shape[0]
+    padded = np.pad(a, [(radius + 1, radius)] + [(0, 0)] * (a.ndim - 1), mode="edge")
+    total = np.cumsum(padded, axis=0, dtype=np.float32)
+    return (total[2 * radius + 1 : 2 * radius + 1 + rows] - total[:rows]) / (2 * radius + 1)
+
+
+def _blur(rgb: np.ndarray, radius: int, passes: int) -> np.ndarray:
+    for _ in range(passes):
+        rgb = _box_rows(rgb, radius)
+        rgb = _box_rows(rgb.swapaxes(0, 1), radius).swapaxes(0, 1)
+    return rgb
+
+
+def blur(rgb, top, size):
+    return _blur(rgb, BLUR_RADIUS, BLUR_PASSES)
+
+
+def cartoonify(rgb, top, size, levels: int = 6, edge_threshold: float = 20.0):
+    smooth = _blur(rgb, 2, 1)
+    gy, gx = np.gradient(_luma(smooth))
+    edges = np.hypot(gy, gx) > edge_threshold
+    step = 256 / levels
+    flat = np.floor(smooth / step) * step + step / 2
+    return flat * ~edges[..., None]
+
+
+@dataclass(frozen=True)
+class Grade:
+    """Colour grading: saturation, contrast around mid grey, then per channel gain and lift."""
+
+    saturation: float
+    contrast: float
+    gain: Tuple[float, float, float]
+    lift: Tuple[float, float, float]
+
+    def __call__(self, rgb, top, size):
+        luma = _luma(rgb)[..., None]
+        rgb = luma + (rgb - luma) * self.saturation
+        rgb = (rgb - 128) * self.contrast + 128
+        return rgb * np.array(self.gain, np.float32) + np.array(self.lift, np.float32)
+
+
+EFFECTS: Dict[str, Effect] = {
+    "grayscale": Effect(grayscale),
+    "sepia": Effect(sepia),
+    "vignette": Effect(vignette),
+    "blur": Effect(blur, halo=BLUR_RADIUS * BLUR_PASSES),
+    # one box blur of radius 2, then a one pixel gradient
+    "cartoonify": Effect(cartoonify, halo=3),
+    "art:athena": Effect(Grade(0.9, 0.95, (1.08, 1.0, 0.88), (10, 6, 0))),
+    "art:eucalyptus": Effect(Grade(0.85, 1.05, (0.92, 1.06, 0.98), (0, 8, 6))),
+    "art:frost": Effect(Grade(0.6, 0.9, (0.9, 1.0, 1.12), (8, 12, 20))),
+    "art:zorro": Effect(Grade(0.2, 1.35, (1.0, 1.0, 1.0), (0, 0, 0))),
+    "art:sizzle": Effect(Grade(1.35, 1.1, (1.12, 1.0, 0.85), (6, 0, 0))),
+}
+
+
+def _round_mask(top: int, bottom: int, size: Tuple[int, int]) -> np.ndarray:
+    """Alpha of rows ``top:bottom`` for the largest ellipse in the image, antialiased."""
+    width, height = size
+    rx, ry = width / 2, height / 2
+    rows = (np.arange(top, bottom, dtype=np.float32) + 0.5 - ry) / ry
+    cols = (np.arange(width, dtype=np.float32) + 0.5 - rx) / rx
+    distance = np.hypot(rows[:, None], cols[None, :])
+    coverage = np.clip((1 - distance) * min(rx, ry) + 0.5, 0, 1)
+    return (coverage * 255 + 0.5).astype(np.uint8)
+
+
+def apply_effects(image: Image.Image, effect: str | None, rounded: bool, tile_rows: int) -> Image.Image:
+    """
+    Apply ``effect`` (a key of ``EFFECTS``) and, if ``rounded``, an
+    elliptical alpha mask to an RGB image. The image is processed in
+    strips of ``tile_rows`` rows, so the float intermediates (four times
+    the size of the 8-bit pixels) never hold more than one strip plus
+    its halo. The decoded image itself is held whole.
+    """
+    stage = EFFECTS[effect] if effect else None
+    halo = stage.halo if stage else 0
+    width, height = image.size
+    out = Image.new("RGBA" if rounded else "RGB", image.size)
+    for top in range(0, height, tile_rows):
+        bottom = min(top + tile_rows, height)
+        start, stop = max(0, top - halo), min(height, bottom + halo)
+        strip = np.asarray(image.crop((0, start, width, stop)), dtype=np.float32)
+        if stage is not None:
+            strip = stage.apply(strip, start, image.size)
+        strip = np.clip(strip[top - start : bottom - start] + 0.5, 0, 255).astype(np.uint8)
+        if rounded:
+            strip = np.dstack([strip, _round_mask(top, bottom, image.size)])
+        out.paste(Image.fromarray(strip), (0, top))
+    return out
+
+
+FORMATS = {"jpg": "JPEG", "jpeg": "JPEG", "png": "PNG", "webp": "WEBP"}
+
+
+Source = bytes | str | os.PathLike
+
+
+def _load(source: Source, width: int, height: int, crop: str) -> Image.Image:
+    """
+    Decode an image, given as bytes or as the path of a file, and size it
+    like Cloudinary does: ``"fill"`` crops to exactly ``width`` x
+    ``height``, ``"limit"`` only scales down to fit. Only JPEGs are
+    decoded at a reduced scale; other formats are decoded at full size,
+    up to Pillow's ``MAX_IMAGE_PIXELS``, before being scaled down.
+    """
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    with Image.open(source) as image:
+        # JPEGs are decoded at the smallest scale still covering the target
+        image.draft("RGB", (width, height))
+        image = ImageOps.exif_transpose(image).convert("RGB")
+    if crop == "fill":
+        return ImageOps.fit(image, (width, height), Image.Resampling.LANCZOS)
+    image.thumbnail((width, height), Image.Resampling.LANCZOS)
+    return image
+
+
+def _encode(image: Image.Image, fmt: str) -> bytes:
+    fmt = FORMATS[fmt]
+    if fmt == "JPEG" and image.mode == "RGBA":
+        # no alpha in JPEG, rounded corners become white
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        image = background
+    out = io.BytesIO()
+    image.save(out, fmt, quality=90)
+    return out.getvalue()
+
+
+# runs in the worker processes, hence module level
+def render(source: Source, effect: str | None, rounded: bool, width: int, height: int, tile_rows: int) -> bytes:
+    """
+    Decode an uploaded image (bytes or a path, which the worker process
+    opens itself, so the upload is not copied between processes), crop it to fill ``width`` x ``height`` (like
+    Cloudinary's ``crop="fill"``), apply the effects and encode it: PNG
+    when rounded, to keep the transparent corners, JPEG otherwise.
+    """
+    image = apply_effects(_load(source, width, height, "fill"), effect, rounded, tile_rows)
+    return _encode(image, "png" if rounded else "jpg")
+
+
+def render_rendition(
+    source: Source,
+    width: int,
+    height: int,
+    crop: str,
+    fmt: str,
+    effect: str | None = None,
+    rounded: bool = False,
+    tile_rows: int = 128,
+) -> Tuple[bytes, int, int]:
+    """One size and format of a stored photo, with its size once rendered."""
+    image = _load(source, width, height, crop)
+    if effect or rounded:
+        image = apply_effects(image, effect, rounded, tile_rows)
+    return _encode(image, fmt), image.width, image.height
+
+
+class EffectsEngine:
+    """
+    Renders photo effects locally instead of as Cloudinary transformations.
+    The work is CPU bound, so it runs in a pool of ``max_workers``
+    processes spawned on first use. At most ``max_queue`` images wait for
+    a worker, beyond that uploads are rejected with 503 and
+    ``Retry-After``, like the other pools.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int, retry_after: int, tile_rows: int):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self.tile_rows = tile_rows
+        self.pending = 0
+        self._executor = None
+
+    @property
+    def saturated(self) -> bool:
+        return self.pending >= self.max_workers + self.max_queue
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: forking a process that runs an event loop and threads is unsafe
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    async def render(self, source: Source, effect: str | None, rounded: bool, width: int, height: int) -> bytes:
+        if effect is not None and effect not in EFFECTS:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"Unknown effect {effect}"
+            )
+        if self.saturated:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many images in progress, try again later",
+                headers={"Retry-After": str(self.retry_after)},
+            )
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._pool(), render, source, effect, rounded, width, height, self.tile_rows
+            )
+        except (UnidentifiedImageError, Image.DecompressionBombError):
+            raise HTTPException(
+                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                detail="File is not a supported image",
+            )
+        finally:
+            self.pending -= 1
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+effects_engine = EffectsEngine(
+    max_workers=settings.effects_workers,
+    max_queue=settings.effects_max_queue,
+    retry_after=settings.effects_retry_after,
+    tile_rows=settings.effects_tile_rows,
+)
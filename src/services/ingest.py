@@ -0,0 +1,287 @@
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Tuple
+
+import multipart
+from fastapi import HTTPException, Request, status
+from multipart.exceptions import MultipartParseError
+from multipart.multipart import parse_options_header
+from starlette.concurrency import run_in_threadpool
+
+from src.services.storage import StorageWriter
+
+# form fields besides the file, all together
+FIELDS_MAX_BYTES = 64 * 1024
+SNIFF_BYTES = 12
+
+
+def sniff_image_type(head: bytes) -> str | None:
+    """Content type of an image from its first ``SNIFF_BYTES`` bytes, None if not one we take."""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head.startswith((b"GIF87a", b"GIF89a")):
+        return "image/gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+@dataclass
+class IngestedUpload:
+    fields: Dict[str, List[str]]
+    filename: str | None
+    content_type: str
+    size: int
+    sha256: str
+
+
+@dataclass
+class IngestedFile:
+    """One file of a batch; ``error`` is set instead of the rest if it was rejected."""
+
+    filename: str | None
+    writer: StorageWriter
+    content_type: str | None = None
+    size: int = 0
+    sha256: str | None = None
+    error: HTTPException | None = None
+
+
+def _error(code: int, detail: str) -> HTTPException:
+    return HTTPException(status_code=code, detail=detail)
+
+
+class _Sink:
+    """Checks the size and type of one file while passing it to its writer."""
+
+    def __init__(self, writer: StorageWriter, max_bytes: int):
+        self.writer = writer
+        self.max_bytes = max_bytes
+        self.head = b""
+        self.content_type = None
+
+    async def write(self, data: bytes) -> None:
+        if self.writer.size + len(data) > self.max_bytes:
+            raise _error(status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, "File is too large")
+        if self.content_type is None:
+            self.head += data[: SNIFF_BYTES - len(self.head)]
+            if len(self.head) >= SNIFF_BYTES:
+                self._sniff()
+        await run_in_threadpool(self.writer.write, data)
+
+    def finish(self) -> str:
+        if self.content_type is None:
+            # shorter than the signatures
+            self._sniff()
+        return self.content_type
+
+    def _sniff(self) -> None:
+        self.content_type = sniff_image_type(self.head)
+        if self.content_type is None:
+            raise _error(status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, "File is not a supported image")
+
+
+@dataclass
+class _Part:
+    name: str = ""
+    data: bytes = b""
+    headers: List[Tuple[bytes, bytes]] = field(default_factory=list)
+
+
+class _UploadParser:
+    """
+    Callbacks for ``multipart.MultipartParser``. They run synchronously
+    inside ``parser.write()``, so file bytes are only queued in
+    ``chunks`` and written out by ``ingest_upload`` after each network
+    chunk, tagged with the index of their file; no more than one network
+    chunk is ever held.
+    """
+
+    def __init__(self, file_field: str, max_files: int = 1):
+        self.file_field = file_field
+        self.max_files = max_files
+        self.fields: Dict[str, List[str]] = {}
+        self.fields_size = 0
+        self.filenames: List[str | None] = []
+        self.chunks: List[Tuple[int, bytes]] = []
+        self.part = _Part()
+        self._header_field = b""
+        self._header_value = b""
+
+    def on_part_begin(self) -> None:
+        self.part = _Part()
+
+    def on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_field += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def on_header_end(self) -> None:
+        self.part.headers.append((self._header_field.lower(), self._header_value))
+        self._header_field = self._header_value = b""
+
+    def on_headers_finished(self) -> None:
+        disposition = dict(self.part.headers).get(b"content-disposition")
+        _, options = parse_options_header(disposition)
+        if b"name" not in options:
+            raise _error(status.HTTP_400_BAD_REQUEST, "Form part without a name")
+        self.part.name = options[b"name"].decode("utf-8", "replace")
+        if self.part.name == self.file_field:
+            if len(self.filenames) == self.max_files:
+                raise _error(
+                    status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    "Only one file per upload"
+                    if self.max_files == 1
+                    else f"At most {self.max_files} files per upload",
+                )
+            filename = options.get(b"filename")
+            self.filenames.append(filename.decode("utf-8", "replace") if filename else None)
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self.part.name == self.file_field:
+            self.chunks.append((len(self.filenames) - 1, data[start:end]))
+            return
+        self.fields_size += end - start
+        if self.fields_size > FIELDS_MAX_BYTES:
+            raise _error(status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, "Form fields are too large")
+        self.part.data += data[start:end]
+
+    def on_part_end(self) -> None:
+        if self.part.name != self.file_field:
+            value = self.part.data.decode("utf-8", "replace")
+            self.fields.setdefault(self.part.name, []).append(value)
+
+    def callbacks(self) -> dict:
+        return {
+            name: getattr(self, name)
+            for name in (
+                "on_part_begin",
+                "on_header_field",
+                "on_header_value",
+                "on_header_end",
+                "on_headers_finished",
+                "on_part_data",
+                "on_part_end",
+            )
+        }
+
+
+def _start(request: Request, form: _UploadParser, max_bytes: int) -> multipart.MultipartParser:
+    content_type, params = parse_options_header(request.headers.get("Content-Type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise _error(status.HTTP_400_BAD_REQUEST, "Expected a multipart/form-data body")
+    length = request.headers.get("Content-Length")
+    if length and length.isdigit() and int(length) > max_bytes + FIELDS_MAX_BYTES:
+        raise _error(status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, "File is too large")
+    return multipart.MultipartParser(params[b"boundary"], form.callbacks())
+
+
+async def ingest_upload(
+    request: Request, writer: StorageWriter, max_bytes: int, file_field: str = "file"
+) -> IngestedUpload:
+    """
+    Stream a ``multipart/form-data`` request body into ``writer``, chunk
+    by chunk as it arrives, without buffering the file: its type is
+    sniffed from the first bytes, its size checked against ``max_bytes``
+    and its sha256 computed on the way. Oversized uploads are rejected
+    with 413 as soon as that is known, from ``Content-Length`` before
+    reading anything; non images with 415. On any error the writer is
+    aborted, on success committing it is up to the caller.
+    """
+    form = _UploadParser(file_field)
+    sink = _Sink(writer, max_bytes)
+    try:
+        parser = _start(request, form, max_bytes)
+        async for chunk in request.stream():
+            parser.write(chunk)
+            data, form.chunks = b"".join(data for _, data in form.chunks), []
+            if data:
+                await sink.write(data)
+        parser.finalize()
+        if not form.filenames:
+            raise _error(status.HTTP_422_UNPROCESSABLE_ENTITY, f"Field required: {file_field}")
+        content = sink.finish()
+    except MultipartParseError:
+        writer.abort()
+        raise _error(status.HTTP_400_BAD_REQUEST, "Malformed multipart body")
+    except BaseException:
+        writer.abort()
+        raise
+    return IngestedUpload(
+        fields=form.fields,
+        filename=form.filenames[0],
+        content_type=content,
+        size=writer.size,
+        sha256=writer.digest.hexdigest(),
+    )
+
+
+async def ingest_batch(
+    request: Request,
+    new_writer: Callable[[], StorageWriter],
+    max_bytes: int,
+    max_files: int,
+    file_field: str = "files",
+) -> Tuple[Dict[str, List[str]], List[IngestedFile]]:
+    """
+    Like ``ingest_upload`` for a body of up to ``max_files`` files, each
+    streamed into its own writer from ``new_writer``. A file that is too
+    large or not an image only fails itself: its ``error`` is set, its
+    writer aborted and the rest of its bytes are dropped. Errors of the
+    request as a whole abort all writers; on success committing the
+    writers of the files without ``error`` is up to the caller.
+    """
+    form = _UploadParser(file_field, max_files)
+    files: List[IngestedFile] = []
+    sinks: List[_Sink] = []
+
+    async def write(index: int, data: bytes) -> None:
+        file = files[index]
+        if file.error is not None:
+            return
+        try:
+            await sinks[index].write(data)
+        except HTTPException as error:
+            file.error = error
+            file.writer.abort()
+
+    try:
+        parser = _start(request, form, max_bytes * max_files)
+        async for chunk in request.stream():
+            parser.write(chunk)
+            chunks, form.chunks = form.chunks, []
+            while len(files) < len(form.filenames):
+                writer = new_writer()
+                files.append(IngestedFile(form.filenames[len(files)], writer))
+                sinks.append(_Sink(writer, max_bytes))
+            # consecutive chunks of a file written together
+            for index in dict.fromkeys(index for index, _ in chunks):
+                data = b"".join(data for i, data in chunks if i == index)
+                if data:
+                    await write(index, data)
+        parser.finalize()
+        if not files:
+            raise _error(status.HTTP_422_UNPROCESSABLE_ENTITY, f"Field required: {file_field}")
+    except MultipartParseError:
+        for file in files:
+            file.writer.abort()
+        raise _error(status.HTTP_400_BAD_REQUEST, "Malformed multipart body")
+    except BaseException:
+        for file in files:
+            file.writer.abort()
+        raise
+    for file, sink in zip(files, sinks):
+        if file.error is not None:
+            continue
+        try:
+            file.content_type = sink.finish()
+        except HTTPException as error:
+            file.error = error
+            file.writer.abort()
+            continue
+        file.size = file.writer.size
+        file.sha256 = file.writer.digest.hexdigest()
+    return form.fields, files
+
@@ -0,0 +1,106 @@
+import asyncio
+import functools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Tuple
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from src.conf.config import settings
+
+
+@functools.lru_cache(maxsize=None)
+def crypt_context(rounds: int) -> CryptContext:
+    """
+    bcrypt at cost ``rounds``. Hashes made with any other cost (or an
+    older ``$2a$`` ident) verify fine but report that they need an update.
+    """
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=rounds,
+        bcrypt__min_rounds=rounds,
+        bcrypt__max_rounds=rounds,
+    )
+
+
+# run in the worker processes, hence module level
+def hash_password(password: str, rounds: int) -> str:
+    return crypt_context(rounds).hash(password)
+
+
+def verify_and_update(password: str, hashed: str, rounds: int) -> Tuple[bool, str | None]:
+    return crypt_context(rounds).verify_and_update(password, hashed)
+
+
+class PasswordHasher:
+    """
+    bcrypt is 100-300 ms of CPU per call at the usual cost, so hashing and
+    verification run in a pool of ``max_workers`` processes instead of on
+    the event loop. At most ``max_queue`` calls wait for a worker; beyond
+    that requests are rejected with 503 and ``Retry-After``, like uploads.
+    Worker processes are spawned on first use.
+    """
+
+    def __init__(self, rounds: int, max_workers: int, max_queue: int, retry_after: int):
+        self.rounds = rounds
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self.pending = 0
+        self._executor = None
+
+    @property
+    def saturated(self) -> bool:
+        return self.pending >= self.max_workers + self.max_queue
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: forking a process that runs an event loop and threads is unsafe
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    async def _submit(self, fn, *args):
+        if self.saturated:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Password hashing is busy, try again later",
+                headers={"Retry-After": str(self.retry_after)},
+            )
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._pool(), fn, *args, self.rounds)
+        finally:
+            self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._submit(hash_password, password)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        valid, _ = await self.verify_and_update(password, hashed)
+        return valid
+
+    async def verify_and_update(self, password: str, hashed: str) -> Tuple[bool, str | None]:
+        """
+        Check ``password`` against ``hashed``. If it matches and ``hashed``
+        was made with outdated parameters, also return a new hash at the
+        configured cost (computed in the same worker call), else None.
+        """
+        return await self._submit(verify_and_update, password, hashed)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(
+    rounds=settings.password_hash_rounds,
+    max_workers=settings.password_hash_workers,
+    max_queue=settings.password_hash_max_queue,
+    retry_after=settings.password_hash_retry_after,
+)
@@ -0,0 +1,77 @@
+import hashlib
+import io
+
+import numpy as np
+import qrcode
+from PIL import Image
+from starlette.concurrency import run_in_threadpool
+
+from src.conf.config import settings
+from src.services.cache import TTLCache
+from src.services.storage import storage
+from src.services.uploads import upload_executor
+
+
+def render_qr_png(url: str, box_size: int, border: int) -> bytes:
+    """
+    QR code of ``url`` as a 1-bit PNG. qrcode only computes the module
+    matrix; it is scaled up with NumPy and encoded by Pillow's C encoder
+    instead of qrcode's pure Python PNG writer.
+    """
+    code = qrcode.QRCode(border=border)
+    code.add_data(url)
+    code.make(fit=True)
+    light = ~np.array(code.get_matrix(), dtype=bool)
+    pixels = light.repeat(box_size, axis=0).repeat(box_size, axis=1)
+    out = io.BytesIO()
+    Image.fromarray(pixels).save(out, "PNG")
+    return out.getvalue()
+
+
+class QRCodes:
+    """
+    QR code PNGs keyed by a digest of the encoded url and the rendering
+    parameters, so the digest also names the bytes: it is the ETag of
+    the PNG and the storage key of its uploaded copy. PNGs (about a
+    kilobyte each) are kept for ``local_size`` urls, and the digests
+    already uploaded are remembered, so a url whose code exists is
+    neither rendered nor uploaded again.
+    """
+
+    def __init__(self, box_size: int, border: int, local_size: int, prefix: str):
+        self.box_size = box_size
+        self.border = border
+        self.prefix = prefix
+        # a url's code never changes, the ttl only ages out idle entries
+        self.pngs = TTLCache(maxsize=local_size, ttl=24 * 3600)
+        self.stored = TTLCache(maxsize=local_size, ttl=24 * 3600)
+        self.rendered = 0
+
+    def digest(self, url: str) -> str:
+        return hashlib.sha256(f"{self.box_size}:{self.border}:{url}".encode()).hexdigest()
+
+    async def png(self, url: str) -> bytes:
+        digest = self.digest(url)
+        png = self.pngs.get(digest)
+        if png is None:
+            png = await run_in_threadpool(render_qr_png, url, self.box_size, self.border)
+            self.rendered += 1
+            self.pngs.set(digest, png)
+        return png
+
+    async def store(self, url: str) -> str:
+        """Upload the code of ``url`` once and return the url it is served at."""
+        key = f"{self.prefix}/{self.digest(url)}"
+        if self.stored.get(key) is None:
+            png = await self.png(url)
+            await upload_executor.submit(storage.put_once, io.BytesIO(png), key)
+            self.stored.set(key, True)
+        return storage.url(key, width=500, height=500, crop="fill")
+
+
+qr_codes = QRCodes(
+    box_size=settings.qr_box_size,
+    border=settings.qr_border,
+    local_size=settings.qr_cache_size,
+    prefix="photo_share_team4/qrcode",
+)
@@ -0,0 +1,252 @@
+import asyncio
+import math
+import time
+from dataclasses import dataclass
+
+from fastapi import Depends, HTTPException, Request, Response, status
+from redis.exceptions import RedisError
+
+from src.conf.config import settings
+from src.services.auth import auth_service
+from src.services.cache import TTLCache
+from src.services.redis_pool import RedisClientUser
+
+# Token bucket shared by all workers. ``spent`` tokens were already granted
+# by a worker's local bucket and are charged unconditionally, then ``want``
+# more are taken if available. Time comes from Redis, so the workers'
+# clocks don't matter. Returns {allowed, tokens left}.
+TOKEN_BUCKET_LUA = """
+redis.replicate_commands()
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local spent = tonumber(ARGV[3])
+local want = tonumber(ARGV[4])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate) - spent
+local allowed = 0
+if tokens >= want then
+    tokens = tokens - want
+    allowed = 1
+end
+tokens = math.max(tokens, -capacity)
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000) + 1000)
+return {allowed, tostring(tokens)}
+"""
+
+
+@dataclass(frozen=True)
+class Rule:
+    """``times`` requests per ``seconds``, refilled continuously."""
+
+    times: int
+    seconds: float
+
+    @property
+    def rate(self) -> float:
+        return self.times / self.seconds
+
+
+class Bucket:
+    __slots__ = ("tokens", "updated", "pending", "synced", "syncing")
+
+    def __init__(self, tokens: float):
+        self.tokens = tokens
+        self.updated = self.synced = time.monotonic()
+        # granted locally, not yet charged to the shared bucket in Redis
+        self.pending = 0
+        self.syncing = False
+
+    def refill(self, rule: Rule) -> None:
+        now = time.monotonic()
+        self.tokens = min(rule.times, self.tokens + (now - self.updated) * rule.rate)
+        self.updated = now
+
+
+@dataclass
+class Decision:
+    allowed: bool
+    rule: Rule
+    tokens: float
+
+    @property
+    def retry_after(self) -> int:
+        return max(1, math.ceil((1 - self.tokens) / self.rule.rate))
+
+    @property
+    def headers(self) -> dict:
+        rule = self.rule
+        headers = {
+            "RateLimit-Limit": str(rule.times),
+            "RateLimit-Remaining": str(max(0, math.floor(self.tokens))),
+            # seconds until the bucket is full again
+            "RateLimit-Reset": str(max(0, math.ceil((rule.times - self.tokens) / rule.rate))),
+            "RateLimit-Policy": f"{rule.times};w={rule.seconds:g}",
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(self.retry_after)
+        return headers
+
+
+class RateLimitEngine(RedisClientUser):
+    """
+    Token buckets per route and client, checked in this process first.
+
+    While a bucket holds more than ``local_share`` of its capacity the
+    request is clearly under the limit: it is granted locally and the
+    tokens it took are charged to Redis later, at most once per
+    ``sync_interval`` per bucket and off the request path. Closer to the
+    limit every request consults the shared bucket in Redis, atomically,
+    so all workers together stay within the rule. Each worker can
+    overshoot by at most ``local_share`` of a bucket between syncs.
+
+    ``backend="local"`` (or Redis being down) keeps per-process buckets
+    only, ``"off"`` disables limiting.
+    """
+
+    name = "rate limiter"
+
+    def __init__(
+        self,
+        redis_db,
+        backend: str,
+        local_size: int,
+        local_share: float,
+        sync_interval: float,
+        retry_after: float = 5.0,
+    ):
+        super().__init__(redis_db, retry_after)
+        self.backend = backend
+        self.local_share = local_share
+        self.sync_interval = sync_interval
+        # idle buckets refill to full long before they expire
+        self.buckets = TTLCache(maxsize=local_size, ttl=3600)
+        self.local_hits = 0
+        self.redis_hits = 0
+        self._tasks = set()
+        self._script = None
+
+    async def hit(self, key: str, rule: Rule) -> Decision | None:
+        if self.backend == "off":
+            return None
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = Bucket(rule.times)
+            self.buckets.set(key, bucket)
+        bucket.refill(rule)
+
+        if self.backend != "redis" or not self.redis_available:
+            return self._take_locally(bucket, rule)
+        if bucket.tokens - 1 >= rule.times * self.local_share:
+            self.local_hits += 1
+            bucket.tokens -= 1
+            bucket.pending += 1
+            if not bucket.syncing and time.monotonic() - bucket.synced >= self.sync_interval:
+                task = asyncio.create_task(self._sync(key, bucket, rule, want=0))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+            return Decision(True, rule, bucket.tokens)
+        self.redis_hits += 1
+        allowed = await self._sync(key, bucket, rule, want=1)
+        if allowed is None:
+            return self._take_locally(bucket, rule)
+        return Decision(allowed, rule, bucket.tokens)
+
+    @staticmethod
+    def _take_locally(bucket: Bucket, rule: Rule) -> Decision:
+        if bucket.tokens < 1:
+            return Decision(False, rule, bucket.tokens)
+        bucket.tokens -= 1
+        return Decision(True, rule, bucket.tokens)
+
+    async def _sync(self, key: str, bucket: Bucket, rule: Rule, want: int) -> bool | None:
+        """
+        Charge the bucket's pending tokens to Redis, try to take ``want``
+        more and adopt the shared token count. None if Redis failed.
+        """
+        if self._script is None or self._script.registered_client is not self.redis_db:
+            self._script = self.redis_db.register_script(TOKEN_BUCKET_LUA)
+        spent, bucket.pending = bucket.pending, 0
+        bucket.syncing = True
+        try:
+            allowed, tokens = await self._script(
+                keys=[f"rl:{key}"], args=[rule.times, rule.rate, spent, want]
+            )
+        except RedisError as error:
+            bucket.pending += spent
+            self._redis_failed(error)
+            return None
+        finally:
+            bucket.syncing = False
+        # grants made locally while we waited are not in the shared count yet
+        bucket.tokens = float(tokens) - bucket.pending
+        bucket.updated = bucket.synced = time.monotonic()
+        return bool(allowed)
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.backend,
+            "buckets": len(self.buckets),
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "redis_errors": self.redis_errors,
+        }
+
+
+def client_identity(request: Request, principal) -> str:
+    if principal is not None:
+        return f"user:{principal.id}"
+    forwarded = request.headers.get("X-Forwarded-For")
+    ip = forwarded.split(",")[0].strip() if forwarded else request.client.host
+    return f"ip:{ip}"
+
+
+class RateLimiter:
+    """
+    Route dependency allowing ``times`` requests per ``seconds`` to each
+    user, or to each IP address for anonymous requests:
+
+        @router.post("/", dependencies=[Depends(RateLimiter(times=2, seconds=5))])
+
+    Responses carry ``RateLimit-*`` headers, rejected requests get 429
+    with ``Retry-After``.
+    """
+
+    def __init__(self, times: int, seconds: float, engine: RateLimitEngine | None = None):
+        self.rule = Rule(times, seconds)
+        self.engine = engine
+
+    async def __call__(
+        self,
+        request: Request,
+        response: Response,
+        principal=Depends(auth_service.get_optional_user),
+    ):
+        route = request.scope.get("route")
+        path = route.path if route is not None else request.url.path
+        key = f"{request.method}:{path}:{client_identity(request, principal)}"
+        decision = await (self.engine or rate_limiter).hit(key, self.rule)
+        if decision is None:
+            return
+        if not decision.allowed:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too Many Requests",
+                headers=decision.headers,
+            )
+        response.headers.update(decision.headers)
+
+
+# ``redis_db`` is attached by the lifespan handler in main.py
+rate_limiter = RateLimitEngine(
+    None,
+    backend=settings.rate_limit_backend,
+    local_size=settings.rate_limit_local_size,
+    local_share=settings.rate_limit_local_share,
+    sync_interval=settings.rate_limit_sync_interval,
+    retry_after=settings.redis_retry_after,
+)
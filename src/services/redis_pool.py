@@ -0,0 +1,56 @@
+import time
+
+import redis.asyncio as redis
+from redis.exceptions import RedisError
+
+from src.conf.config import settings
+from utils.py_logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def create_redis() -> redis.Redis:
+    """
+    The app-wide Redis client, created once by the lifespan handler in
+    ``main.py``. Every user (auth cache, rate limiter) borrows connections
+    from its one pool. Short socket timeouts make an unreachable server
+    fail fast, so callers can fall back instead of hanging the request.
+    """
+    pool = redis.ConnectionPool(
+        host=settings.redis_host,
+        port=settings.redis_port,
+        password=settings.redis_password,
+        db=0,
+        encoding="utf-8",
+        decode_responses=True,
+        max_connections=settings.redis_max_connections,
+        socket_connect_timeout=settings.redis_timeout,
+        socket_timeout=settings.redis_timeout,
+    )
+    return redis.Redis(connection_pool=pool)
+
+
+class RedisClientUser:
+    """
+    Base for caches that borrow the shared client. Redis is optional:
+    until the lifespan handler attaches ``redis_db``, and for
+    ``retry_after`` seconds after any Redis error, ``redis_available`` is
+    False and the cache must answer without it.
+    """
+
+    name = "cache"
+
+    def __init__(self, redis_db: redis.Redis | None, retry_after: float):
+        self.redis_db = redis_db
+        self.retry_after = retry_after
+        self.redis_errors = 0
+        self._redis_down_until = 0.0
+
+    @property
+    def redis_available(self) -> bool:
+        return self.redis_db is not None and time.monotonic() >= self._redis_down_until
+
+    def _redis_failed(self, error: RedisError) -> None:
+        self.redis_errors += 1
+        self._redis_down_until = time.monotonic() + self.retry_after
+        logger.warning(f"{self.name}: Redis unavailable, falling back to local state: {error}")
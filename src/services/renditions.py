@@ -0,0 +1,133 @@
+import asyncio
+from typing import Tuple
+
+from src.conf.config import settings
+from src.database.connect import SessionLocal
+from src.database.models import PhotoRendition
+from src.repository.renditions import claim_renditions, fail_rendition, finish_rendition
+from src.services.response_cache import photo_tag, response_cache
+from src.services.storage import storage
+from src.services.uploads import UploadExecutor
+from utils.py_logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class RenditionWorker:
+    """
+    Background task producing the rows of ``photo_renditions``: it claims
+    up to ``batch_size`` of them, renders them through ``executor`` and
+    records the results, until none are pending. Then it
+    waits for ``notify()`` (called after an upload) or ``poll_interval``
+    seconds, which also picks up uploads of other processes and claims
+    left behind by a worker that died.
+
+    Rendering is idempotent, so a rendition rendered twice after a lease
+    ran out costs time but changes nothing. Failed renditions are retried
+    on later batches, up to ``max_attempts`` times.
+
+    ``executor`` is the worker's own, not the upload executor: a batch
+    must not take the slots of user uploads, and its queue holds a whole
+    batch, so rendering is never rejected and never burns an attempt.
+    """
+
+    def __init__(
+        self,
+        session_factory,
+        executor: UploadExecutor,
+        batch_size: int,
+        poll_interval: float,
+        lease: int,
+        max_attempts: int,
+    ):
+        self.session_factory = session_factory
+        self.executor = executor
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.rendered = 0
+        self.failed = 0
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def notify(self) -> None:
+        self._wakeup.set()
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _render(self, rendition: PhotoRendition) -> Tuple[str, int, int]:
+        return await self.executor.submit(
+            storage.render,
+            rendition.source_key,
+            rendition.width,
+            rendition.height,
+            rendition.crop,
+            rendition.format,
+            rendition.effect,
+            rendition.rounded,
+        )
+
+    async def run_once(self) -> int:
+        """Render one batch, return how many renditions were claimed."""
+        async with self.session_factory() as db:
+            claimed = await claim_renditions(self.batch_size, self.lease, self.max_attempts, db)
+            if not claimed:
+                return 0
+            results = await asyncio.gather(
+                *(self._render(rendition) for rendition in claimed), return_exceptions=True
+            )
+            photo_ids = set()
+            for rendition, result in zip(claimed, results):
+                if isinstance(result, Exception):
+                    logger.warning(
+                        f"rendition {rendition.id} of photo {rendition.photo_id} failed: {result!r}"
+                    )
+                    self.failed += 1
+                    await fail_rendition(rendition, self.max_attempts, db)
+                elif await finish_rendition(rendition, *result, db):
+                    self.rendered += 1
+                    photo_ids.add(rendition.photo_id)
+        await response_cache.invalidate(*(photo_tag(photo_id) for photo_id in photo_ids))
+        return len(claimed)
+
+    async def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            try:
+                while await self.run_once():
+                    pass
+            except Exception as error:
+                # claims of the broken batch are taken over once their lease runs out
+                logger.error(f"rendition worker: {error!r}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+
+rendition_executor = UploadExecutor(
+    max_workers=settings.rendition_max_workers,
+    max_queue=settings.rendition_batch_size,
+    retry_after=settings.upload_retry_after,
+)
+
+rendition_worker = RenditionWorker(
+    SessionLocal,
+    rendition_executor,
+    batch_size=settings.rendition_batch_size,
+    poll_interval=settings.rendition_poll_interval,
+    lease=settings.rendition_lease,
+    max_attempts=settings.rendition_max_attempts,
+)
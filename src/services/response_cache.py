@@ -0,0 +1,199 @@
+import hashlib
+import json
+import time
+from typing import Awaitable, Callable, Hashable, List, Tuple, Type
+
+from fastapi import Request, Response, status
+from pydantic import BaseModel
+from redis.exceptions import RedisError
+
+from src.conf.config import settings
+from src.services.cache import TTLCache
+from src.services.redis_pool import RedisClientUser
+
+# generation counters must outlive every entry that recorded them
+GENERATION_TTL = 7 * 24 * 3600
+
+
+def photo_tag(photo_id: int) -> str:
+    return f"photo:{photo_id}"
+
+
+def rating_tag(photo_id: int) -> str:
+    return f"rating:{photo_id}"
+
+
+def profile_tag(user_name: str) -> str:
+    return f"profile:{user_name}"
+
+
+# bumped by every photo write that can change which photos a search finds
+SEARCH_TAG = "search"
+# bumped by rating writes, only searches ordered by rating depend on it
+SEARCH_RATING_TAG = "search:rating"
+
+
+class ResponseCache(RedisClientUser):
+    """
+    Cached entries (serialized responses with their ETag, search result
+    ids), kept in Redis (``backend="redis"``) or in this process
+    (``"local"``), or not at all (``"off"``).
+
+    Every entry records the generation of the tags it depends on, e.g.
+    ``photo:42``. A write bumps the generations of the tags it touches,
+    which turns each dependent entry into a miss without searching for
+    keys. Generations are read before the data is loaded, so a write that
+    commits in between can't leave a stale entry behind.
+    """
+
+    name = "response cache"
+
+    def __init__(self, redis_db, backend: str, local_size: int, retry_after: float = 5.0):
+        super().__init__(redis_db, retry_after)
+        self.backend = backend
+        self.local = TTLCache(maxsize=local_size, ttl=GENERATION_TTL)
+        self.generations = {}
+        self.routes = {}
+
+    async def lookup(self, key: str, tags: List[str]) -> Tuple[dict | None, List[int] | None]:
+        """
+        Return the valid entry for ``key`` (or None) and the current
+        generations of ``tags``. Generations are None when nothing may be
+        stored, i.e. the cache is off or Redis is unavailable.
+        """
+        if self.backend == "local":
+            generations = [self.generations.get(tag, 0) for tag in tags]
+            entry = self.local.get(key)
+            if entry is not None and entry["expires"] <= time.time():
+                entry = None
+        elif self.backend == "redis" and self.redis_available:
+            try:
+                async with self.redis_db.pipeline(transaction=False) as pipe:
+                    pipe.get(f"rc:{key}")
+                    pipe.mget([f"rc:gen:{tag}" for tag in tags])
+                    raw, generations = await pipe.execute()
+            except RedisError as error:
+                self._redis_failed(error)
+                return None, None
+            generations = [int(generation or 0) for generation in generations]
+            entry = json.loads(raw) if raw else None
+        else:
+            return None, None
+        if entry is not None and entry["generations"] != generations:
+            entry = None
+        return entry, generations
+
+    async def store(self, key: str, entry: dict, ttl: int) -> None:
+        if self.backend == "local":
+            self.local.set(key, dict(entry, expires=time.time() + ttl))
+        elif self.backend == "redis" and self.redis_available:
+            try:
+                await self.redis_db.set(f"rc:{key}", json.dumps(entry), ex=ttl)
+            except RedisError as error:
+                self._redis_failed(error)
+
+    async def invalidate(self, *tags: str) -> None:
+        if self.backend == "local":
+            for tag in tags:
+                self.generations[tag] = self.generations.get(tag, 0) + 1
+        if self.backend != "redis" or self.redis_db is None or not tags:
+            return
+        try:
+            async with self.redis_db.pipeline(transaction=False) as pipe:
+                for tag in tags:
+                    pipe.incr(f"rc:gen:{tag}")
+                    pipe.expire(f"rc:gen:{tag}", GENERATION_TTL)
+                await pipe.execute()
+        except RedisError as error:
+            # entries of these tags stay valid until their ttl runs out
+            self._redis_failed(error)
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.backend,
+            "redis_errors": self.redis_errors,
+            "routes": {name: route.stats() for name, route in self.routes.items()},
+        }
+
+
+class CachedRoute:
+    """
+    Read-through cache for one GET route. ``ttl`` is configured per
+    route, 0 disables caching for it. Responses carry a strong ETag
+    derived from the row versions ``load`` reports, ``If-None-Match``
+    is answered with 304 and ``X-Cache`` tells HIT, MISS or BYPASS.
+    """
+
+    def __init__(self, cache: ResponseCache, name: str, model: Type[BaseModel], ttl: int):
+        self.cache = cache
+        self.name = name
+        self.model = model
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        cache.routes[name] = self
+
+    def etag(self, version: tuple, body: str) -> str:
+        # the body is hashed along with the row version: timestamps can be
+        # coarser than the write rate (SQLite's are per second), and a
+        # strong ETag must never be reused for different bytes
+        digest = hashlib.sha256(repr((self.name, *version)).encode())
+        digest.update(body.encode())
+        return f'"{digest.hexdigest()[:32]}"'
+
+    def serialize(self, obj) -> str:
+        if not isinstance(obj, BaseModel):
+            obj = self.model.from_orm(obj)
+        return obj.json()
+
+    async def respond(
+        self,
+        request: Request,
+        key: Hashable,
+        tags: List[str],
+        load: Callable[[], Awaitable[Tuple[object, tuple]]],
+    ) -> Response:
+        """
+        ``load`` returns the object to serialize with ``model`` and its
+        version: a tuple of values that changes whenever the serialized
+        object does, like ``(photo.id, photo.updated_at)``.
+        """
+        cache_key = f"{self.name}:{key}"
+        entry, generations = None, None
+        if self.ttl > 0:
+            entry, generations = await self.cache.lookup(cache_key, tags)
+        if entry is not None:
+            self.hits += 1
+            return self._response(request, entry["etag"], entry["body"], "HIT")
+
+        obj, version = await load()
+        body = self.serialize(obj)
+        etag = self.etag(version, body)
+        if generations is not None:
+            self.misses += 1
+            entry = {"etag": etag, "body": body, "generations": generations}
+            await self.cache.store(cache_key, entry, self.ttl)
+        return self._response(
+            request, etag, body, "MISS" if generations is not None else "BYPASS"
+        )
+
+    @staticmethod
+    def _response(request: Request, etag: str, body: str, outcome: str) -> Response:
+        headers = {"ETag": etag, "X-Cache": outcome, "Cache-Control": "private, no-cache"}
+        if_none_match = request.headers.get("if-none-match", "")
+        candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if etag in candidates or "*" in candidates:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    def stats(self) -> dict:
+        return {"ttl": self.ttl, "hits": self.hits, "misses": self.misses}
+
+
+# ``redis_db`` is attached by the lifespan handler in main.py
+response_cache = ResponseCache(
+    None,
+    backend=settings.response_cache_backend,
+    local_size=settings.response_cache_local_size,
+    retry_after=settings.redis_retry_after,
+)
@@ -0,0 +1,277 @@
+import hashlib
+import io
+import shutil
+import tempfile
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Tuple
+
+import cloudinary
+import cloudinary.uploader
+import urllib3
+
+from src.conf.config import settings
+from src.services.effects import render_rendition
+
+CHUNK_SIZE = 1024 * 1024
+EXISTS_TIMEOUT = 5.0
+# like Starlette's UploadFile, larger bodies are spooled to disk
+SPOOL_MAX_SIZE = 1024 * 1024
+
+
+class StorageBackend:
+    """
+    Content-addressed object storage. Objects are keyed by the sha256 of
+    their bytes, so identical files map to one object and storing known
+    bytes again is a no-op. All methods are blocking and meant to run in
+    the upload executor.
+    """
+
+    known_keys_size = 10000
+
+    def __init__(self):
+        self._known_keys = OrderedDict()
+
+    def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def put(self, file, key: str) -> None:
+        raise NotImplementedError
+
+    def url(self, key: str, **transformation) -> str:
+        raise NotImplementedError
+
+    def render(
+        self,
+        key: str,
+        width: int,
+        height: int,
+        crop: str,
+        fmt: str,
+        effect: str | None = None,
+        rounded: bool = False,
+    ) -> Tuple[str, int, int]:
+        """
+        Produce one rendition of the stored object ``key`` and return its
+        url and rendered size. Rendering the same rendition again yields
+        the same url, so an interrupted batch can simply be rerun.
+        """
+        raise NotImplementedError
+
+    def _remember(self, key: str) -> None:
+        self._known_keys[key] = True
+        self._known_keys.move_to_end(key)
+        if len(self._known_keys) > self.known_keys_size:
+            self._known_keys.popitem(last=False)
+
+    def store(self, file, prefix: str) -> str:
+        """
+        Hash ``file`` chunk by chunk and upload it under
+        ``<prefix>/<sha256>`` unless that object is already stored.
+        Non-seekable streams are spooled while hashing, so the bytes
+        are read from the source only once.
+        """
+        digest = hashlib.sha256()
+        if getattr(file, "seekable", lambda: False)():
+            source, start = file, file.tell()
+            for chunk in iter(lambda: file.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+        else:
+            source, start = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE), 0
+            for chunk in iter(lambda: file.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+                source.write(chunk)
+        source.seek(start)
+        return self.put_once(source, f"{prefix}/{digest.hexdigest()}")
+
+    def put_once(self, file, key: str) -> str:
+        """
+        Upload ``file`` under ``key`` unless that object is already stored.
+        ``key`` must determine the bytes, like the sha256 keys of ``store``.
+        """
+        if key in self._known_keys or self.exists(key):
+            self._remember(key)
+            return key
+        self.put(file, key)
+        self._remember(key)
+        return key
+
+    def writer(self, prefix: str) -> "StorageWriter":
+        """A sink to stream an object into, see ``StorageWriter``."""
+        return StorageWriter(self, prefix)
+
+
+class StorageWriter:
+    """
+    Receives an object chunk by chunk, hashing it on the way, and stores
+    it under ``<prefix>/<sha256>`` on ``commit()``, unless that object
+    is already stored. The key is only known at the end, so the bytes are
+    kept meanwhile in a temporary file on disk, never in memory.
+    Blocking, like the backend.
+    """
+
+    def __init__(self, backend: StorageBackend, prefix: str):
+        self.backend = backend
+        self.prefix = prefix
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self._file = self._open()
+
+    def _open(self):
+        # named, so other processes can read it by path; deleted on close
+        return tempfile.NamedTemporaryFile(prefix="upload-")
+
+    @property
+    def key(self) -> str:
+        return f"{self.prefix}/{self.digest.hexdigest()}"
+
+    def write(self, chunk: bytes) -> None:
+        self.digest.update(chunk)
+        self.size += len(chunk)
+        self._file.write(chunk)
+
+    def path(self) -> str:
+        """The file holding the bytes written, for callers that process the object elsewhere."""
+        self._file.flush()
+        return self._file.name
+
+    def commit(self) -> str:
+        self._file.seek(0)
+        try:
+            return self.backend.put_once(self._file, self.key)
+        finally:
+            self._file.close()
+
+    def abort(self) -> None:
+        self._file.close()
+
+
+class CloudinaryStorage(StorageBackend):
+    def __init__(self):
+        super().__init__()
+        cloudinary.config(
+            cloud_name=settings.cloudinary_name,
+            api_key=settings.cloudinary_api_key,
+            api_secret=settings.cloudinary_secret,
+            secure=True,
+        )
+        self._http = urllib3.PoolManager()
+
+    def exists(self, key: str) -> bool:
+        # a HEAD on the delivery url rather than the Admin API, which has an
+        # hourly quota; without a clear 200 the upload just goes ahead, an
+        # upload with overwrite=False of a stored key changes nothing
+        try:
+            response = self._http.request(
+                "HEAD", self.url(key), retries=False, timeout=EXISTS_TIMEOUT
+            )
+        except urllib3.exceptions.HTTPError:
+            return False
+        return response.status == 200
+
+    def put(self, file, key: str) -> None:
+        cloudinary.uploader.upload(file, public_id=key, overwrite=False)
+
+    def url(self, key: str, **transformation) -> str:
+        return cloudinary.CloudinaryImage(key).build_url(**transformation)
+
+    def render(self, key, width, height, crop, fmt, effect=None, rounded=False):
+        # an eager transformation is derived now instead of on the first
+        # request for it; deriving an existing one again is a no-op
+        transformation = {"width": width, "height": height, "crop": crop, "format": fmt}
+        if effect:
+            transformation["effect"] = effect
+        if rounded:
+            transformation["radius"] = "max"
+        result = cloudinary.uploader.explicit(key, type="upload", eager=[transformation])
+        derived = result["eager"][0]
+        return derived["secure_url"], derived["width"], derived["height"]
+
+
+class LocalStorage(StorageBackend):
+    """
+    Stores objects under a local directory served by the ``/static`` mount.
+    ``delay`` simulates network latency, so upload concurrency can be
+    load-tested without leaving the machine. URL transformations are
+    ignored, the original file is served as is; renditions are rendered
+    with Pillow next to it.
+    """
+
+    def __init__(self, root: str, base_url: str, delay: float = 0.0):
+        super().__init__()
+        self.root = Path(root)
+        self.base_url = base_url.rstrip("/")
+        self.delay = delay
+
+    def exists(self, key: str) -> bool:
+        return (self.root / key).is_file()
+
+    def put(self, file, key: str) -> None:
+        path = self.root / key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=path.parent, delete=False) as fh:
+            shutil.copyfileobj(file, fh, CHUNK_SIZE)
+        Path(fh.name).replace(path)
+        if self.delay:
+            time.sleep(self.delay)
+
+    def url(self, key: str, **transformation) -> str:
+        return f"{self.base_url}/{key}"
+
+    def writer(self, prefix: str) -> StorageWriter:
+        return LocalWriter(self, prefix)
+
+    def render(self, key, width, height, crop, fmt, effect=None, rounded=False):
+        name = f"{width}x{height}_{crop}"
+        if effect:
+            name += "_" + effect.replace(":", "-")
+        if rounded:
+            name += "_r"
+        rendition_key = f"{key}.{name}.{fmt}"
+        image, rendered_width, rendered_height = render_rendition(
+            self.root / key, width, height, crop, fmt, effect, rounded
+        )
+        self.put(io.BytesIO(image), rendition_key)
+        return self.url(rendition_key), rendered_width, rendered_height
+
+
+class LocalWriter(StorageWriter):
+    """Writes straight into a temporary file next to the objects, committing is a rename."""
+
+    def _open(self):
+        self.backend.root.mkdir(parents=True, exist_ok=True)
+        return tempfile.NamedTemporaryFile(dir=self.backend.root, prefix=".incoming-", delete=False)
+
+    def commit(self) -> str:
+        key = self.key
+        self._file.close()
+        incoming = Path(self._file.name)
+        if key in self.backend._known_keys or self.backend.exists(key):
+            incoming.unlink()
+        else:
+            path = self.backend.root / key
+            path.parent.mkdir(parents=True, exist_ok=True)
+            incoming.replace(path)
+            if self.backend.delay:
+                time.sleep(self.backend.delay)
+        self.backend._remember(key)
+        return key
+
+    def abort(self) -> None:
+        self._file.close()
+        Path(self._file.name).unlink(missing_ok=True)
+
+
+def get_storage() -> StorageBackend:
+    if settings.storage_backend == "local":
+        return LocalStorage(
+            settings.storage_local_dir,
+            settings.storage_local_url,
+            settings.storage_local_delay,
+        )
+    return CloudinaryStorage()
+
+
+storage = get_storage()
+
@@ -0,0 +1,55 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException, status
+
+from src.conf.config import settings
+
+
+class UploadExecutor:
+    """
+    Runs blocking uploads in a bounded thread pool so they never stall the
+    event loop. At most ``max_workers`` uploads are in flight and at most
+    ``max_queue`` wait for a worker; anything beyond that is rejected with
+    503 and a ``Retry-After`` header instead of piling up in memory.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int, retry_after: int):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self.pending = 0
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="upload"
+        )
+
+    @property
+    def saturated(self) -> bool:
+        return self.pending >= self.max_workers + self.max_queue
+
+    async def submit(self, fn, *args, **kwargs):
+        if self.saturated:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many uploads in progress, try again later",
+                headers={"Retry-After": str(self.retry_after)},
+            )
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._executor, functools.partial(fn, *args, **kwargs)
+            )
+        finally:
+            self.pending -= 1
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
+
+
+upload_executor = UploadExecutor(
+    max_workers=settings.upload_max_workers,
+    max_queue=settings.upload_max_queue,
+    retry_after=settings.upload_retry_after,
+)
@@ -1,3 +1,4 @@
+import asyncio
 import os
 import sys
 
@@ -5,40 +6,54 @@ sys.path.append(os.path.abspath("."))
 
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
 
 from main import app
 from src.database.models import Base
 from src.database.connect import get_db
 
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+SQLALCHEMY_DATABASE_URL = "sqlite+aiosqlite:///./test.db"
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+# The fixtures below serve the synchronous TestClient tests. Async
+# unittest tests run in their own event loop, where pytest fixtures are
+# not available; they subclass tests.memory_db.MemoryDBTestCase, which
+# sets up a fresh in-memory database and an API client per test.
+
+# NullPool: TestClient may drive requests from different event loops, so
+# connections must not outlive the loop that opened them.
+engine = create_async_engine(
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    poolclass=NullPool,
+)
+TestingSessionLocal = async_sessionmaker(
+    bind=engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
 )
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+async def init_models():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
 
 
 @pytest.fixture(scope="module")
 def session():
-    Base.metadata.drop_all(bind=engine)
-    Base.metadata.create_all(bind=engine)
+    asyncio.run(init_models())
     db = TestingSessionLocal()
     try:
         yield db
     finally:
-        db.close()
+        asyncio.run(db.close())
 
 
 @pytest.fixture(scope="module")
 def client(session):
-    def override_get_db():
-        try:
-            yield session
-        finally:
-            session.close()
+    async def override_get_db():
+        async with TestingSessionLocal() as db:
+            yield db
 
     app.dependency_overrides[get_db] = override_get_db
     yield TestClient(app)
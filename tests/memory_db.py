@@ -0,0 +1,75 @@
+import unittest
+from unittest.mock import patch
+
+import httpx
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from main import app
+from src.database.connect import get_db
+from src.database.models import Base
+from src.repository import tags as repository_tags
+from src.services.auth import auth_service
+from src.services.rate_limit import RateLimitEngine
+from src.services.user_cache import UserCache
+
+
+class MemoryDBTestCase(unittest.IsolatedAsyncioTestCase):
+    """
+    Tests against a fresh in-memory SQLite database. ``asyncSetUp`` creates
+    the schema and provides ``self.engine``, ``self.SessionLocal`` and an
+    open session ``self.db``; subclasses call it first and seed from there:
+
+        async def asyncSetUp(self):
+            await super().asyncSetUp()
+            self.db.add(User(...))
+            await self.db.commit()
+
+    ``api_client()`` serves the app from the same database.
+    """
+
+    async def asyncSetUp(self):
+        self.engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        self.addAsyncCleanup(self.engine.dispose)
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.SessionLocal = async_sessionmaker(bind=self.engine, expire_on_commit=False)
+        self.db = self.SessionLocal()
+        self.addAsyncCleanup(self.db.close)
+        # ids cached for another database would be attached as they are
+        repository_tags.tag_ids.clear()
+        self.addCleanup(repository_tags.tag_ids.clear)
+
+    def patch(self, *patchers) -> None:
+        """Start ``patchers`` (``patch(...)`` objects) until the end of the test."""
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def api_client(self, email: str | None = None) -> httpx.AsyncClient:
+        """
+        A client for the app on this database, signed in as ``email`` when
+        given. Tokens are signed with HS256, and the user cache and rate
+        limiter are local to the test.
+        """
+
+        async def override_get_db():
+            async with self.SessionLocal() as db:
+                yield db
+
+        self.patch(
+            patch.dict(app.dependency_overrides, {get_db: override_get_db}),
+            patch.object(auth_service, "ALGORITHM", "HS256"),
+            patch("src.services.auth.user_cache", UserCache(None, 900, 16, 60)),
+            patch(
+                "src.services.rate_limit.rate_limiter",
+                RateLimitEngine(None, backend="local", local_size=64, local_share=0.5, sync_interval=60.0),
+            ),
+        )
+        headers = {}
+        if email is not None:
+            token = await auth_service.create_access_token({"sub": email})
+            headers["Authorization"] = f"Bearer {token}"
+        client = httpx.AsyncClient(app=app, base_url="http://test", headers=headers)
+        self.addAsyncCleanup(client.aclose)
+        return client
@@ -0,0 +1,33 @@
+from sqlalchemy import event
+
+
+class QueryCounter:
+    """
+    Counts SQL statements sent to the database while the block runs:
+
+        with QueryCounter(engine) as counter:
+            ...
+        assert counter.count <= 2, counter.statements
+    """
+
+    def __init__(self, engine):
+        self.engine = getattr(engine, "sync_engine", engine)
+        self.queries = []
+
+    @property
+    def statements(self) -> list:
+        return [statement for statement, _ in self.queries]
+
+    @property
+    def count(self) -> int:
+        return len(self.queries)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.queries.append((statement, parameters))
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._record)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._record)
@@ -0,0 +1,147 @@
+import hashlib
+import io
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from PIL import Image
+from sqlalchemy import func, select
+
+from src.database.models import Photo, PhotoRendition, Role, Tag, User
+from src.services.ingest import ingest_batch
+from src.services.storage import LocalStorage, LocalWriter
+from tests.memory_db import MemoryDBTestCase
+from tests.test_ingest import BOUNDARY, PNG, make_request, part
+
+
+def png(color) -> bytes:
+    image = io.BytesIO()
+    Image.new("RGB", (8, 8), color).save(image, "PNG")
+    return image.getvalue()
+
+
+class TestIngestBatch(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.storage = LocalStorage(self.tmp.name, "/static/uploads")
+
+    def body(self, files, chunk_size=1000):
+        data = part("items") + b"[]\r\n"
+        for name, content in files:
+            data += part("files", name) + content + b"\r\n"
+        data += b"--" + BOUNDARY + b"--\r\n"
+        return [data[start : start + chunk_size] for start in range(0, len(data), chunk_size)]
+
+    async def test_bad_files_fail_alone(self):
+        files = [
+            ("a.png", PNG + b"\x01" * 3000),
+            ("notes.txt", b"just some text, no image"),
+            ("b.png", PNG + b"\x02" * 9000),
+            ("c.png", PNG + b"\x03" * 10),
+        ]
+        fields, ingested = await ingest_batch(
+            make_request(self.body(files)), lambda: self.storage.writer("photos"), 5000, 10
+        )
+        self.assertEqual(fields, {"items": ["[]"]})
+        self.assertEqual([file.filename for file in ingested], ["a.png", "notes.txt", "b.png", "c.png"])
+        self.assertEqual(
+            [file.error and file.error.status_code for file in ingested], [None, 415, 413, None]
+        )
+        for file, (_, content) in zip(ingested, files):
+            if file.error is None:
+                self.assertEqual(file.sha256, hashlib.sha256(content).hexdigest())
+                self.assertEqual(Path(self.tmp.name, file.writer.commit()).read_bytes(), content)
+        self.assertEqual(list(Path(self.tmp.name).glob(".incoming-*")), [])
+
+    async def test_too_many_files(self):
+        with self.assertRaises(Exception) as error:
+            await ingest_batch(
+                make_request(self.body([("a.png", PNG)] * 3)),
+                lambda: self.storage.writer("photos"),
+                5000,
+                2,
+            )
+        self.assertEqual(error.exception.status_code, 422)
+        self.assertEqual(list(Path(self.tmp.name).glob(".incoming-*")), [])
+
+
+class TestBatchUploadRoute(MemoryDBTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.db.add(User(user_name="owner", email="owner@example.com", password="x", roles=Role.user))
+        self.db.add(Tag(tag_name="sea"))
+        await self.db.commit()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.storage = LocalStorage(self.tmp.name, "/static/uploads")
+        self.patch(patch("src.routes.photos.storage", self.storage))
+        self.client = await self.api_client("owner@example.com")
+
+    async def post(self, files, items):
+        return await self.client.post(
+            "/api/photos/upload/batch",
+            data={"items": json.dumps(items)},
+            files=[("files", file) for file in files],
+        )
+
+    async def test_partial_failure_keeps_the_rest(self):
+        red, green, blue = png((255, 0, 0)), png((0, 255, 0)), png((0, 0, 255))
+        commit = LocalWriter.commit
+
+        def flaky_commit(writer):
+            if writer.digest.hexdigest() == hashlib.sha256(blue).hexdigest():
+                raise OSError("disk full")
+            return commit(writer)
+
+        with patch.object(LocalWriter, "commit", autospec=True, side_effect=flaky_commit):
+            response = await self.post(
+                [
+                    ("red.png", red, "image/png"),
+                    ("notes.txt", b"just some text", "image/png"),
+                    ("green.png", green, "image/png"),
+                    ("blue.png", blue, "image/png"),
+                ],
+                [
+                    {"description": "red", "tags": ["sea", "sun"]},
+                    {"description": "text"},
+                    {"description": "green", "tags": ["sun", "grass"]},
+                ],
+            )
+        self.assertEqual(response.status_code, 200, response.text)
+        result = response.json()
+        self.assertEqual((result["uploaded"], result["failed"]), (2, 2))
+        items = result["items"]
+        self.assertEqual([item["status_code"] for item in items], [201, 415, 201, 500])
+        self.assertEqual(items[0]["photo"]["description"], "red")
+        self.assertEqual(sorted(tag["tag_name"] for tag in items[0]["photo"]["tags"]), ["sea", "sun"])
+        self.assertEqual(items[2]["photo"]["description"], "green")
+        self.assertIsNone(items[3]["photo"])
+        self.assertEqual(list(Path(self.tmp.name).glob(".incoming-*")), [])
+
+        async with self.SessionLocal() as db:
+            self.assertEqual(await db.scalar(select(func.count(Photo.id))), 2)
+            self.assertEqual(
+                sorted((await db.scalars(select(Tag.tag_name))).all()), ["grass", "sea", "sun"]
+            )
+            # renditions of both photos queued with them
+            photo_ids = set((await db.scalars(select(PhotoRendition.photo_id))).all())
+            self.assertEqual(photo_ids, {items[0]["photo"]["id"], items[2]["photo"]["id"]})
+        response = await self.client.get(f"/api/photos/{items[2]['photo']['id']}")
+        self.assertEqual(response.json()["photo"], items[2]["photo"]["photo"])
+
+    async def test_invalid_items(self):
+        response = await self.post(
+            [("red.png", png((255, 0, 0)), "image/png")],
+            [{"tags": ["a", "b", "c", "d", "e", "f"]}],
+        )
+        self.assertEqual(response.status_code, 422)
+        response = await self.post([("red.png", png((255, 0, 0)), "image/png")], [{}, {}])
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(list(Path(self.tmp.name).rglob("*")), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
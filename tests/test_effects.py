@@ -0,0 +1,94 @@
+import io
+import tempfile
+import unittest
+
+import numpy as np
+from fastapi import HTTPException
+from PIL import Image
+
+from src.services.effects import EFFECTS, EffectsEngine, apply_effects, render
+
+
+def sample(width=64, height=48) -> Image.Image:
+    rng = np.random.default_rng(0)
+    gradient = np.linspace(0, 255, width, dtype=np.float32)[None, :, None]
+    noise = rng.integers(0, 64, (height, width, 3))
+    pixels = np.clip(gradient + noise, 0, 255).astype(np.uint8)
+    return Image.fromarray(pixels)
+
+
+def encode(image: Image.Image, fmt="JPEG") -> bytes:
+    out = io.BytesIO()
+    image.save(out, fmt)
+    return out.getvalue()
+
+
+class TestEffects(unittest.TestCase):
+    def test_tiles_match_the_whole_image(self):
+        image = sample()
+        for name in EFFECTS:
+            with self.subTest(effect=name):
+                whole = np.asarray(apply_effects(image, name, True, tile_rows=image.height), np.int16)
+                tiled = np.asarray(apply_effects(image, name, True, tile_rows=5), np.int16)
+                # running sums start at different rows, float rounding may differ by one
+                self.assertLessEqual(np.abs(whole - tiled).max(), 1)
+
+    def test_grayscale(self):
+        pixels = np.asarray(apply_effects(sample(), "grayscale", False, tile_rows=16))
+        self.assertTrue((pixels[..., 0] == pixels[..., 1]).all())
+        self.assertTrue((pixels[..., 1] == pixels[..., 2]).all())
+
+    def test_blur_keeps_flat_areas(self):
+        image = Image.new("RGB", (32, 32), (200, 100, 50))
+        pixels = np.asarray(apply_effects(image, "blur", False, tile_rows=8))
+        self.assertTrue((pixels == (200, 100, 50)).all())
+
+    def test_vignette_darkens_corners(self):
+        image = Image.new("RGB", (40, 40), (200, 200, 200))
+        pixels = np.asarray(apply_effects(image, "vignette", False, tile_rows=8))
+        self.assertEqual(tuple(pixels[20, 20]), (200, 200, 200))
+        self.assertLess(pixels[0, 0, 0], 100)
+
+    def test_rounded_corners_are_transparent(self):
+        image = apply_effects(sample(40, 40), None, True, tile_rows=8)
+        alpha = np.asarray(image)[..., 3]
+        self.assertEqual(image.mode, "RGBA")
+        self.assertEqual(alpha[0, 0], 0)
+        self.assertEqual(alpha[20, 20], 255)
+
+    def test_render_fills_the_target_size(self):
+        data = encode(sample(300, 120))
+        image = Image.open(io.BytesIO(render(data, "sepia", False, 50, 50, 16)))
+        self.assertEqual((image.format, image.size), ("JPEG", (50, 50)))
+        image = Image.open(io.BytesIO(render(data, None, True, 50, 40, 16)))
+        self.assertEqual((image.format, image.size, image.mode), ("PNG", (50, 40), "RGBA"))
+
+
+class TestEffectsEngine(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.engine = EffectsEngine(max_workers=1, max_queue=1, retry_after=3, tile_rows=16)
+        self.addCleanup(self.engine.shutdown)
+
+    async def test_render_in_worker(self):
+        data = await self.engine.render(encode(sample()), "art:frost", False, 32, 32)
+        self.assertEqual(Image.open(io.BytesIO(data)).size, (32, 32))
+        self.assertEqual(self.engine.pending, 0)
+
+    async def test_worker_reads_the_file_itself(self):
+        with tempfile.NamedTemporaryFile(suffix=".png") as file:
+            file.write(encode(sample(), "PNG"))
+            file.flush()
+            data = await self.engine.render(file.name, "sepia", True, 32, 32)
+        self.assertEqual(Image.open(io.BytesIO(data)).size, (32, 32))
+
+    async def test_rejects_bad_input(self):
+        with self.assertRaises(HTTPException) as error:
+            await self.engine.render(b"not an image", None, False, 32, 32)
+        self.assertEqual(error.exception.status_code, 415)
+        with self.assertRaises(HTTPException) as error:
+            await self.engine.render(encode(sample()), "art:unknown", False, 32, 32)
+        self.assertEqual(error.exception.status_code, 422)
+
+
+if __name__ == "__main__":
+    unittest.main()
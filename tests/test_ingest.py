@@ -0,0 +1,226 @@
+import hashlib
+import io
+import tempfile
+import tracemalloc
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from fastapi import HTTPException
+from PIL import Image
+from sqlalchemy import select
+from starlette.requests import Request
+
+from src.conf.config import settings
+from src.database.models import Photo, PhotoRendition, Role, User
+from src.services import effects
+from src.services.ingest import ingest_upload, sniff_image_type
+from src.services.storage import LocalStorage, StorageWriter
+from tests.memory_db import MemoryDBTestCase
+
+BOUNDARY = b"----WebKitFormBoundary7MA4YWxkTrZu0gW"
+PNG = b"\x89PNG\r\n\x1a\n"
+
+
+def part(name: str, filename: str | None = None) -> bytes:
+    disposition = f'form-data; name="{name}"'
+    if filename:
+        disposition += f'; filename="{filename}"'
+    return b"--" + BOUNDARY + b"\r\nContent-Disposition: " + disposition.encode() + b"\r\n\r\n"
+
+
+def multipart_body(fields: dict, file: bytes, chunk_size: int = 64 * 1024):
+    """The multipart body in chunks, as a server receives it."""
+    for name, value in fields.items():
+        yield part(name) + value.encode() + b"\r\n"
+    yield part("file", "photo.png")
+    for start in range(0, len(file), chunk_size):
+        yield file[start : start + chunk_size]
+    yield b"\r\n--" + BOUNDARY + b"--\r\n"
+
+
+def make_request(chunks, content_length: int | None = None) -> Request:
+    headers = [(b"content-type", b"multipart/form-data; boundary=" + BOUNDARY)]
+    if content_length is not None:
+        headers.append((b"content-length", str(content_length).encode()))
+    chunks = iter(chunks)
+
+    async def receive():
+        chunk = next(chunks, None)
+        if chunk is None:
+            return {"type": "http.request", "body": b"", "more_body": False}
+        return {"type": "http.request", "body": chunk, "more_body": True}
+
+    return Request({"type": "http", "method": "POST", "headers": headers}, receive)
+
+
+class LargeFile:
+    """``size`` bytes of PNG-looking data, made one chunk at a time."""
+
+    def __init__(self, size: int, chunk_size: int = 64 * 1024):
+        self.size = size
+        self.chunk_size = chunk_size
+        self.sha256 = hashlib.sha256()
+
+    def chunks(self):
+        yield part("body") + b"large\r\n" + part("file", "large.png")
+        sent = 0
+        while sent < self.size:
+            chunk = PNG + bytes(self.chunk_size - len(PNG)) if sent == 0 else bytes(self.chunk_size)
+            chunk = chunk[: self.size - sent]
+            self.sha256.update(chunk)
+            sent += len(chunk)
+            yield chunk
+        yield b"\r\n--" + BOUNDARY + b"--\r\n"
+
+
+class TestIngestUpload(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.storage = LocalStorage(self.tmp.name, "/static/uploads")
+
+    def leftovers(self):
+        return list(Path(self.tmp.name).glob(".incoming-*"))
+
+    def test_sniff_image_type(self):
+        self.assertEqual(sniff_image_type(b"\xff\xd8\xff\xe0\x00\x10JFIF\x00"), "image/jpeg")
+        self.assertEqual(sniff_image_type(PNG + b"\x00" * 4), "image/png")
+        self.assertEqual(sniff_image_type(b"RIFF\x00\x00\x00\x00WEBP"), "image/webp")
+        self.assertIsNone(sniff_image_type(b"<svg xmlns="))
+
+    async def test_fields_hash_and_storage(self):
+        data = PNG + b"\x01" * 200_000
+        writer = self.storage.writer("photos")
+        request = make_request(multipart_body({"body": "sea", "tags": "a,b"}, data, chunk_size=7000))
+        upload = await ingest_upload(request, writer, max_bytes=1024 * 1024)
+        self.assertEqual(upload.fields, {"body": ["sea"], "tags": ["a,b"]})
+        self.assertEqual((upload.filename, upload.content_type), ("photo.png", "image/png"))
+        self.assertEqual((upload.size, upload.sha256), (len(data), hashlib.sha256(data).hexdigest()))
+
+        key = writer.commit()
+        self.assertEqual(key, f"photos/{upload.sha256}")
+        self.assertEqual((Path(self.tmp.name) / key).read_bytes(), data)
+        self.assertEqual(self.leftovers(), [])
+
+    async def test_limit_while_streaming(self):
+        received = []
+        chunks = multipart_body({}, PNG + bytes(300_000))
+        request = make_request(received.append(chunk) or chunk for chunk in chunks)
+        with self.assertRaises(HTTPException) as error:
+            await ingest_upload(request, self.storage.writer("photos"), max_bytes=100_000)
+        self.assertEqual(error.exception.status_code, 413)
+        # stopped reading at the first chunk past the limit
+        self.assertLess(sum(map(len, received)), 200_000)
+        self.assertEqual(self.leftovers(), [])
+
+    async def test_limit_from_content_length(self):
+        request = make_request(iter(()), content_length=50 * 1024 * 1024)
+        with self.assertRaises(HTTPException) as error:
+            await ingest_upload(request, self.storage.writer("photos"), max_bytes=1024 * 1024)
+        self.assertEqual(error.exception.status_code, 413)
+
+    async def test_rejects_non_images_and_missing_file(self):
+        request = make_request(multipart_body({}, b"#!/bin/sh\nrm -rf /\n"))
+        with self.assertRaises(HTTPException) as error:
+            await ingest_upload(request, self.storage.writer("photos"), max_bytes=1024)
+        self.assertEqual(error.exception.status_code, 415)
+
+        request = make_request([part("body") + b"sea\r\n--" + BOUNDARY + b"--\r\n"])
+        with self.assertRaises(HTTPException) as error:
+            await ingest_upload(request, self.storage.writer("photos"), max_bytes=1024)
+        self.assertEqual(error.exception.status_code, 422)
+        self.assertEqual(self.leftovers(), [])
+
+    async def test_large_upload_memory(self):
+        # python-multipart steps through the file in Python, which is slow
+        # while tracing; 8 MiB is plenty to tell streaming from buffering
+        size = 8 * 1024 * 1024
+        writers = {
+            "local": lambda: self.storage.writer("photos"),
+            "default": lambda: StorageWriter(self.storage, "photos"),
+        }
+        for name, new_writer in writers.items():
+            with self.subTest(writer=name):
+                large = LargeFile(size)
+                writer = new_writer()
+                tracemalloc.start()
+                try:
+                    upload = await ingest_upload(make_request(large.chunks()), writer, max_bytes=size)
+                    _, peak = tracemalloc.get_traced_memory()
+                finally:
+                    tracemalloc.stop()
+                self.assertEqual((upload.size, upload.sha256), (size, large.sha256.hexdigest()))
+                # a few chunks in flight, nowhere near the file size
+                self.assertLess(peak, 1024 * 1024)
+                key = writer.commit()
+                self.assertEqual((Path(self.tmp.name) / key).stat().st_size, size)
+
+
+class TestUploadRoute(MemoryDBTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.db.add(User(user_name="owner", email="owner@example.com", password="x", roles=Role.user))
+        await self.db.commit()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.storage = LocalStorage(self.tmp.name, "/static/uploads")
+        self.patch(patch("src.routes.photos.storage", self.storage))
+        self.client = await self.api_client("owner@example.com")
+
+    async def test_upload_is_streamed_to_storage(self):
+        image = io.BytesIO()
+        Image.new("RGB", (20, 20), (0, 128, 255)).save(image, "PNG")
+        response = await self.client.post(
+            "/api/photos/upload",
+            data={"body": "blue", "tags": "sky,sea"},
+            files={"file": ("blue.png", image.getvalue(), "image/png")},
+        )
+        self.assertEqual(response.status_code, 201, response.text)
+        photo = response.json()["photo"]
+        self.assertEqual(photo["description"], "blue")
+        self.assertEqual(sorted(tag["tag_name"] for tag in photo["tags"]), ["sea", "sky"])
+
+        key = f"photo_share_team4/{hashlib.sha256(image.getvalue()).hexdigest()}"
+        self.assertEqual(photo["photo"], f"/static/uploads/{key}")
+        self.assertTrue((Path(self.tmp.name) / key).is_file())
+        async with self.SessionLocal() as db:
+            self.assertEqual(await db.scalar(select(Photo.photo)), photo["photo"])
+
+        response = await self.client.post(
+            "/api/photos/upload", files={"file": ("notes.txt", b"just some text", "image/png")}
+        )
+        self.assertEqual(response.status_code, 415)
+
+    async def test_local_effects_keep_the_original(self):
+        original = io.BytesIO()
+        Image.new("RGB", (1200, 900), (0, 128, 255)).save(original, "PNG")
+
+        async def render_here(source, effect, rounded, width, height):
+            # handed the spooled file, not its bytes
+            self.assertIsInstance(source, str)
+            return effects.render(source, effect, rounded, width, height, tile_rows=128)
+
+        with patch.object(settings, "effects_backend", "local"), patch.object(
+            effects.effects_engine, "render", side_effect=render_here
+        ):
+            response = await self.client.post(
+                "/api/photos/upload?effects=sepia",
+                files={"file": ("blue.png", original.getvalue(), "image/png")},
+            )
+        self.assertEqual(response.status_code, 201, response.text)
+        original_key = f"photo_share_team4/{hashlib.sha256(original.getvalue()).hexdigest()}"
+        self.assertTrue((Path(self.tmp.name) / original_key).is_file())
+        # the photo shows the render, a separate object
+        url = response.json()["photo"]["photo"]
+        self.assertNotEqual(url, f"/static/uploads/{original_key}")
+        rendered = Image.open(Path(self.tmp.name) / url.removeprefix("/static/uploads/"))
+        self.assertEqual(rendered.size, (500, 500))
+        # renditions are made from the original, with the effect
+        async with self.SessionLocal() as db:
+            rendition = await db.scalar(select(PhotoRendition).limit(1))
+        self.assertEqual((rendition.source_key, rendition.effect), (original_key, "sepia"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import time
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from fastapi import HTTPException
+from jose import JWTError, jwt
+from src.database.models import Role, User
+from src.repository.users import to_ban_user
+from src.services.auth import auth_service
+from src.services.cache import TTLCache
+from src.services.user_cache import UserCache
+from tests.memory_db import MemoryDBTestCase
+
+
+def new_request():
+    return SimpleNamespace(state=SimpleNamespace())
+
+
+class TestClaimsCache(MemoryDBTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.db.add(
+            User(user_name="owner", email="owner@example.com", password="x", roles=Role.user)
+        )
+        await self.db.commit()
+
+        user_cache = UserCache(None, ttl=900, local_size=16, local_ttl=60)
+        self.patch(
+            patch.object(auth_service, "ALGORITHM", "HS256"),
+            patch.object(auth_service, "claims_cache", TTLCache(16, 3600)),
+            patch("src.services.auth.user_cache", user_cache),
+            patch("src.repository.users.user_cache", user_cache),
+        )
+        self.decode = patch("src.services.auth.jwt.decode", wraps=jwt.decode).start()
+        self.addCleanup(patch.stopall)
+
+    async def current_user(self, token):
+        return await auth_service.get_current_user(new_request(), token, db=self.db)
+
+    async def test_token_is_decoded_once(self):
+        token = await auth_service.create_access_token({"sub": "owner@example.com"})
+        for _ in range(3):
+            self.assertEqual((await self.current_user(token)).email, "owner@example.com")
+        self.assertEqual(self.decode.call_count, 1)
+
+    async def test_entry_expires_with_the_token(self):
+        token = await auth_service.create_access_token({"sub": "owner@example.com"}, expires_delta=1)
+        await self.current_user(token)
+        time.sleep(1.1)
+        # past exp the token is verified again, and rejected once jose
+        # (which compares whole seconds) sees it expired
+        try:
+            await self.current_user(token)
+        except HTTPException as error:
+            self.assertEqual(error.status_code, 401)
+        self.assertEqual(self.decode.call_count, 2)
+
+    async def test_cache_is_keyed_by_signing_key(self):
+        token = await auth_service.create_access_token({"sub": "owner@example.com"})
+        auth_service.decode_token(token)
+        with patch.object(auth_service, "SECRET_KEY", "rotated"):
+            with self.assertRaises(JWTError):
+                auth_service.decode_token(token)
+
+    async def test_refresh_token_uses_the_cache(self):
+        token = await auth_service.create_refresh_token({"sub": "owner@example.com"})
+        self.assertEqual(await auth_service.decode_refresh_token(token), "owner@example.com")
+        self.assertEqual(await auth_service.decode_refresh_token(token), "owner@example.com")
+        self.assertEqual(self.decode.call_count, 1)
+        with self.assertRaises(HTTPException):
+            await self.current_user(token)
+
+    async def test_banned_user_is_rejected_on_next_request(self):
+        token = await auth_service.create_access_token({"sub": "owner@example.com"})
+        await self.current_user(token)
+        user = await to_ban_user(None, "owner@example.com", self.db)
+        self.assertIsNone(user.refresh_token)
+        with self.assertRaises(HTTPException) as error:
+            await self.current_user(token)
+        self.assertEqual(error.exception.status_code, 403)
+        self.assertEqual(self.decode.call_count, 1)
+
+
+class TestTTLCacheEntryTTL(unittest.TestCase):
+    def test_per_entry_ttl(self):
+        cache = TTLCache(maxsize=4, ttl=60)
+        cache.set("short", 1, ttl=0.01)
+        cache.set("long", 2)
+        time.sleep(0.02)
+        self.assertIsNone(cache.get("short"))
+        self.assertEqual(cache.get("long"), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
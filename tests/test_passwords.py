@@ -0,0 +1,88 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+
+from fastapi import HTTPException
+from sqlalchemy import select
+
+from src.database.models import User
+from src.services.passwords import PasswordHasher, hash_password
+from src.services.user_cache import UserCache
+from tests.memory_db import MemoryDBTestCase
+
+
+class TestPasswordHasher(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        # the lowest bcrypt cost keeps the tests fast
+        self.hasher = PasswordHasher(rounds=4, max_workers=1, max_queue=4, retry_after=1)
+        self.addCleanup(self.hasher.shutdown)
+
+    async def test_hash_and_verify_in_worker(self):
+        hashed = await self.hasher.hash("secret")
+        self.assertTrue(hashed.startswith("$2b$04$"))
+        self.assertTrue(await self.hasher.verify("secret", hashed))
+        self.assertFalse(await self.hasher.verify("wrong", hashed))
+
+    async def test_outdated_cost_is_rehashed(self):
+        hashed = hash_password("secret", 5)
+        self.assertEqual(await self.hasher.verify_and_update("wrong", hashed), (False, None))
+        valid, new_hash = await self.hasher.verify_and_update("secret", hashed)
+        self.assertTrue(valid)
+        self.assertTrue(new_hash.startswith("$2b$04$"))
+        self.assertEqual(await self.hasher.verify_and_update("secret", new_hash), (True, None))
+
+    async def test_rejects_when_saturated(self):
+        hasher = PasswordHasher(rounds=4, max_workers=1, max_queue=0, retry_after=3)
+        self.addCleanup(hasher.shutdown)
+        running = asyncio.create_task(hasher.hash("secret"))
+        await asyncio.sleep(0)
+        with self.assertRaises(HTTPException) as error:
+            await hasher.hash("other")
+        self.assertEqual(error.exception.status_code, 503)
+        # also raised on signup and password changes, not only on login
+        self.assertEqual(error.exception.detail, "Password hashing is busy, try again later")
+        self.assertEqual(error.exception.headers["Retry-After"], "3")
+        self.assertTrue((await running).startswith("$2b$04$"))
+
+
+class TestLoginRehash(MemoryDBTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.db.add(
+            User(
+                user_name="owner",
+                email="owner@example.com",
+                password=hash_password("secret", 5),
+                confirmed=True,
+                ban_status=False,
+            )
+        )
+        await self.db.commit()
+        hasher = PasswordHasher(rounds=4, max_workers=1, max_queue=4, retry_after=1)
+        self.addCleanup(hasher.shutdown)
+        self.patch(
+            patch("src.services.auth.password_hasher", hasher),
+            patch("src.routes.auth.user_cache", UserCache(None, 900, 16, 60)),
+        )
+        self.client = await self.api_client()
+
+    async def login(self, password):
+        return await self.client.post(
+            "/api/auth/login", data={"username": "owner@example.com", "password": password}
+        )
+
+    async def stored_hash(self):
+        async with self.SessionLocal() as db:
+            return (await db.execute(select(User.password))).scalar()
+
+    async def test_successful_login_upgrades_hash(self):
+        self.assertEqual((await self.login("wrong")).status_code, 401)
+        self.assertTrue((await self.stored_hash()).startswith("$2b$05$"))
+        response = await self.login("secret")
+        self.assertEqual(response.status_code, 200, response.text)
+        self.assertTrue((await self.stored_hash()).startswith("$2b$04$"))
+        self.assertEqual((await self.login("secret")).status_code, 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
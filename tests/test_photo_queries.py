@@ -0,0 +1,90 @@
+import unittest
+from datetime import datetime, timedelta
+
+from src.database.models import Photo, Tag, User
+from src.routes import photos as photos_routes
+from src.schemas.photos import PhotoDb, PhotoPage, PhotoSearch
+from tests.memory_db import MemoryDBTestCase
+from tests.query_counter import QueryCounter
+
+# one query for the photos, one IN query for all their tags
+MAX_QUERIES_PER_LIST = 2
+
+
+class TestPhotoListQueries(MemoryDBTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.user = User(user_name="owner", email="owner@example.com", password="x")
+        tags = [Tag(tag_name=f"tag{n}") for n in range(3)]
+        start = datetime(2023, 5, 20)
+        self.db.add_all(
+            Photo(
+                photo=f"https://example.com/{n}.jpg",
+                description="sunset",
+                user=self.user,
+                tags=[tags[n % 3], tags[(n + 1) % 3]],
+                created_at=start + timedelta(minutes=n),
+            )
+            for n in range(60)
+        )
+        await self.db.commit()
+
+    async def count_queries(self, call, serialize) -> int:
+        async with self.SessionLocal() as db:
+            with QueryCounter(self.engine) as counter:
+                serialize(await call(db))
+        return counter.count
+
+    async def test_get_photos_cursor_mode(self):
+        for limit in (5, 50):
+            count = await self.count_queries(
+                lambda db: photos_routes.get_photos(
+                    limit=limit, paged=True, cursor=None, offset=0, current_user=self.user, db=db
+                ),
+                PhotoPage.parse_obj,
+            )
+            self.assertLessEqual(count, MAX_QUERIES_PER_LIST, f"limit={limit}")
+
+    async def test_get_photos_offset_mode(self):
+        for limit in (5, 50):
+            count = await self.count_queries(
+                lambda db: photos_routes.get_photos(
+                    limit=limit, paged=False, cursor=None, offset=3, current_user=self.user, db=db
+                ),
+                lambda photos: [PhotoDb.from_orm(photo) for photo in photos],
+            )
+            self.assertLessEqual(count, MAX_QUERIES_PER_LIST, f"limit={limit}")
+
+    async def test_get_photos_defaults_to_a_list(self):
+        async with self.SessionLocal() as db:
+            photos = await photos_routes.get_photos(
+                limit=10, paged=False, cursor=None, offset=0, current_user=self.user, db=db
+            )
+        self.assertIsInstance(photos, list)
+        self.assertEqual(len(photos), 10)
+
+    async def test_search_by_keyword(self):
+        for filter_by in (None, "rating", "creation_date"):
+            count = await self.count_queries(
+                lambda db: photos_routes.search_photo_by_keyword(
+                    search_by="sunset", filter_by=filter_by, limit=None, offset=0,
+                    current_user=self.user, db=db,
+                ),
+                lambda photos: [PhotoSearch.from_orm(photo) for photo in photos],
+            )
+            self.assertLessEqual(count, MAX_QUERIES_PER_LIST, f"filter_by={filter_by}")
+
+    async def test_search_by_tag(self):
+        for filter_by in (None, "rating", "creation_date"):
+            count = await self.count_queries(
+                lambda db: photos_routes.search_photo_by_tag(
+                    search_by="tag1", filter_by=filter_by, limit=None, offset=0,
+                    current_user=self.user, db=db,
+                ),
+                lambda photos: [PhotoSearch.from_orm(photo) for photo in photos],
+            )
+            self.assertLessEqual(count, MAX_QUERIES_PER_LIST, f"filter_by={filter_by}")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,178 @@
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from src.database.models import Photo, Tag, User
+from src.repository.photos import (
+    cached_search,
+    parse_search_terms,
+    search_photo_by_keyword,
+    search_photo_by_tag,
+    update_description,
+    upload_photo,
+)
+from src.repository.rating import create_rating
+from src.schemas.photos import PhotoModel
+from src.schemas.rating import PhotoRatingModel
+from src.services.response_cache import ResponseCache
+from tests.memory_db import MemoryDBTestCase
+from tests.query_counter import QueryCounter
+
+
+class TestParseSearchTerms(unittest.TestCase):
+    def test_prefix_and_syntax_stripping(self):
+        self.assertEqual(
+            parse_search_terms('sun* "beach" OR -night'),
+            [("sun", True), ("beach", False), ("OR", False), ("night", False)],
+        )
+        self.assertEqual(parse_search_terms('*" -'), [])
+
+
+class TestSearchPhotoByKeyword(MemoryDBTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        user = User(user_name="owner", email="owner@example.com", password="x")
+        start = datetime(2023, 5, 20)
+        descriptions = [
+            "sunset over the sea",
+            "sunset sunset sunset",
+            "sunny morning in the mountains",
+            "city at night",
+        ]
+        self.photos = [
+            Photo(
+                photo=f"https://example.com/{n}.jpg",
+                description=description,
+                user=user,
+                created_at=start - timedelta(days=n),
+                average_rating=float(n),
+            )
+            for n, description in enumerate(descriptions)
+        ]
+        self.db.add_all(self.photos)
+        await self.db.commit()
+
+    async def search(self, search_by, filter_by=None):
+        result = await search_photo_by_keyword(search_by, filter_by, self.db)
+        return [photo.description for photo in result]
+
+    async def test_ranked_by_relevance(self):
+        self.assertEqual(
+            await self.search("sunset"), ["sunset sunset sunset", "sunset over the sea"]
+        )
+
+    async def test_prefix_query(self):
+        self.assertEqual(len(await self.search("sun*")), 3)
+        self.assertEqual(await self.search("sun"), [])
+
+    async def test_all_words_must_match(self):
+        self.assertEqual(await self.search("sunset sea"), ["sunset over the sea"])
+
+    async def test_orderings(self):
+        self.assertEqual(
+            await self.search("sun*", "created_at"),
+            ["sunny morning in the mountains", "sunset sunset sunset", "sunset over the sea"],
+        )
+        self.assertEqual(
+            await self.search("sun*", "rating"),
+            ["sunset over the sea", "sunset sunset sunset", "sunny morning in the mountains"],
+        )
+
+    async def test_ties_page_in_id_order(self):
+        tag = Tag(tag_name="batch")
+        same = datetime(2023, 6, 1)
+        batch = [
+            Photo(
+                photo=f"https://example.com/batch/{n}.jpg",
+                description="batch upload",
+                user_id=self.photos[0].user_id,
+                created_at=same,
+                average_rating=0.0,
+                tags=[tag],
+            )
+            for n in range(5)
+        ]
+        self.db.add_all(batch)
+        await self.db.commit()
+        expected = sorted(photo.id for photo in batch)
+        for search, search_by in ((search_photo_by_keyword, "batch"), (search_photo_by_tag, "batch")):
+            for filter_by in (None, "created_at", "rating"):
+                with self.subTest(search=search.__name__, filter_by=filter_by):
+                    pages = [
+                        await search(search_by, filter_by, self.db, limit=2, offset=offset)
+                        for offset in (0, 2, 4)
+                    ]
+                    self.assertEqual([photo.id for page in pages for photo in page], expected)
+
+    async def test_index_follows_updates_and_deletes(self):
+        self.photos[3].description = "sunset in the city"
+        await self.db.delete(self.photos[0])
+        await self.db.commit()
+        self.assertEqual(
+            sorted(await self.search("sunset")),
+            ["sunset in the city", "sunset sunset sunset"],
+        )
+
+
+class TestSearchCache(MemoryDBTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.owner = User(user_name="owner", email="owner@example.com", password="x")
+        self.voter = User(user_name="voter", email="voter@example.com", password="x")
+        tag = Tag(tag_name="sea")
+        self.photos = [
+            Photo(
+                photo=f"https://example.com/{n}.jpg",
+                description=f"sunset number {n}",
+                user=self.owner,
+                tags=[tag],
+            )
+            for n in range(3)
+        ]
+        self.db.add_all([*self.photos, self.voter])
+        await self.db.commit()
+        cache = ResponseCache(None, backend="local", local_size=64)
+        for module in ("photos", "rating"):
+            patcher = patch(f"src.repository.{module}.response_cache", cache)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def search(self, kind="keyword", search_by="sunset", filter_by=None, **page):
+        with QueryCounter(self.engine) as counter:
+            photos = await cached_search(kind, search_by, filter_by, self.db, **page)
+        return [photo.id for photo in photos], counter.statements
+
+    async def test_hit_hydrates_ids_in_one_batch(self):
+        ids, _ = await self.search(filter_by="created_at")
+        cached_ids, statements = await self.search(filter_by="created_at")
+        self.assertEqual(cached_ids, ids)
+        self.assertFalse(any("MATCH" in statement for statement in statements))
+        self.assertLessEqual(len(statements), 2, statements)
+
+    async def test_key_includes_page(self):
+        ids, _ = await self.search("tag", "sea", "created_at")
+        self.assertEqual((await self.search("tag", "sea", "created_at", limit=1, offset=1))[0], ids[1:2])
+        self.assertEqual((await self.search("tag", "sea", "created_at", limit=1))[0], ids[:1])
+
+    async def test_photo_writes_bump_generation(self):
+        ids, _ = await self.search()
+        await update_description(self.photos[0].id, PhotoModel(description="night"), self.owner, self.db)
+        self.assertEqual(len((await self.search())[0]), len(ids) - 1)
+        await upload_photo(self.owner.id, "https://example.com/new.jpg", "sunset again", [], self.db)
+        self.assertEqual(len((await self.search())[0]), len(ids))
+
+    async def test_rating_writes_only_affect_rating_order(self):
+        await self.search(filter_by="rating")
+        await self.search(filter_by="created_at")
+        await create_rating(
+            self.photos[0], PhotoRatingModel(photo_id=self.photos[0].id, rating=5), self.voter, self.db
+        )
+        ids, statements = await self.search(filter_by="rating")
+        self.assertTrue(any("MATCH" in statement for statement in statements))
+        self.assertEqual(ids[-1], self.photos[0].id)
+        _, statements = await self.search(filter_by="created_at")
+        self.assertFalse(any("MATCH" in statement for statement in statements))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+
+from sqlalchemy import exc
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src.database.pool import InstrumentedPool, PoolStats, pool_stats, pool_status
+
+
+class TestPoolStats(unittest.TestCase):
+    def test_histogram_is_cumulative(self):
+        stats = PoolStats(buckets=(0.01, 0.1))
+        stats.observe_wait(0.005)
+        stats.observe_wait(0.05)
+        stats.observe_wait(3)
+        self.assertEqual(stats.histogram(), {"0.01": 1, "0.1": 2, "+Inf": 3})
+        self.assertEqual(stats.wait_count, 3)
+        self.assertEqual(stats.wait_max, 3)
+
+
+class TestInstrumentedPool(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        pool_stats.reset()
+        self.engine = create_async_engine(
+            "sqlite+aiosqlite://",
+            poolclass=InstrumentedPool,
+            pool_size=1,
+            max_overflow=0,
+            pool_timeout=0.05,
+        )
+
+    async def asyncTearDown(self):
+        await self.engine.dispose()
+
+    async def test_checkout_and_timeout_are_counted(self):
+        async with self.engine.connect():
+            status = pool_status(self.engine.sync_engine.pool)
+            self.assertEqual(status["checkedout"], 1)
+            with self.assertRaises(exc.TimeoutError):
+                async with self.engine.connect():
+                    pass
+        status = pool_status(self.engine.sync_engine.pool)
+        self.assertEqual(status["checkedout"], 0)
+        self.assertEqual(status["waits"], 1)
+        self.assertEqual(status["timeouts"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
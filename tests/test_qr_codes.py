@@ -0,0 +1,102 @@
+import io
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from PIL import Image
+from sqlalchemy import select
+
+from src.database.models import Photo, Role, User
+from src.repository.photos import create_qr_code, generate_qr_codes
+from src.services.qr import QRCodes, render_qr_png
+from src.services.storage import LocalStorage
+from tests.memory_db import MemoryDBTestCase
+
+URL = "https://example.com/photo_share_team4/abc"
+
+
+class TestQRCodes(MemoryDBTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.db.add(User(user_name="admin", email="admin@example.com", password="x", roles=Role.admin))
+        await self.db.commit()
+        self.user = await self.db.scalar(select(User))
+        self.db.add_all(
+            Photo(photo=f"{URL}/{i}", description=f"photo {i}", user_id=self.user.id)
+            for i in range(5)
+        )
+        await self.db.commit()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.storage = LocalStorage(self.tmp.name, "/static/uploads")
+        self.codes = QRCodes(box_size=4, border=2, local_size=16, prefix="qrcode")
+        self.patch(
+            patch("src.services.qr.storage", self.storage),
+            patch("src.repository.photos.qr_codes", self.codes),
+            patch("src.routes.photos.qr_codes", self.codes),
+        )
+        self.client = await self.api_client("admin@example.com")
+
+    def test_render_qr_png(self):
+        image = Image.open(io.BytesIO(render_qr_png(URL, 4, 2)))
+        self.assertEqual(image.mode, "1")
+        # version 3 is 29 modules wide, plus the border on both sides
+        self.assertEqual(image.size, ((29 + 4) * 4, (29 + 4) * 4))
+        # quiet zone is light, the finder pattern corner dark
+        self.assertEqual(image.getpixel((0, 0)), 255)
+        self.assertEqual(image.getpixel((8, 8)), 0)
+
+    async def test_codes_are_cached_by_url(self):
+        png = await self.codes.png(URL)
+        self.assertEqual(await self.codes.png(URL), png)
+        self.assertEqual(self.codes.rendered, 1)
+        self.assertNotEqual(await self.codes.png(URL + "/other"), png)
+        self.assertNotEqual(
+            self.codes.digest(URL), QRCodes(10, 4, 16, "qrcode").digest(URL)
+        )
+
+    async def test_create_qr_code_stores_once(self):
+        async with self.SessionLocal() as db:
+            photo = await create_qr_code(1, URL, self.user, db)
+            self.assertEqual(photo.qr_code, f"/static/uploads/qrcode/{self.codes.digest(URL)}")
+            path = Path(self.tmp.name) / "qrcode" / self.codes.digest(URL)
+            self.assertEqual(path.read_bytes(), await self.codes.png(URL))
+            with patch.object(self.storage, "put_once") as put_once:
+                await create_qr_code(2, URL, self.user, db)
+            put_once.assert_not_called()
+
+    async def test_png_endpoint(self):
+        response = await self.client.get("/api/photos/1/qr.png")
+        self.assertEqual(response.status_code, 200, response.text)
+        self.assertEqual(response.headers["content-type"], "image/png")
+        self.assertIn("immutable", response.headers["cache-control"])
+        self.assertEqual(response.content, await self.codes.png(f"{URL}/0"))
+
+        etag = response.headers["etag"]
+        response = await self.client.get("/api/photos/1/qr.png", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.codes.rendered, 1)
+        self.assertEqual(list(Path(self.tmp.name).iterdir()), [])
+
+        response = await self.client.get("/api/photos/99/qr.png")
+        self.assertEqual(response.status_code, 404)
+
+    async def test_admin_batch(self):
+        response = await self.client.post("/api/admin/qr_codes/generate", json={"photo_ids": [1, 2]})
+        self.assertEqual(response.json(), {"generated": 2})
+        response = await self.client.post("/api/admin/qr_codes/generate", json={"limit": 2})
+        self.assertEqual(response.json(), {"generated": 2})
+
+        async with self.SessionLocal() as db:
+            self.assertEqual(await generate_qr_codes(None, 10, db), 1)
+            self.assertEqual(await generate_qr_codes(None, 10, db), 0)
+            self.assertEqual(await generate_qr_codes([1, 5], 10, db), 0)
+            photos = (await db.scalars(select(Photo).order_by(Photo.id))).all()
+        for photo in photos:
+            self.assertEqual(photo.qr_code, self.storage.url(f"qrcode/{self.codes.digest(photo.photo)}"))
+        self.assertEqual(len(list((Path(self.tmp.name) / "qrcode").iterdir())), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import re
+import unittest
+
+from src.database.models import Comment, Photo, PhotoRating, Role, Tag, User
+from src.repository import comments as repository_comments
+from src.repository import photos as repository_photos
+from src.repository import rating as repository_rating
+from src.repository import tags as repository_tags
+from src.repository import users as repository_users
+from src.repository import user_stats as repository_user_stats
+from src.schemas.photos import PhotoModel
+from tests.memory_db import MemoryDBTestCase
+from tests.query_counter import QueryCounter
+
+# "SCAN photos" without "USING ..." is a full table scan
+FULL_SCAN = re.compile(r"^SCAN (\w+)$")
+
+
+class TestRepositoryQueryPlans(MemoryDBTestCase):
+    """
+    Runs each lookup of the repository layer against SQLite, then asks
+    EXPLAIN QUERY PLAN for every statement it sent and fails on any
+    full table scan.
+    """
+
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.user = User(
+            user_name="owner", email="owner@example.com", password="x", roles=Role.user
+        )
+        voter = User(user_name="voter", email="voter@example.com", password="x")
+        self.photo = Photo(
+            photo="https://example.com/1.jpg",
+            description="sunset over the sea",
+            user=self.user,
+            tags=[Tag(tag_name="sunset")],
+        )
+        self.db.add_all([self.photo, voter])
+        await self.db.flush()
+        self.comment = Comment(comment="nice", photo_id=self.photo.id, user_id=voter.id)
+        self.rating = PhotoRating(photo_id=self.photo.id, user_id=voter.id, rating=5)
+        self.db.add_all([self.comment, self.rating])
+        await self.db.commit()
+
+    async def assert_uses_indexes(self, call):
+        with QueryCounter(self.engine) as counter:
+            await call()
+        self.assertTrue(counter.queries)
+        async with self.engine.connect() as conn:
+            for statement, parameters in counter.queries:
+                if not statement.lstrip().upper().startswith("SELECT"):
+                    continue
+                plan = await conn.exec_driver_sql(
+                    f"EXPLAIN QUERY PLAN {statement}", parameters
+                )
+                for row in plan:
+                    self.assertNotRegex(row.detail, FULL_SCAN, statement)
+
+    async def test_photo_lookups(self):
+        db, photo_id = self.db, self.photo.id
+        await self.assert_uses_indexes(lambda: repository_photos.get_photo(photo_id, db))
+        await self.assert_uses_indexes(lambda: repository_photos.get_photos_page(10, None, db))
+        await self.assert_uses_indexes(lambda: repository_photos.get_all_photos(10, 10, db))
+        await self.assert_uses_indexes(
+            lambda: repository_photos.update_description(
+                photo_id, PhotoModel(description="sunrise"), self.user, db
+            )
+        )
+
+    async def test_photo_searches(self):
+        for filter_by in (None, "rating", "created_at"):
+            await self.assert_uses_indexes(
+                lambda: repository_photos.search_photo_by_keyword("sun*", filter_by, self.db)
+            )
+            await self.assert_uses_indexes(
+                lambda: repository_photos.search_photo_by_tag("sunset", filter_by, self.db)
+            )
+
+    async def test_tag_lookup(self):
+        await self.assert_uses_indexes(
+            lambda: repository_tags.create_tags_for_photo(["sunset"], self.db)
+        )
+
+    async def test_comment_and_rating_lookups(self):
+        db = self.db
+        await self.assert_uses_indexes(
+            lambda: repository_comments.get_comment(self.comment.id, db)
+        )
+        await self.assert_uses_indexes(
+            lambda: repository_rating.get_rating_by_id(self.rating.id, db)
+        )
+        await self.assert_uses_indexes(
+            lambda: repository_rating.update_avg_photo_rating(self.photo, db)
+        )
+
+    async def test_user_lookups(self):
+        db = self.db
+        await self.assert_uses_indexes(
+            lambda: repository_users.get_user_by_email("owner@example.com", db)
+        )
+        await self.assert_uses_indexes(lambda: repository_users.get_user_profile("owner", db))
+        await self.assert_uses_indexes(
+            lambda: repository_user_stats.get_user_stats(self.user.id, db)
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
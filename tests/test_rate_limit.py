@@ -0,0 +1,154 @@
+import time
+import unittest
+from types import SimpleNamespace
+
+import httpx
+from fastapi import Depends, FastAPI, Request
+from redis.exceptions import ConnectionError
+
+from src.services.auth import auth_service
+from src.services.rate_limit import RateLimitEngine, RateLimiter, Rule
+
+
+class FakeScript:
+    """TOKEN_BUCKET_LUA in Python, against a dict."""
+
+    def __init__(self, redis_db):
+        self.redis_db = redis_db
+        self.registered_client = redis_db
+
+    async def __call__(self, keys, args):
+        self.redis_db.calls += 1
+        if self.redis_db.down:
+            raise ConnectionError("down")
+        capacity, rate, spent, want = args
+        now = time.monotonic()
+        tokens, ts = self.redis_db.data.get(keys[0], (capacity, now))
+        tokens = min(capacity, tokens + max(0, now - ts) * rate) - spent
+        allowed = 0
+        if tokens >= want:
+            tokens -= want
+            allowed = 1
+        tokens = max(tokens, -capacity)
+        self.redis_db.data[keys[0]] = (tokens, now)
+        return [allowed, str(tokens)]
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+        self.calls = 0
+        self.down = False
+
+    def register_script(self, script):
+        return FakeScript(self)
+
+
+def engine(redis_db=None, backend="redis", local_share=0.5, sync_interval=60.0):
+    return RateLimitEngine(
+        redis_db, backend=backend, local_size=64, local_share=local_share, sync_interval=sync_interval
+    )
+
+
+class TestRateLimitEngine(unittest.IsolatedAsyncioTestCase):
+    async def test_local_bucket(self):
+        limiter = engine(backend="local")
+        rule = Rule(2, 5)
+        self.assertTrue((await limiter.hit("a", rule)).allowed)
+        self.assertTrue((await limiter.hit("a", rule)).allowed)
+        denied = await limiter.hit("a", rule)
+        self.assertFalse(denied.allowed)
+        self.assertEqual(denied.headers["Retry-After"], "3")
+        self.assertTrue((await limiter.hit("b", rule)).allowed)
+
+    async def test_off(self):
+        self.assertIsNone(await engine(backend="off").hit("a", Rule(1, 5)))
+
+    async def test_redis_only_near_the_limit(self):
+        redis_db = FakeRedis()
+        limiter = engine(redis_db)
+        rule = Rule(10, 60)
+        decisions = [await limiter.hit("a", rule) for _ in range(12)]
+        self.assertEqual([d.allowed for d in decisions], [True] * 10 + [False] * 2)
+        # five grants while the bucket is more than half full, then one call each
+        self.assertEqual(redis_db.calls, 7)
+        self.assertEqual(limiter.stats()["local_hits"], 5)
+        self.assertEqual(decisions[4].headers["RateLimit-Remaining"], "5")
+        self.assertEqual(decisions[4].headers["RateLimit-Policy"], "10;w=60")
+
+    async def test_workers_share_the_bucket(self):
+        redis_db = FakeRedis()
+        workers = [engine(redis_db), engine(redis_db)]
+        rule = Rule(10, 60)
+        allowed = 0
+        for _ in range(10):
+            for limiter in workers:
+                allowed += (await limiter.hit("a", rule)).allowed
+        # each worker may overshoot by its locally granted share at most
+        self.assertLessEqual(allowed, 10 + 5)
+        self.assertGreaterEqual(allowed, 10)
+
+    async def test_background_sync_charges_local_grants(self):
+        redis_db = FakeRedis()
+        limiter = engine(redis_db, sync_interval=0.0)
+        rule = Rule(10, 60)
+        await limiter.hit("a", rule)
+        await limiter.hit("a", rule)
+        for task in list(limiter._tasks):
+            await task
+        tokens, _ = redis_db.data["rl:a"]
+        self.assertAlmostEqual(tokens, 8, places=2)
+
+    async def test_falls_back_to_local_buckets_when_redis_fails(self):
+        redis_db = FakeRedis()
+        redis_db.down = True
+        limiter = engine(redis_db, local_share=1.0)
+        rule = Rule(2, 5)
+        self.assertTrue((await limiter.hit("a", rule)).allowed)
+        self.assertEqual(limiter.redis_errors, 1)
+        self.assertTrue((await limiter.hit("a", rule)).allowed)
+        self.assertFalse((await limiter.hit("a", rule)).allowed)
+        self.assertEqual(redis_db.calls, 1)
+
+
+class TestRateLimiterDependency(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.app = FastAPI()
+        limiter = RateLimiter(times=2, seconds=5, engine=engine(backend="local"))
+
+        @self.app.get("/probe/{item}", dependencies=[Depends(limiter)])
+        async def probe(item: int):
+            return {"item": item}
+
+        def principal(request: Request):
+            user_id = request.headers.get("X-User")
+            return SimpleNamespace(id=int(user_id)) if user_id else None
+
+        self.app.dependency_overrides[auth_service.get_optional_user] = principal
+        self.client = httpx.AsyncClient(app=self.app, base_url="http://test")
+
+    async def asyncTearDown(self):
+        await self.client.aclose()
+
+    async def test_headers_and_429(self):
+        first = await self.client.get("/probe/1")
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.headers["RateLimit-Limit"], "2")
+        self.assertEqual(first.headers["RateLimit-Remaining"], "1")
+        # one rule per route, not per concrete path
+        await self.client.get("/probe/2")
+        denied = await self.client.get("/probe/3")
+        self.assertEqual(denied.status_code, 429)
+        self.assertEqual(denied.headers["RateLimit-Remaining"], "0")
+        self.assertIn("Retry-After", denied.headers)
+
+    async def test_users_have_their_own_buckets(self):
+        for _ in range(2):
+            self.assertEqual((await self.client.get("/probe/1", headers={"X-User": "1"})).status_code, 200)
+        self.assertEqual((await self.client.get("/probe/1", headers={"X-User": "1"})).status_code, 429)
+        self.assertEqual((await self.client.get("/probe/1", headers={"X-User": "2"})).status_code, 200)
+        self.assertEqual((await self.client.get("/probe/1")).status_code, 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,156 @@
+import io
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from PIL import Image
+from sqlalchemy import select
+
+from src.conf.config import settings
+from src.database.models import Photo, PhotoRendition, Role, User
+from src.repository.photos import upload_photo
+from src.repository.renditions import (
+    claim_renditions,
+    enqueue_renditions,
+    finish_rendition,
+    parse_sizes,
+    retry_failed_renditions,
+)
+from src.schemas.photos import PhotoDb
+from src.services.renditions import RenditionWorker
+from src.services.storage import LocalStorage
+from src.services.uploads import UploadExecutor, upload_executor
+from tests.memory_db import MemoryDBTestCase
+
+
+class TestRenditions(MemoryDBTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        owner = User(user_name="owner", email="owner@example.com", password="x", roles=Role.user)
+        self.db.add(owner)
+        await self.db.commit()
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.storage = LocalStorage(self.tmp.name, "/static/uploads")
+        image = io.BytesIO()
+        Image.new("RGB", (120, 80), (200, 30, 30)).save(image, "PNG")
+        image.seek(0)
+        self.key = self.storage.store(image, "photos")
+
+        self.patch(
+            patch.object(settings, "rendition_sizes", "thumb:16x16:fill,full:64x64:limit"),
+            patch.object(settings, "rendition_formats", "png,jpg"),
+            patch("src.services.renditions.storage", self.storage),
+        )
+
+        self.photo = await upload_photo(
+            owner.id, self.storage.url(self.key), "red", [], self.db, source_key=self.key
+        )
+        self.executor = UploadExecutor(max_workers=2, max_queue=3, retry_after=1)
+        self.addCleanup(self.executor.shutdown)
+        self.worker = self.make_worker()
+
+    def make_worker(self, lease=300, max_attempts=3):
+        return RenditionWorker(
+            self.SessionLocal,
+            self.executor,
+            batch_size=3,
+            poll_interval=60,
+            lease=lease,
+            max_attempts=max_attempts,
+        )
+
+    async def renditions(self):
+        result = await self.db.execute(select(PhotoRendition).order_by(PhotoRendition.id))
+        return result.scalars().all()
+
+    async def photo_renditions(self):
+        return await self.db.scalar(select(Photo.renditions).where(Photo.id == self.photo.id))
+
+    def test_parse_sizes(self):
+        self.assertEqual(
+            parse_sizes("thumb:160x160:fill, full:1600x1200:limit"),
+            [("thumb", 160, 160, "fill"), ("full", 1600, 1200, "limit")],
+        )
+
+    async def test_enqueued_with_the_photo_once(self):
+        rows = await self.renditions()
+        self.assertEqual(len(rows), 4)
+        self.assertEqual({row.status for row in rows}, {"pending"})
+        await enqueue_renditions(self.photo.id, self.key, None, False, self.db)
+        await self.db.commit()
+        self.assertEqual(len(await self.renditions()), 4)
+
+    async def test_worker_renders_all_in_batches(self):
+        self.assertEqual(await self.worker.run_once(), 3)
+        self.assertEqual(await self.worker.run_once(), 1)
+        self.assertEqual(await self.worker.run_once(), 0)
+        self.assertEqual(self.worker.rendered, 4)
+
+        renditions = await self.photo_renditions()
+        self.assertEqual(
+            [(r["name"], r["format"], r["width"], r["height"]) for r in renditions],
+            [("thumb", "jpg", 16, 16), ("thumb", "png", 16, 16), ("full", "jpg", 64, 43), ("full", "png", 64, 43)],
+        )
+        for rendition in renditions:
+            path = Path(self.tmp.name) / rendition["url"].removeprefix("/static/uploads/")
+            self.assertEqual(Image.open(path).size, (rendition["width"], rendition["height"]))
+
+        await self.db.refresh(self.photo, ["tags", "renditions"])
+        self.assertEqual(PhotoDb.from_orm(self.photo).renditions[0].name, "thumb")
+
+    async def test_expired_claim_is_taken_over(self):
+        # a worker claims a batch and dies before recording it
+        async with self.SessionLocal() as db:
+            abandoned = await claim_renditions(4, lease=300, max_attempts=3, db=db)
+        self.assertEqual(await self.make_worker(lease=300).run_once(), 0)
+
+        self.assertEqual(await self.make_worker(lease=0).run_once(), 3)
+        async with self.SessionLocal() as db:
+            # the late result of the dead worker is ignored
+            self.assertFalse(await finish_rendition(abandoned[0], "/stale", 1, 1, db))
+        rows = await self.renditions()
+        self.assertEqual([row.attempts for row in rows], [2, 2, 2, 1])
+        self.assertNotEqual(rows[0].url, "/stale")
+
+    async def test_expired_claims_count_as_attempts(self):
+        # every worker claiming these dies before recording them
+        for _ in range(2):
+            async with self.SessionLocal() as db:
+                self.assertEqual(len(await claim_renditions(4, lease=0, max_attempts=2, db=db)), 4)
+        async with self.SessionLocal() as db:
+            self.assertEqual(await claim_renditions(4, lease=0, max_attempts=2, db=db), [])
+        self.assertEqual({row.status for row in await self.renditions()}, {"failed"})
+
+    async def test_busy_upload_pool_does_not_fail_renditions(self):
+        # user uploads fill the shared pool, the worker renders on its own
+        full = upload_executor.max_workers + upload_executor.max_queue
+        with patch.object(upload_executor, "pending", full):
+            while await self.worker.run_once():
+                pass
+        self.assertEqual({row.status for row in await self.renditions()}, {"ready"})
+        self.assertEqual(self.worker.failed, 0)
+
+    async def test_failures_are_retried_then_given_up(self):
+        worker = self.make_worker(max_attempts=2)
+        with patch.object(self.storage, "render", side_effect=OSError("disk full")):
+            await worker.run_once()
+            self.assertEqual({row.status for row in await self.renditions()}, {"pending"})
+            await worker.run_once()
+            await worker.run_once()
+            await worker.run_once()
+        rows = await self.renditions()
+        self.assertEqual({row.status for row in rows}, {"failed"})
+        self.assertEqual(await self.photo_renditions(), None)
+
+        async with self.SessionLocal() as db:
+            self.assertEqual(await retry_failed_renditions(db), 4)
+        while await worker.run_once():
+            pass
+        self.assertEqual(len(await self.photo_renditions()), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,6 @@
 import unittest
 from unittest.mock import MagicMock
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from src.database.models import Comment, User
 from src.schemas.comments import CommentDb, CommentModel, CommentResponseModel, EditCommentModel
 
@@ -15,7 +15,8 @@ from src.repository.comments import (
 class TestComments(unittest.IsolatedAsyncioTestCase):
 
     def setUp(self):
-        self.session = MagicMock(spec=Session)
+        self.session = MagicMock(spec=AsyncSession)
+        self.session.execute.return_value = MagicMock()
         self.user = User(id=1)
 
     async def test_create_comment(self):
@@ -30,31 +31,31 @@ class TestComments(unittest.IsolatedAsyncioTestCase):
 
     async def test_get_comment_found(self):
         comment = Comment()
-        self.session.query().filter().first.return_value = comment
+        self.session.execute.return_value.scalars().first.return_value = comment
         result = await get_comment(comment_id=1, db=self.session)
         self.assertEqual(result, comment)
 
     async def test_get_comment_not_found(self):
-        self.session.query().filter().first.return_value = None
+        self.session.execute.return_value.scalars().first.return_value = None
         result = await get_comment(comment_id=1, db=self.session)
         self.assertIsNone(result)
 
     async def test_remove_comment_not_found(self):
-        self.session.query().filter().first.return_value = None
+        self.session.execute.return_value.scalars().first.return_value = None
         result = await remove_comment(comment_id=1, db=self.session)
         self.assertIsNone(result)
 
     async def test_update_comment(self):
         body = EditCommentModel(comment_id=1, edited_comment="test")
         comment = Comment()
-        self.session.query().filter().first.return_value = comment
+        self.session.execute.return_value.scalars().first.return_value = comment
         self.session.commit.return_value = None
         result = await update_comment(body=body, db=self.session)
         self.assertEqual(result, comment)
 
     async def test_update_comment_not_found(self):
         body = EditCommentModel(comment_id=1, edited_comment="test")
-        self.session.query().filter().first.return_value = None
+        self.session.execute.return_value.scalars().first.return_value = None
         self.session.commit.return_value = None
         result = await update_comment(body=body, db=self.session)
         self.assertIsNone(result)
@@ -1,7 +1,8 @@
 import unittest
 from unittest.mock import MagicMock
 from typing import List
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import HTTPException
 from datetime import datetime
 from src.database.models import Photo, User, Role, Tag
 from src.repository import tags as repository_tags
@@ -9,6 +10,9 @@ from src.schemas.photos import DescriptionUpdate, PhotoDb, TagResponse, PhotoSea
 
 from src.repository.photos import (
     get_all_photos,
+    get_photos_page,
+    encode_cursor,
+    decode_cursor,
     get_photo,
     remove_photo,
     update_description,
@@ -22,53 +26,74 @@ from src.repository.photos import (
 class TestPhotos(unittest.IsolatedAsyncioTestCase):
 
     def setUp(self):
-        self.session = MagicMock(spec=Session)
+        self.session = MagicMock(spec=AsyncSession)
+        self.session.execute.return_value = MagicMock()
         self.user = User(id=1)
 
     async def test_get_all_photos(self):
         photos = [Photo()]
-        self.session.query().offset().limit().all = photos
+        self.session.execute.return_value.scalars().all.return_value = photos
         result = await get_all_photos(offset=0, limit=1, db=self.session)
-        self.assertTrue(hasattr(result, "id"))
+        self.assertEqual(result, photos)
+
+    async def test_get_photos_page_has_next(self):
+        photos = [Photo(id=i, created_at=datetime(2023, 5, 20, 12, i)) for i in (3, 2, 1)]
+        self.session.execute.return_value.scalars().all.return_value = photos
+        result, next_cursor = await get_photos_page(limit=2, cursor=None, db=self.session)
+        self.assertEqual(result, photos[:2])
+        self.assertEqual(decode_cursor(next_cursor), (photos[1].created_at, photos[1].id))
+
+    async def test_get_photos_page_last(self):
+        photos = [Photo(id=1, created_at=datetime(2023, 5, 20))]
+        self.session.execute.return_value.scalars().all.return_value = photos
+        cursor = encode_cursor(Photo(id=2, created_at=datetime(2023, 5, 21)))
+        result, next_cursor = await get_photos_page(limit=2, cursor=cursor, db=self.session)
+        self.assertEqual(result, photos)
+        self.assertIsNone(next_cursor)
+
+    async def test_get_photos_page_invalid_cursor(self):
+        with self.assertRaises(HTTPException):
+            await get_photos_page(limit=2, cursor="not-a-cursor", db=self.session)
 
     async def test_upload_photo(self):
+        self.session.execute.return_value.all.return_value = [("test", 1)]
         result = await upload_photo(user_id=int, src_url='test', description='test', tags=['test'], db=self.session)
         self.assertTrue(hasattr(result, "id"))
 
     async def test_get_photo_found(self):
         photo = Photo()
-        self.session.query().filter().first.return_value = photo
+        self.session.execute.return_value.scalars().first.return_value = photo
         result = await get_photo(photo_id=1, db=self.session)
         self.assertEqual(result, photo)
 
     async def test_get_photo_not_found(self):
-        self.session.query().filter().first.return_value = None
+        self.session.execute.return_value.scalars().first.return_value = None
         result = await get_photo(photo_id=1, db=self.session)
         self.assertIsNone(result)
 
     async def test_remove_photo_found(self):
-        photo = Photo()
-        self.session.query().filter().first.return_value = photo
+        photo = Photo(id=1, user_id=1, rating_count=0, rating_sum=0)
+        self.session.execute.return_value.scalars().first.return_value = photo
         result = await remove_photo(photo_id=1, user=self.user, db=self.session)
         self.assertEqual(result, photo)
 
     async def test_remove_photo_found_admin(self):
-        photo = Photo()
+        photo = Photo(id=1, user_id=2, rating_count=2, rating_sum=7)
         user = User(id=1, user_name='string', email='user@email.com', password='string', roles=Role.admin)
-        self.session.query().filter().first.return_value = photo
+        self.session.execute.return_value.scalars().first.return_value = photo
         result = await remove_photo(photo_id=1, user=user, db=self.session)
         self.assertEqual(result, photo)
 
 
     async def test_remove_photo_not_found(self):
-        self.session.query().filter().first.return_value = None
+        self.session.execute.return_value.scalars().first.return_value = None
         result = await remove_photo(photo_id=1, user=self.user, db=self.session)
         self.assertIsNone(result)
 
     async def test_update_description(self):
         body = PhotoDb(id=1, photo="test", description="test surname", tags=[Tag(id=1, tag_name='test')], qr_code="test" )
         photo = Photo()
-        self.session.query().filter().first.return_value = photo
+        self.session.execute.return_value.scalars().first.return_value = photo
         self.session.commit.return_value = None
         result = await update_description(photo_id=1, body=body, user=self.user, db=self.session)
         self.assertEqual(result, photo)
@@ -77,14 +102,14 @@ class TestPhotos(unittest.IsolatedAsyncioTestCase):
         body = PhotoDb(id=1, photo="test", description="test surname", tags=[Tag(id=1, tag_name='test')], qr_code="test" )
         user = User(id=1, user_name='string', email='user@email.com', password='string', roles=Role.admin)
         photo = Photo()
-        self.session.query().filter().first.return_value = photo
+        self.session.execute.return_value.scalars().first.return_value = photo
         self.session.commit.return_value = None
         result = await update_description(photo_id=1, body=body, user=user, db=self.session)
         self.assertEqual(result, photo)
 
     async def test_update_description_not_found(self):
         body = PhotoDb(id=1, photo="test", description="test surname", tags=[Tag(id=1, tag_name='test')], qr_code="test" )
-        self.session.query().filter().first.return_value = None
+        self.session.execute.return_value.scalars().first.return_value = None
         self.session.commit.return_value = None
         result = await update_description(photo_id=1, body=body, user=self.user, db=self.session)
         self.assertIsNone(result)
@@ -1,6 +1,7 @@
 import unittest
 from unittest.mock import MagicMock
-from sqlalchemy.orm import Session
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
 from src.database.models import PhotoRating, Photo, User
 from src.schemas.rating import PhotoRatingModel
 
@@ -9,48 +10,61 @@ from src.repository.rating import (
     update_avg_photo_rating,
     get_rating_by_id,
     remove_rating,
-    get_rating
+    get_rating,
+    rebuild_rating_aggregates,
 )
+from tests.memory_db import MemoryDBTestCase
 
 
 class TestRating(unittest.IsolatedAsyncioTestCase):
 
     def setUp(self) -> None:
-        self.session = MagicMock(spec=Session)
+        self.session = MagicMock(spec=AsyncSession)
+        self.session.execute.return_value = MagicMock()
         self.user = User(id=1)
-        self.photo = Photo(id=1, rated_by=[])
+        self.photo = Photo(id=1)
 
     async def test_create_rating(self):
         body = PhotoRatingModel(photo_id=self.photo.id, rating=5)
+        self.session.execute.return_value.scalars().first.return_value = PhotoRating(
+            id=1, photo_id=self.photo.id, user_id=self.user.id, rating=5
+        )
         result = await create_rating(photo=self.photo, body=body, user=self.user, db=self.session)
         self.assertEqual(result.photo_id, body.photo_id)
         self.assertEqual(result.rating, body.rating)
 
+    async def test_create_rating_already_rated(self):
+        body = PhotoRatingModel(photo_id=self.photo.id, rating=5)
+        self.session.execute.return_value.scalars().first.return_value = None
+        result = await create_rating(photo=self.photo, body=body, user=self.user, db=self.session)
+        self.assertIsNone(result)
+        self.session.commit.assert_not_called()
+
     async def test_get_rating(self):
         ratings = [PhotoRating(), PhotoRating(), PhotoRating()]
-        self.session.query(PhotoRating).limit().offset().all.return_value = ratings
+        self.session.execute.return_value.scalars().all.return_value = ratings
         result = await get_rating(10, 0, self.session)
         self.assertEqual(result, ratings)
 
     async def test_get_rating_by_id_found(self):
         rating = PhotoRating()
-        self.session.query(PhotoRating).filter_by().first.return_value = rating
+        self.session.execute.return_value.scalars().first.return_value = rating
         result = await get_rating_by_id(1, self.session)
         self.assertEqual(result, rating)
 
     async def test_get_rating_by_id_not_found(self):
-        self.session.query(PhotoRating).filter_by().first.return_value = None
+        self.session.execute.return_value.scalars().first.return_value = None
         result = await get_rating_by_id(1, self.session)
         self.assertIsNone(result)
 
     async def test_remove_rating_found(self):
-        rating = PhotoRating()
-        self.session.query(PhotoRating).filter_by().first.return_value = rating
+        rating = PhotoRating(id=1, photo_id=1, rating=4)
+        self.session.execute.return_value.scalars().first.return_value = rating
         result = await remove_rating(1, self.session)
         self.assertEqual(result, rating)
 
     async def test_remove_rating_not_found(self):
-        self.session.query(PhotoRating).filter_by().first.return_value = None
+        self.session.execute.return_value.scalars().first.return_value = None
         result = await remove_rating(1, self.session)
         self.assertIsNone(result)
 
@@ -58,3 +72,56 @@ class TestRating(unittest.IsolatedAsyncioTestCase):
         photo = Photo()
         result = await update_avg_photo_rating(photo, self.session)
         self.assertEqual(result, photo)
+
+
+class TestRatingAggregates(MemoryDBTestCase):
+
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        owner = User(user_name="owner", email="owner@example.com", password="x")
+        self.voters = [
+            User(user_name=f"voter{n}", email=f"voter{n}@example.com", password="x")
+            for n in range(3)
+        ]
+        self.photo = Photo(photo="https://example.com/1.jpg", user=owner)
+        self.db.add_all([self.photo, *self.voters])
+        await self.db.commit()
+
+    async def rate(self, voter, value):
+        body = PhotoRatingModel(photo_id=self.photo.id, rating=value)
+        return await create_rating(self.photo, body, voter, self.db)
+
+    async def aggregates(self):
+        await self.db.refresh(self.photo)
+        return self.photo.rating_count, self.photo.rating_sum, self.photo.average_rating
+
+    async def test_create_and_remove_update_aggregates(self):
+        await self.rate(self.voters[0], 5)
+        await self.rate(self.voters[1], 4)
+        third = await self.rate(self.voters[2], 2)
+        self.assertEqual(await self.aggregates(), (3, 11, 11 / 3))
+
+        await remove_rating(third.id, self.db)
+        self.assertEqual(await self.aggregates(), (2, 9, 4.5))
+
+    async def test_second_vote_is_rejected(self):
+        await self.rate(self.voters[0], 5)
+        self.assertIsNone(await self.rate(self.voters[0], 1))
+        self.assertEqual(await self.aggregates(), (1, 5, 5.0))
+
+    async def test_removing_last_rating_resets_average(self):
+        rating = await self.rate(self.voters[0], 3)
+        await remove_rating(rating.id, self.db)
+        self.assertEqual(await self.aggregates(), (0, 0, 0.0))
+
+    async def test_rebuild_repairs_drifted_aggregates(self):
+        await self.rate(self.voters[0], 5)
+        await self.rate(self.voters[1], 2)
+        await self.db.execute(
+            update(Photo).values(rating_count=7, rating_sum=1, average_rating=0.1)
+        )
+        await self.db.commit()
+
+        self.assertEqual(await rebuild_rating_aggregates(self.db), 1)
+        self.assertEqual(await self.aggregates(), (2, 7, 3.5))
+        self.assertEqual(await rebuild_rating_aggregates(self.db), 0)
@@ -1,12 +1,14 @@
 import unittest
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 from typing import List
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException
 from datetime import datetime
 from src.database.models import Photo, User, Role, Tag
 from src.repository import tags as repository_tags
 from src.schemas.photos import DescriptionUpdate, PhotoDb, TagResponse, PhotoSearch
+from tests.memory_db import MemoryDBTestCase
+from tests.query_counter import QueryCounter
 
 from src.repository.tags import create_tags_for_photo
 
@@ -14,7 +16,10 @@ from src.repository.tags import create_tags_for_photo
 class TestPhotos(unittest.IsolatedAsyncioTestCase):
 
     def setUp(self):
-        self.session = MagicMock(spec=Session)
+        repository_tags.tag_ids.clear()
+        self.session = MagicMock(spec=AsyncSession)
+        self.session.execute.return_value = MagicMock()
+        self.session.execute.return_value.all.return_value = [("str", 1)]
         self.user = User(id=1)
 
     async def test_create_tags_for_photo(self):
@@ -26,10 +31,72 @@ class TestPhotos(unittest.IsolatedAsyncioTestCase):
             await create_tags_for_photo(tags=['str', 'str', 'str', 'str', 'str', 'str'], db=self.session)
 
     async def test_create_tags_for_photo_not_found(self):
-        self.session.query().filter().first.return_value = None
+        self.session.execute.return_value.all.side_effect = [[], [("str", 1)]]
         result = await create_tags_for_photo(tags=['str', 'str'], db=self.session)
         self.assertIsInstance(result, list)
 
 
+class TestBulkTagUpsert(MemoryDBTestCase):
+
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.db.add_all([Tag(tag_name="sea"), Tag(tag_name="sun")])
+        await self.db.commit()
+
+    async def create(self, names):
+        async with self.SessionLocal() as db:
+            with QueryCounter(self.engine) as counter:
+                tags = await create_tags_for_photo(names, db)
+            await db.commit()
+        return {tag.tag_name: tag.id for tag in tags}, counter.statements
+
+    async def test_one_select_and_one_insert(self):
+        tags, statements = await self.create(["sea", "sun", "sky", "night", "sky"])
+        self.assertEqual(list(tags), ["sea", "sun", "sky", "night"])
+        self.assertEqual(len(statements), 2, statements)
+        self.assertIn("INSERT", statements[1])
+
+    async def test_hot_tags_come_from_cache(self):
+        first, _ = await self.create(["sea", "sun"])
+        second, statements = await self.create(["sea", "sun"])
+        self.assertEqual(first, second)
+        self.assertEqual(statements, [])
+
+    async def test_new_tags_are_cached_only_once_committed(self):
+        async with self.SessionLocal() as db:
+            await create_tags_for_photo(["sky"], db)
+            await db.rollback()
+        self.assertIsNone(repository_tags.tag_ids.get("sky"))
+        tags, _ = await self.create(["sky"])
+        self.assertEqual(len(tags), 1)
+
+    async def test_tag_created_concurrently_is_read_back(self):
+        # another upload commits "sky" between our select and our insert
+        select_ids = repository_tags._select_ids
+        calls = []
+
+        async def racing_select(names, db):
+            calls.append(names)
+            if len(calls) == 1:
+                async with self.SessionLocal() as other:
+                    other.add(Tag(tag_name="sky"))
+                    await other.commit()
+                return {}
+            return await select_ids(names, db)
+
+        with patch("src.repository.tags._select_ids", racing_select):
+            tags, _ = await self.create(["sky"])
+        self.assertEqual(calls, [["sky"], ["sky"]])
+        async with self.SessionLocal() as db:
+            self.assertEqual(tags, await select_ids(["sky"], db))
+
+    async def test_tags_attach_to_photo(self):
+        async with self.SessionLocal() as db:
+            owner = User(user_name="owner", email="owner@example.com", password="x")
+            tags = await create_tags_for_photo(["sea", "sky"], db)
+            db.add(Photo(photo="https://example.com/1.jpg", user=owner, tags=tags))
+            await db.commit()
+
+
 if __name__ == '__main__':
-    unittest.main()
\ No newline at end of file
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+from unittest.mock import patch
+
+import httpx
+from fastapi import Depends, FastAPI
+from jose import jwt
+
+from main import app
+from src.database.models import Photo, Role, User
+from src.services.auth import auth_service
+from src.services.cache import TTLCache
+from src.services.roles import RolesChecker
+from src.services.user_cache import UserCache
+from tests.memory_db import MemoryDBTestCase
+
+
+class TestRequestScopedPrincipal(MemoryDBTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        user = User(user_name="owner", email="owner@example.com", password="x", roles=Role.user)
+        self.photo = Photo(photo="https://example.com/1.jpg", user=user)
+        self.db.add(self.photo)
+        await self.db.commit()
+        self.client = await self.api_client("owner@example.com")
+
+        self.cache = UserCache(None, ttl=900, local_size=16, local_ttl=60)
+        self.start(patch.object(auth_service, "claims_cache", TTLCache(16, 60)))
+        self.start(patch("src.services.auth.user_cache", self.cache))
+        self.decode = self.start(patch("src.services.auth.jwt.decode", wraps=jwt.decode))
+        self.cache_lookup = self.start(patch.object(self.cache, "lookup", wraps=self.cache.lookup))
+
+    def start(self, patcher):
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+    def assertResolvedOnce(self):
+        self.assertEqual(self.decode.call_count, 1)
+        self.assertEqual(self.cache_lookup.call_count, 1)
+
+    async def test_route_with_role_check(self):
+        # remove_photo depends on RolesChecker and on get_current_user itself
+        response = await self.client.delete(f"/api/photos/{self.photo.id}")
+        self.assertEqual(response.status_code, 200, response.text)
+        self.assertResolvedOnce()
+
+    async def test_memoized_even_without_dependency_cache(self):
+        probe = FastAPI()
+        probe.dependency_overrides = app.dependency_overrides
+
+        @probe.get("/", dependencies=[Depends(RolesChecker([Role.user]))])
+        async def whoami(
+            first=Depends(auth_service.get_current_user, use_cache=False),
+            second=Depends(auth_service.get_current_user, use_cache=False),
+        ):
+            return {"same": first is second}
+
+        async with httpx.AsyncClient(app=probe, base_url="http://test") as client:
+            response = await client.get("/", headers=self.client.headers)
+        self.assertEqual(response.json(), {"same": True})
+        self.assertResolvedOnce()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,162 @@
+import unittest
+from unittest.mock import patch
+
+from src.database.models import Photo, Role, User
+from src.repository.photos import update_description, upload_photo
+from src.repository.rating import create_rating
+from src.repository.user_stats import rebuild_user_stats
+from src.schemas.photos import PhotoModel
+from src.schemas.rating import PhotoRatingModel
+from src.services.response_cache import ResponseCache, photo_tag
+from tests.memory_db import MemoryDBTestCase
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args))
+
+    async def execute(self):
+        return [await getattr(self.redis, name)(*args) for name, args in self.calls]
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def mget(self, keys):
+        return [self.data.get(key) for key in keys]
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    async def incr(self, key):
+        self.data[key] = str(int(self.data.get(key, 0)) + 1)
+        return int(self.data[key])
+
+    async def expire(self, key, seconds):
+        return True
+
+
+class TestResponseCache(unittest.IsolatedAsyncioTestCase):
+    async def check_generations(self, cache):
+        entry, generations = await cache.lookup("photo:1", [photo_tag(1)])
+        self.assertIsNone(entry)
+        await cache.store("photo:1", {"etag": '"a"', "body": "{}", "generations": generations}, 60)
+        entry, _ = await cache.lookup("photo:1", [photo_tag(1)])
+        self.assertEqual(entry["etag"], '"a"')
+
+        await cache.invalidate(photo_tag(1))
+        entry, generations = await cache.lookup("photo:1", [photo_tag(1)])
+        self.assertIsNone(entry)
+        self.assertEqual(generations, [1])
+
+    async def test_local_backend(self):
+        await self.check_generations(ResponseCache(None, backend="local", local_size=16))
+
+    async def test_redis_backend(self):
+        await self.check_generations(ResponseCache(FakeRedis(), backend="redis", local_size=16))
+
+    async def test_no_redis_means_no_caching(self):
+        cache = ResponseCache(None, backend="redis", local_size=16)
+        self.assertEqual(await cache.lookup("photo:1", [photo_tag(1)]), (None, None))
+
+    async def test_stale_load_is_not_served(self):
+        # a write that commits while a miss is loading must win
+        cache = ResponseCache(None, backend="local", local_size=16)
+        _, generations = await cache.lookup("photo:1", [photo_tag(1)])
+        await cache.invalidate(photo_tag(1))
+        await cache.store("photo:1", {"etag": '"old"', "body": "{}", "generations": generations}, 60)
+        entry, _ = await cache.lookup("photo:1", [photo_tag(1)])
+        self.assertIsNone(entry)
+
+
+class TestCachedRoutes(MemoryDBTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.owner = User(user_name="owner", email="owner@example.com", password="x")
+        self.voter = User(user_name="voter", email="voter@example.com", password="x", roles=Role.user)
+        self.photo = Photo(photo="https://example.com/1.jpg", description="sea", user=self.owner)
+        self.db.add_all([self.photo, self.voter])
+        await self.db.commit()
+        await rebuild_user_stats(self.db)
+
+        self.cache = ResponseCache(None, backend="local", local_size=64)
+        self.patch(
+            patch("src.repository.photos.response_cache", self.cache),
+            patch("src.repository.rating.response_cache", self.cache),
+            *(
+                patch(f"{route}.cache", self.cache)
+                for route in (
+                    "src.routes.photos.photo_cache",
+                    "src.routes.rating.avg_rating_cache",
+                    "src.routes.users.profile_cache",
+                )
+            ),
+        )
+        self.client = await self.api_client("voter@example.com")
+
+    async def test_photo_hit_304_and_invalidation(self):
+        url = f"/api/photos/{self.photo.id}"
+        first = await self.client.get(url)
+        self.assertEqual(first.headers["X-Cache"], "MISS")
+        second = await self.client.get(url)
+        self.assertEqual(second.headers["X-Cache"], "HIT")
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second.headers["ETag"], first.headers["ETag"])
+
+        not_modified = await self.client.get(url, headers={"If-None-Match": first.headers["ETag"]})
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.content, b"")
+
+        async with self.SessionLocal() as db:
+            await update_description(self.photo.id, PhotoModel(description="sunset"), self.owner, db)
+        third = await self.client.get(url, headers={"If-None-Match": first.headers["ETag"]})
+        self.assertEqual(third.status_code, 200)
+        self.assertEqual(third.headers["X-Cache"], "MISS")
+        self.assertEqual(third.json()["description"], "sunset")
+
+    async def test_rating_write_invalidates_average(self):
+        url = f"/api/rating/{self.photo.id}"
+        self.assertEqual((await self.client.get(url)).json()["avg_rating"], 0.0)
+        self.assertEqual((await self.client.get(url)).headers["X-Cache"], "HIT")
+        async with self.SessionLocal() as db:
+            await create_rating(
+                self.photo, PhotoRatingModel(photo_id=self.photo.id, rating=4), self.voter, db
+            )
+        response = await self.client.get(url)
+        self.assertEqual(response.headers["X-Cache"], "MISS")
+        self.assertEqual(response.json()["avg_rating"], 4.0)
+
+    async def test_upload_invalidates_owner_profile(self):
+        url = "/api/users/profile/owner"
+        self.assertEqual((await self.client.get(url)).json()["photos_published"], 1)
+        self.assertEqual((await self.client.get(url)).headers["X-Cache"], "HIT")
+        async with self.SessionLocal() as db:
+            await upload_photo(self.owner.id, "https://example.com/2.jpg", "x", [], db)
+        response = await self.client.get(url)
+        self.assertEqual(response.headers["X-Cache"], "MISS")
+        self.assertEqual(response.json()["photos_published"], 2)
+
+    async def test_not_found_is_not_cached(self):
+        self.assertEqual((await self.client.get("/api/photos/999")).status_code, 404)
+        self.assertEqual((await self.client.get("/api/photos/999")).status_code, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import hashlib
+import io
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+import urllib3
+
+from src.services.storage import CloudinaryStorage, LocalStorage
+
+
+class NonSeekable(io.RawIOBase):
+    def __init__(self, data: bytes):
+        self._buffer = io.BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        return self._buffer.read(size)
+
+
+class TestLocalStorage(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.storage = LocalStorage(self.tmp.name, "/static/uploads/")
+        self.data = b"image bytes"
+        self.digest = hashlib.sha256(self.data).hexdigest()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_store_keys_by_content_hash(self):
+        key = self.storage.store(io.BytesIO(self.data), "photos")
+        self.assertEqual(key, f"photos/{self.digest}")
+        self.assertEqual((Path(self.tmp.name) / key).read_bytes(), self.data)
+        self.assertEqual(self.storage.url(key, width=500), f"/static/uploads/{key}")
+
+    def test_duplicate_bytes_are_stored_once(self):
+        with patch.object(LocalStorage, "put", wraps=self.storage.put) as put:
+            first = self.storage.store(io.BytesIO(self.data), "photos")
+            second = self.storage.store(io.BytesIO(self.data), "photos")
+        self.assertEqual(first, second)
+        put.assert_called_once()
+
+    def test_known_object_skips_transfer_after_restart(self):
+        self.storage.store(io.BytesIO(self.data), "photos")
+        restarted = LocalStorage(self.tmp.name, "/static/uploads")
+        with patch.object(LocalStorage, "put") as put:
+            restarted.store(io.BytesIO(self.data), "photos")
+        put.assert_not_called()
+
+    def test_non_seekable_stream(self):
+        key = self.storage.store(NonSeekable(self.data), "photos")
+        self.assertEqual(key, f"photos/{self.digest}")
+        self.assertEqual((Path(self.tmp.name) / key).read_bytes(), self.data)
+
+
+class TestCloudinaryExists(unittest.TestCase):
+    def setUp(self):
+        self.storage = CloudinaryStorage()
+        self.storage._http = Mock()
+        self.storage.put = Mock()
+
+    def test_head_on_delivery_url(self):
+        self.storage._http.request.return_value = Mock(status=200)
+        self.assertEqual(self.storage.put_once(io.BytesIO(b"x"), "photos/abc"), "photos/abc")
+        method, url = self.storage._http.request.call_args.args
+        self.assertEqual((method, url), ("HEAD", self.storage.url("photos/abc")))
+        self.storage.put.assert_not_called()
+
+    def test_unknown_means_upload(self):
+        outcomes = [
+            {"return_value": Mock(status=404)},
+            # rate limited, not a reason to fail the upload
+            {"return_value": Mock(status=420)},
+            {"side_effect": urllib3.exceptions.ConnectTimeoutError()},
+        ]
+        for outcome in outcomes:
+            with self.subTest(**outcome):
+                self.storage._http.request = Mock(**outcome)
+                self.storage.put.reset_mock()
+                self.storage.put_once(io.BytesIO(b"x"), "photos/abc")
+                self.storage.put.assert_called_once()
+                self.storage._known_keys.clear()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+import asyncio
+import threading
+import unittest
+
+from fastapi import HTTPException
+
+from src.services.uploads import UploadExecutor
+
+
+class TestUploadExecutor(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.executor = UploadExecutor(max_workers=1, max_queue=1, retry_after=7)
+        self.release = threading.Event()
+
+    def tearDown(self):
+        self.release.set()
+        self.executor.shutdown()
+
+    async def test_submit_runs_off_loop(self):
+        result = await self.executor.submit(threading.current_thread)
+        self.assertNotEqual(result, threading.current_thread())
+
+    async def test_rejects_when_saturated(self):
+        running = [
+            asyncio.create_task(self.executor.submit(self.release.wait))
+            for _ in range(2)
+        ]
+        await asyncio.sleep(0)
+        with self.assertRaises(HTTPException) as ctx:
+            await self.executor.submit(self.release.wait)
+        self.assertEqual(ctx.exception.status_code, 503)
+        self.assertEqual(ctx.exception.headers["Retry-After"], "7")
+        self.release.set()
+        await asyncio.gather(*running)
+        self.assertEqual(self.executor.pending, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,263 @@
+import json
+import unittest
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from fastapi import HTTPException
+from redis.exceptions import ConnectionError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.models import Role, User
+from src.repository.users import change_password
+from src.services.auth import auth_service
+from src.services.cache import TTLCache
+from src.services.user_cache import UserCache
+
+
+class DictRedis:
+    def __init__(self):
+        self.data = {}
+        self.gets = 0
+
+    async def get(self, key):
+        self.gets += 1
+        return self.data.get(key)
+
+    async def mget(self, *keys):
+        self.gets += 1
+        return [self.data.get(key) for key in keys]
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    async def delete(self, key):
+        self.data.pop(key, None)
+
+    def register_script(self, script):
+        return Script(self)
+
+    async def run_script(self, keys, args):
+        # UserCache's store-if-revision script
+        key, revision_key = keys
+        expected, value, _ = args
+        if (self.data.get(revision_key) or "") != expected:
+            return 0
+        self.data[key] = value
+        return 1
+
+
+class Script:
+    def __init__(self, redis_db):
+        self.registered_client = redis_db
+
+    async def __call__(self, keys, args):
+        return await self.registered_client.run_script(keys, args)
+
+
+class DownRedis:
+    def __init__(self):
+        self.calls = 0
+
+    async def _fail(self, *args, **kwargs):
+        self.calls += 1
+        raise ConnectionError("Connection refused")
+
+    get = mget = set = delete = run_script = _fail
+
+    def register_script(self, script):
+        return Script(self)
+
+
+def make_user(**kwargs) -> User:
+    fields = dict(
+        id=1,
+        user_name="deadpool",
+        email="deadpool@example.com",
+        password="hash",
+        refresh_token="refresh",
+        roles=Role.moderator,
+        confirmed=True,
+        ban_status=False,
+        created_at=datetime(2023, 5, 20, 12, 30),
+    )
+    fields.update(kwargs)
+    return User(**fields)
+
+
+async def fill(cache: UserCache, user: User):
+    """What get_current_user does on a miss."""
+    _, revision = await cache.lookup(user.email)
+    return await cache.set(user, revision)
+
+
+class TestTTLCache(unittest.TestCase):
+    def test_lru_eviction_and_counters(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        self.assertEqual(cache.get("a"), 1)
+        cache.set("c", 3)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), 3)
+        self.assertEqual(cache.stats(), {"size": 2, "maxsize": 2, "hits": 2, "misses": 1})
+
+    def test_expiry(self):
+        cache = TTLCache(maxsize=2, ttl=10)
+        with patch("src.services.cache.time.monotonic", return_value=100.0):
+            cache.set("a", 1)
+        with patch("src.services.cache.time.monotonic", return_value=109.0):
+            self.assertEqual(cache.get("a"), 1)
+        with patch("src.services.cache.time.monotonic", return_value=110.0):
+            self.assertIsNone(cache.get("a"))
+        self.assertEqual(len(cache), 0)
+
+
+class TestUserCache(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.redis = DictRedis()
+        self.cache = UserCache(self.redis, ttl=900, local_size=16, local_ttl=60)
+
+    async def test_stores_compact_versioned_principal(self):
+        await fill(self.cache, make_user())
+        raw = self.redis.data[UserCache.key("deadpool@example.com")]
+        self.assertIn(":v", UserCache.key("deadpool@example.com"))
+        self.assertEqual(
+            set(json.loads(raw)),
+            {"id", "email", "user_name", "roles", "confirmed", "ban_status", "password", "created_at"},
+        )
+
+    async def test_redis_tier_round_trip(self):
+        await fill(self.cache, make_user())
+        self.cache.local.clear()
+        principal = await self.cache.get("deadpool@example.com")
+        self.assertEqual(principal.id, 1)
+        self.assertIs(principal.roles, Role.moderator)
+        self.assertEqual(principal.created_at, datetime(2023, 5, 20, 12, 30))
+        self.assertEqual(self.cache.redis_hits, 1)
+
+    async def test_local_tier_only_checks_revision(self):
+        await fill(self.cache, make_user())
+        await self.cache.get("deadpool@example.com")
+        await self.cache.get("deadpool@example.com")
+        # one small GET of the revision each, the principal is not read
+        self.assertEqual(self.cache.redis_hits, 0)
+        self.assertEqual(self.cache.local.hits, 2)
+
+    async def test_invalidation_reaches_other_processes(self):
+        other = UserCache(self.redis, ttl=900, local_size=16, local_ttl=60)
+        await fill(self.cache, make_user())
+        self.assertFalse((await other.get("deadpool@example.com")).ban_status)
+
+        await self.cache.invalidate("deadpool@example.com")
+        await fill(self.cache, make_user(ban_status=True))
+        # the copy in the other process is dropped on its next request
+        self.assertTrue((await other.get("deadpool@example.com")).ban_status)
+
+    async def test_invalidate_clears_both_tiers(self):
+        await fill(self.cache, make_user())
+        await self.cache.invalidate("deadpool@example.com")
+        self.assertIsNone(await self.cache.get("deadpool@example.com"))
+        # the first miss is the one filling the cache
+        self.assertEqual(self.cache.redis_misses, 2)
+
+    async def test_invalidation_during_load_is_not_undone(self):
+        _, revision = await self.cache.lookup("deadpool@example.com")
+        # another process bans the user after our database read
+        other = UserCache(self.redis, ttl=900, local_size=16, local_ttl=60)
+        await other.invalidate("deadpool@example.com")
+        await self.cache.set(make_user(), revision)
+        self.assertNotIn(UserCache.key("deadpool@example.com"), self.redis.data)
+        self.assertIsNone(await self.cache.get("deadpool@example.com"))
+
+    async def test_local_invalidation_during_load_is_not_undone(self):
+        cache = UserCache(None, ttl=900, local_size=16, local_ttl=60)
+        _, revision = await cache.lookup("deadpool@example.com")
+        await cache.invalidate("deadpool@example.com")
+        await cache.set(make_user(), revision)
+        self.assertIsNone(await cache.get("deadpool@example.com"))
+
+    async def test_ban_during_refill_applies_to_next_request(self):
+        banned = False
+        admin_process = UserCache(self.redis, ttl=900, local_size=16, local_ttl=60)
+
+        async def get_user_by_email(email, db):
+            nonlocal banned
+            user = make_user(ban_status=banned)
+            if not banned:
+                # the ban commits and invalidates right after this read
+                banned = True
+                await admin_process.invalidate(email)
+            return user
+
+        with patch.object(auth_service, "ALGORITHM", "HS256"), patch.object(
+            auth_service, "claims_cache", TTLCache(16, 60)
+        ), patch("src.services.auth.user_cache", self.cache), patch(
+            "src.repository.users.get_user_by_email", get_user_by_email
+        ):
+            token = await auth_service.create_access_token({"sub": "deadpool@example.com"})
+            principal = await auth_service.get_current_user(
+                SimpleNamespace(state=SimpleNamespace()), token, db=MagicMock()
+            )
+            self.assertFalse(principal.ban_status)
+            with self.assertRaises(HTTPException) as error:
+                await auth_service.get_current_user(
+                    SimpleNamespace(state=SimpleNamespace()), token, db=MagicMock()
+                )
+        self.assertEqual(error.exception.status_code, 403)
+
+    async def test_principal_is_immutable(self):
+        principal = await fill(self.cache, make_user())
+        with self.assertRaises(TypeError):
+            principal.password = "other"
+
+
+class TestRedisDown(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.redis = DownRedis()
+        self.cache = UserCache(self.redis, ttl=900, local_size=16, local_ttl=60, retry_after=30)
+
+    async def test_errors_degrade_to_misses_and_back_off(self):
+        self.assertIsNone(await self.cache.get("deadpool@example.com"))
+        self.assertIsNone(await self.cache.get("deadpool@example.com"))
+        self.assertEqual(self.redis.calls, 1)
+        self.assertEqual(self.cache.redis_errors, 1)
+        principal = await fill(self.cache, make_user())
+        self.assertEqual(await self.cache.get("deadpool@example.com"), principal)
+        self.assertEqual(self.redis.calls, 1)
+
+    async def test_invalidate_still_tries_redis(self):
+        await self.cache.get("deadpool@example.com")
+        await self.cache.invalidate("deadpool@example.com")
+        self.assertEqual(self.redis.calls, 2)
+
+    async def test_get_current_user_falls_back_to_database(self):
+        user = make_user()
+        with patch.object(auth_service, "ALGORITHM", "HS256"), patch(
+            "src.services.auth.user_cache", self.cache
+        ), patch(
+            "src.repository.users.get_user_by_email", AsyncMock(return_value=user)
+        ) as get_user_by_email:
+            token = await auth_service.create_access_token({"sub": user.email})
+            principal = await auth_service.get_current_user(
+                SimpleNamespace(state=SimpleNamespace()), token, db=MagicMock()
+            )
+        self.assertEqual(principal.id, user.id)
+        get_user_by_email.assert_awaited_once()
+
+
+class TestChangePassword(unittest.IsolatedAsyncioTestCase):
+    async def test_updates_by_id_and_invalidates(self):
+        session = MagicMock(spec=AsyncSession)
+        cache = UserCache(DictRedis(), ttl=900, local_size=16, local_ttl=60)
+        principal = await fill(cache, make_user())
+        with patch("src.repository.users.user_cache", cache):
+            await change_password(principal, "new hash", session)
+        statement = session.execute.call_args.args[0]
+        self.assertEqual(statement.compile().params, {"password": "new hash", "id_1": 1})
+        session.commit.assert_called_once()
+        self.assertIsNone(await cache.get(principal.email))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+
+from sqlalchemy import update
+
+from src.database.models import Role, User, UserStats
+from src.repository.comments import create_comment, remove_comment
+from src.repository.photos import remove_photo, upload_photo
+from src.repository.rating import create_rating, remove_rating
+from src.repository.user_stats import find_stale_user_stats, get_user_stats, rebuild_user_stats
+from src.repository.users import get_user_profile
+from src.schemas.comments import CommentModel
+from src.schemas.rating import PhotoRatingModel
+from tests.memory_db import MemoryDBTestCase
+from tests.query_counter import QueryCounter
+
+
+class TestUserStats(MemoryDBTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.owner = User(user_name="owner", email="owner@example.com", password="x", roles=Role.user)
+        self.voter = User(user_name="voter", email="voter@example.com", password="x", roles=Role.user)
+        self.db.add_all([self.owner, self.voter])
+        await self.db.commit()
+
+    async def rate(self, photo, rating):
+        body = PhotoRatingModel(photo_id=photo.id, rating=rating)
+        return await create_rating(photo, body, self.voter, self.db)
+
+    async def test_write_paths_keep_counters_consistent(self):
+        first = await upload_photo(self.owner.id, "https://example.com/1.jpg", "sea", [], self.db)
+        second = await upload_photo(self.owner.id, "https://example.com/2.jpg", "sun", [], self.db)
+        comment = await create_comment(self.voter.id, CommentModel(comment="nice", photo_id=first.id), self.db)
+        await self.rate(first, 5)
+        rating = await self.rate(second, 2)
+
+        stats = await get_user_stats(self.owner.id, self.db)
+        self.assertEqual((stats.photos_published, stats.ratings_received), (2, 2))
+        self.assertEqual(stats.average_received_rating, 3.5)
+        stats = await get_user_stats(self.voter.id, self.db)
+        self.assertEqual((stats.comments_written, stats.ratings_given), (1, 2))
+        self.assertEqual(await find_stale_user_stats(self.db), [])
+
+        await remove_rating(rating.id, self.db)
+        await remove_comment(comment.id, self.db)
+        await remove_photo(first.id, self.owner, self.db)
+        self.assertEqual(await find_stale_user_stats(self.db), [])
+        stats = await get_user_stats(self.owner.id, self.db)
+        self.assertEqual((stats.photos_published, stats.ratings_received), (1, 0))
+        self.assertEqual(stats.average_received_rating, 0.0)
+
+    async def test_profile_is_one_query(self):
+        photo = await upload_photo(self.owner.id, "https://example.com/1.jpg", "sea", [], self.db)
+        await self.rate(photo, 4)
+        with QueryCounter(self.engine) as counter:
+            profile = await get_user_profile("owner", self.db)
+        self.assertEqual(counter.count, 1, counter.statements)
+        self.assertEqual(profile.photos_published, 1)
+        self.assertEqual(profile.ratings_received, 1)
+        self.assertEqual(profile.average_received_rating, 4.0)
+        self.assertEqual((await get_user_profile("voter", self.db)).ratings_given, 1)
+
+    async def test_user_without_row_reads_zeros(self):
+        profile = await get_user_profile("voter", self.db)
+        self.assertEqual(profile.photos_published, 0)
+        self.assertEqual((await get_user_stats(self.voter.id, self.db)).ratings_given, 0)
+
+    async def test_rebuild_fixes_drifted_counters(self):
+        photo = await upload_photo(self.owner.id, "https://example.com/1.jpg", "sea", [], self.db)
+        await self.rate(photo, 3)
+        await self.db.execute(
+            update(UserStats).filter_by(user_id=self.owner.id).values(photos_published=7)
+        )
+        await self.db.execute(update(UserStats).filter_by(user_id=self.voter.id).values(ratings_given=0))
+        await self.db.commit()
+
+        self.assertEqual(
+            await find_stale_user_stats(self.db), [(self.owner.id, "owner"), (self.voter.id, "voter")]
+        )
+        self.assertEqual(await rebuild_user_stats(self.db), 2)
+        self.assertEqual(await find_stale_user_stats(self.db), [])
+        self.assertEqual(await rebuild_user_stats(self.db), 0)
+        self.assertEqual((await get_user_stats(self.owner.id, self.db)).photos_published, 1)
+        self.assertEqual((await get_user_stats(self.voter.id, self.db)).ratings_given, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,13 +4,14 @@ import sys
 sys.path.append(os.path.abspath("."))
 
 from datetime import datetime
+from types import SimpleNamespace
 
 import unittest
-from unittest.mock import MagicMock
+from unittest.mock import AsyncMock, MagicMock, patch
 
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.database.models import User
+from src.database.models import User, UserStats
 from src.schemas.users import UserModel, UserPublic
 from src.repository.users import (
     get_user_by_username,
@@ -33,7 +34,11 @@ from src.repository.users import (
 
 class TestContacts(unittest.IsolatedAsyncioTestCase):
     def setUp(self):
-        self.session = MagicMock(spec=Session)
+        patcher = patch("src.repository.users.user_cache", new_callable=AsyncMock)
+        self.user_cache = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.session = MagicMock(spec=AsyncSession)
+        self.session.execute.return_value = MagicMock()
         self.user = User(
             user_name="Mike",
             email="testmike@test.com",
@@ -45,19 +50,19 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
 
     async def test_get_contact(self):
         user = self.user
-        self.session.query().filter(user_name=user.user_name).first.return_value = user
+        self.session.execute.return_value.scalars().first.return_value = user
         result = await get_user_by_username(username="Mike", db=self.session)
         self.assertEqual(result, user)
 
     async def test_get_user_by_email(self):
         user = self.user
-        self.session.query().filter(email=user.email).first.return_value = user
+        self.session.execute.return_value.scalars().first.return_value = user
         result = await get_user_by_email(email="testmike@test.com", db=self.session)
         self.assertEqual(result, user)
 
     async def test_search_by_mail(self):
         user = self.user
-        self.session.query().filter_by(email=user.email).first.return_value = user
+        self.session.execute.return_value.scalars().first.return_value = user
         result = await search_by_mail(inquiry="testmike@test.com", db=self.session)
         self.assertEqual(result, user)
 
@@ -67,7 +72,7 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
             email="testmike@test.com",
             password="qweasd",
         )
-        self.session.query().filter_by(email=body.email).first.return_value = body
+        self.session.execute.return_value.scalars().first.return_value = body
         result = await check_exist_mail(body=body, db=self.session)
         self.assertEqual(result, body)
 
@@ -77,15 +82,13 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
             email="testmike@test.com",
             password="qweasd",
         )
-        self.session.query().filter_by(
-            user_name=body.user_name
-        ).first.return_value = body
+        self.session.execute.return_value.scalars().first.return_value = body
         result = await check_exist_username(body=body, db=self.session)
         self.assertEqual(result, body)
 
     async def test_check_quantity_of_users(self):
         contacts = [User(), User, User()]
-        self.session.query().all.return_value = contacts
+        self.session.execute.return_value.scalars().all.return_value = contacts
         result = await check_quantity_of_users(db=self.session)
         self.assertEqual(result, contacts)
 
@@ -108,6 +111,7 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
         )
         result = await to_ban_user(body=body, email=body.email, db=self.session)
         self.assertTrue(result.ban_status)
+        self.user_cache.invalidate.assert_awaited_once_with(body.email)
 
     async def test_confirmed_email(self):
         user = self.user
@@ -124,10 +128,29 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
         public_profile = UserPublic(
             user_name="Mike", created_at=user.created_at, photos_published=1
         )
-        self.session.query().filter(username=user.user_name).first.return_value = user
+        stats = UserStats(
+            user_id=1,
+            photos_published=1,
+            comments_written=0,
+            ratings_given=0,
+            ratings_received=0,
+            rating_sum_received=0,
+        )
+        self.session.execute.return_value.first.return_value = SimpleNamespace(
+            id=1, user_name=user.user_name, created_at=user.created_at, UserStats=stats
+        )
         result = await get_user_profile(username=user.user_name, db=self.session)
         self.assertEqual(result, public_profile)
 
+    async def test_get_user_profile_without_stats(self):
+        user = self.user
+        self.session.execute.return_value.first.return_value = SimpleNamespace(
+            id=1, user_name=user.user_name, created_at=user.created_at, UserStats=None
+        )
+        result = await get_user_profile(username=user.user_name, db=self.session)
+        self.assertEqual(result.photos_published, 0)
+        self.assertEqual(result.average_received_rating, 0.0)
+
     async def test_update_token(self):
         token = "12345"
         user = User()
@@ -141,7 +164,9 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
         result = await change_password(
             user=user, new_password=new_password, db=self.session
         )
-        self.assertEqual(user.password, new_password)
+        self.assertEqual(result, user)
+        self.session.execute.assert_called_once()
+        self.user_cache.invalidate.assert_awaited_once_with(user.email)
 
 
 if __name__ == "__main__":